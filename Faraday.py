@@ -13,12 +13,15 @@ Created on 2/5/2023
 #
 # System imports
 #
+# Imported first so startup is timed from here
+import startup
 # import os
 import sys
 import traceback
 #
 #   PyQt5 imports
 #
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow
 # from PyQt5.QtWidgets import QCoreApplication
 # from PyQt5.QtWidgets import QMenu, QSizePolicy
@@ -33,6 +36,7 @@ from PyQt5.QtWidgets import QApplication, QMainWindow
 #
 from appdlg import AppDLG
 from fconfig import FConfig
+startup.mark('imports')
 
 
 # ******************************************************************
@@ -81,10 +85,15 @@ class FWin(QMainWindow):
 if __name__ == '__main__':
     gConfig = FConfig()
     gConfig.loadFrom('Faraday.toml')
+    startup.mark('config read')
     theApp = QApplication(sys.argv)
     print('In Faraday')
     print(gConfig._config)
     mainWin = FWin(gConfig)
+    startup.mark('main window built')
+    # Reported once the window has been drawn and the loop is idle
+    QTimer.singleShot(0, lambda: (startup.mark('main window shown'),
+                                  startup.report()))
     try:
         sys.exit(theApp.exec_())
     except RuntimeError:
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+allandev.py
+Faraday
+
+Overlapping Allan deviation and modified Allan deviation of the scan
+traces, used to find the averaging time at which drift starts to
+dominate the Faraday signal.
+
+allan_deviation works on a whole stored trace at once.
+StreamingAllan works on the live point stream one point at a time.
+It keeps one ring of recent phase values, long enough for the largest
+averaging factor, plus a running window sum for each octave, so its
+memory is fixed by the largest tau asked for and not by the length of
+the run. Each new point costs one small numpy update across all
+octaves and channels.
+
+Averaging factors are octave spaced, m = 1, 2, 4, ... and tau = m*tau0.
+The input is treated as frequency-like data y and integrated to phase
+x = tau0 * cumsum(y - y[0]). Removing y[0] does not change the
+deviations but keeps x small on long runs.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+
+from scansnapshot import ScanSnapshot
+from fourieranalysis import check_cancel
+
+MAX_OCTAVE = 16     # Largest m is 2**16 points
+
+
+#
+#   Octave spaced averaging factors that fit n points. Overlapping
+#   Allan needs 2m+1 phase points, modified Allan needs 3m+1.
+#
+def octave_factors(n: int, modified: bool = False,
+                   max_octave: int = MAX_OCTAVE) -> np.ndarray:
+    span = 3 if modified else 2
+    m = 2**np.arange(max_octave + 1)
+    return m[span*m + 1 <= n]
+
+
+#
+#   Deviations of one trace. Returns (taus, adev, mdev, counts) where
+#   counts is the number of overlapping Allan terms at each tau.
+#
+def allan_deviation(y, tau0: float, max_octave: int = MAX_OCTAVE):
+    y = np.asarray(y, dtype=np.float64)
+    x = np.concatenate(([0.0], np.cumsum(y - y[0]))) * tau0
+    n = len(x)
+    ms = octave_factors(n, False, max_octave)
+    adev = np.full(len(ms), np.nan)
+    mdev = np.full(len(ms), np.nan)
+    counts = np.zeros(len(ms), dtype=int)
+    for j, m in enumerate(ms):
+        d = x[2*m:] - 2*x[m:n-m] + x[:n-2*m]
+        counts[j] = len(d)
+        adev[j] = np.sqrt(np.mean(d**2) / 2) / (m * tau0)
+        if n >= 3*m + 1:
+            cs = np.concatenate(([0.0], np.cumsum(d)))
+            s = cs[m:] - cs[:-m]
+            mdev[j] = np.sqrt(np.mean(s**2) / 2) / (m * m * tau0)
+    return ms * tau0, adev, mdev, counts
+
+
+#
+#   Deviations of all six traces of a stored scan, in the same form as
+#   StreamingAllan.deviations so the two can be plotted alike.
+#
+def snapshot_deviations(snap: ScanSnapshot, cancel=None):
+    tau0 = snap.times[1] - snap.times[0]
+    adevs = []
+    mdevs = []
+    for y in snap.traces:
+        check_cancel(cancel)
+        taus, adev, mdev, counts = allan_deviation(y, tau0)
+        adevs.append(adev)
+        mdevs.append(mdev)
+    return taus, np.stack(adevs, axis=1), np.stack(mdevs, axis=1)
+
+
+class StreamingAllan:
+    def __init__(self, tau0: float, n_chan: int = 1,
+                 max_octave: int = MAX_OCTAVE):
+        self.tau0 = tau0
+        self.n_chan = n_chan
+        self.m = 2**np.arange(max_octave + 1)
+        self.n_level = len(self.m)
+        #   Phase ring long enough to reach back 3*m_max points
+        self._xlen = 3*self.m[-1] + 1
+        self._x = np.zeros((self._xlen, n_chan))
+        #   One ring of second differences per octave, packed end to end
+        self._doff = np.concatenate(([0], np.cumsum(self.m)[:-1]))
+        self._d = np.zeros((int(np.sum(self.m)), n_chan))
+        self._win = np.zeros((self.n_level, n_chan))
+        self._asum = np.zeros((self.n_level, n_chan))
+        self._msum = np.zeros((self.n_level, n_chan))
+        self._acnt = np.zeros(self.n_level, dtype=np.int64)
+        self._mcnt = np.zeros(self.n_level, dtype=np.int64)
+        self.n = 0          # Phase points seen, including the zero
+        self._y0 = None
+
+    #
+    #   Add one point (a value per channel).
+    #
+    def add(self, y) -> None:
+        y = np.asarray(y, dtype=np.float64).reshape(self.n_chan)
+        if self._y0 is None:
+            self._y0 = y.copy()
+            self.n = 1      # x[0] = 0 is already in the ring
+        i = self.n
+        xn = self._x[(i - 1) % self._xlen] + (y - self._y0) * self.tau0
+        self._x[i % self._xlen] = xn
+        self.n += 1
+        #   Octaves with 2m+1 phase points available
+        live = 2*self.m <= i
+        if not np.any(live):
+            return
+        m = self.m[live]
+        d = (xn - 2*self._x[(i - m) % self._xlen]
+             + self._x[(i - 2*m) % self._xlen])
+        self._asum[live] += d**2
+        self._acnt[live] += 1
+        #   Slide each octave's window sum of m second differences
+        k = self._acnt[live] - 1
+        slot = self._doff[live] + k % m
+        full = k >= m
+        self._win[live] += d - np.where(full[:, None], self._d[slot], 0.0)
+        self._d[slot] = d
+        done = k >= m - 1
+        lv = np.flatnonzero(live)[done]
+        self._msum[lv] += self._win[lv]**2
+        self._mcnt[lv] += 1
+
+    def addBlock(self, ys) -> None:
+        for y in np.asarray(ys).reshape(-1, self.n_chan):
+            self.add(y)
+
+    #
+    #   (taus, adev, mdev) for octaves with at least one term. adev and
+    #   mdev are (n_tau, n_chan); mdev is NaN until it has a term.
+    #
+    def deviations(self):
+        ok = self._acnt > 0
+        m = self.m[ok][:, None]
+        acnt = self._acnt[ok][:, None]
+        mcnt = self._mcnt[ok][:, None]
+        adev = np.sqrt(self._asum[ok] / acnt / 2) / (m * self.tau0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mdev = np.where(mcnt > 0,
+                            np.sqrt(self._msum[ok] / mcnt / 2)
+                            / (m * m * self.tau0), np.nan)
+        return self.m[ok] * self.tau0, adev, mdev
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+analysisexecutor.py
+Faraday
+
+Runs analysis jobs (Fourier transforms, noise fits, file saves) on a
+small pool of worker threads so that the Qt slots that ask for them
+return at once. The numpy FFT and file writing release the GIL so a
+thread pool is enough and avoids copying scans into other processes.
+
+Each job has a kind, a short string such as 'fourier'. Submitting a
+job of a kind cancels any earlier job of the same kind that has not
+finished, so only the latest request of each kind ever reports back.
+Jobs are called as fn(*args, cancel=event) and should poll the event
+(see fourieranalysis.check_cancel) during long calculations.
+
+Results come back through the finished(kind, result) signal and
+errors through failed(kind, message). Both are emitted from the
+worker thread and so are queued onto the GUI thread by Qt.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from fourieranalysis import AnalysisCancelled
+
+
+class AnalysisExecutor(QObject):
+    finished = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, max_workers: int = 2, parent=None):
+        super().__init__(parent)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix='analysis')
+        self._lock = threading.Lock()
+        self._latest = {}   # kind -> (future, cancel event)
+
+    #
+    #   Queue fn(*args) as a job of the given kind. With replace False
+    #   the job is kept even if others of the same kind follow, which
+    #   is what saves want.
+    #
+    def submit(self, kind: str, fn, *args, replace: bool = True) -> Future:
+        event = threading.Event()
+        with self._lock:
+            if replace:
+                self._cancel_locked(kind)
+            fut = self._pool.submit(self._run, fn, args, event)
+            if replace:
+                self._latest[kind] = (fut, event)
+        fut.add_done_callback(partial(self._done, kind, event))
+        return fut
+
+    def cancel(self, kind: str) -> None:
+        with self._lock:
+            self._cancel_locked(kind)
+
+    def busy(self, kind: str) -> bool:
+        with self._lock:
+            return kind in self._latest
+
+    def shutdown(self) -> None:
+        print('Shut down analysis executor')
+        with self._lock:
+            for kind in list(self._latest):
+                self._cancel_locked(kind)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    #
+    #   Helpers
+    #
+    def _cancel_locked(self, kind: str) -> None:
+        old = self._latest.pop(kind, None)
+        if old is not None:
+            fut, event = old
+            event.set()
+            fut.cancel()
+
+    @staticmethod
+    def _run(fn, args, event):
+        return fn(*args, cancel=event)
+
+    def _done(self, kind: str, event, fut: Future) -> None:
+        with self._lock:
+            current = self._latest.get(kind)
+            if current is not None and current[0] is fut:
+                del self._latest[kind]
+        if fut.cancelled() or event.is_set():
+            return
+        exc = fut.exception()
+        if isinstance(exc, AnalysisCancelled):
+            return
+        if exc is not None:
+            print(f'Analysis job {kind} failed: {exc}')
+            self.failed.emit(kind, str(exc))
+            return
+        self.finished.emit(kind, fut.result())
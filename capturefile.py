@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+capturefile.py
+Faraday
+
+A binary file format for captures and their spectra, replacing the
+np.savetxt CSV files, which are large and slow to format.
+
+A .fcap file is
+    8 bytes     magic, b'FCAP\\x00\\x01\\r\\n'
+    4 bytes     little endian length of the header
+    header      UTF-8 JSON, padded with spaces to a 64 byte boundary
+    data        the columns, one after another, as little endian
+                float64, so column i of n points starts at i*8*n
+    sections    any extra named arrays, each on a 64 byte boundary
+
+A compressed file has header 'compression' set to 'shuffle-zlib'. Each
+column is then stored byte shuffled, all first bytes of the values,
+then all second bytes and so on, and deflated, with the compressed
+lengths in header 'clength'. Shuffling puts the slowly changing
+exponent bytes together, which is what lets zlib shrink float data.
+Compressed columns cannot be mapped and are read in full on open;
+sections are never compressed.
+
+The header holds the column names, the number of points, and anything
+else the writer passes in meta, such as the sample rate, duration,
+channel names and a copy of the configuration. Extra sections are
+listed in the header under 'sections' with their dtype, shape and
+offset from the start of the data.
+
+Only what cannot be recomputed is stored. A scan keeps V1, V2 and Vm;
+the difference, sum and ratio are rebuilt on first use when the
+header says 'derived'. An evenly spaced time or frequency axis is
+kept as its start, stop and interval under 'axis' and rebuilt with
+np.linspace, which gives back the values that were saved to within
+AXIS_ULP units in the last place. Times made as arange(n)/rate, as a
+single shot's are, differ from linspace by about that much.
+Live scans, whose times are measured, keep their t column.
+
+A scan also carries a min/max/mean pyramid of its six traces, see
+pyramid.py, as sections 'pyramid<L>' listed in header 'pyramid'.
+CaptureFile.overview uses it to give any range of a trace at screen
+resolution while reading only a few thousand values.
+
+Writing is a header followed by straight copies of the arrays, to a
+temporary file that is renamed over the real name once it is complete,
+so a reader never sees a half written capture. Reading
+maps the file so nothing is read until it is used, and a column is a
+zero copy view. CSV export in the old layout is still available, and
+the old files can still be read, see read_csv and csvcache.py.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import json
+import zlib
+import struct
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+
+from scansnapshot import ScanSnapshot
+import pyramid
+
+MAGIC = b'FCAP\x00\x01\r\n'
+VERSION = 1
+ALIGN = 64
+EXT = '.fcap'
+DTYPE = '<f8'
+COMPRESSION = 'shuffle-zlib'
+ZLEVEL = 1          # Higher levels are much slower for a few % more
+AXIS_ULP = 4        # Units in the last place an axis may be out by
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+# ******************************************************************
+#
+#   Writing
+#
+# ******************************************************************
+#
+#   Write columns, a (ncol, npoint) array or sequence of equal length
+#   arrays, under the given names. meta is merged into the header and
+#   sections is a dict of extra named arrays. With compress the columns
+#   are shuffled and deflated.
+#
+def write_capture(fname: str, names, columns, meta: dict = None,
+                  sections: dict = None, compress: bool = False) -> None:
+    if len(names) != len(columns):
+        raise RuntimeError(f'{len(names)} column names for'
+                           f' {len(columns)} columns.')
+    npoint = len(columns[0]) if len(columns) else 0
+    header = dict(meta or {})
+    header['version'] = VERSION
+    header['columns'] = list(names)
+    header['npoint'] = npoint
+    header['dtype'] = DTYPE
+    if compress:
+        columns = [zlib.compress(_shuffle(col), ZLEVEL) for col in columns]
+        header['compression'] = COMPRESSION
+        header['clength'] = [len(c) for c in columns]
+        nbytes = sum(header['clength'])
+    else:
+        columns = [np.ascontiguousarray(col, dtype=DTYPE) for col in columns]
+        nbytes = len(names) * npoint * 8
+    arrays = []
+    offset = _aligned(nbytes)
+    table = {}
+    for name, arr in (sections or {}).items():
+        arr = np.ascontiguousarray(arr)
+        arr = arr.astype(arr.dtype.newbyteorder('<'), copy=False)
+        table[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape),
+                       'offset': offset}
+        arrays.append((offset, arr))
+        offset = _aligned(offset + arr.nbytes)
+    header['sections'] = table
+    hb = json.dumps(header).encode('utf-8')
+    start = _aligned(len(MAGIC) + 4 + len(hb))
+    hb = hb + b' ' * (start - len(MAGIC) - 4 - len(hb))
+    with atomic(fname) as tmp, open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(hb)))
+        f.write(hb)
+        for col in columns:
+            f.write(memoryview(col))
+        for off, arr in arrays:
+            f.seek(start + off)
+            f.write(memoryview(arr).cast('B'))
+
+
+#
+#   Write to the name this yields, which is renamed to fname when the
+#   with block completes and removed if it fails, e.g.
+#       with atomic(fname) as tmp:
+#           np.savetxt(tmp, ...)
+#
+@contextmanager
+def atomic(fname: str):
+    tmp = f'{fname}.{os.getpid()}.tmp'
+    try:
+        yield tmp
+        os.replace(tmp, fname)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+#
+#   A scan. Only the raw channels, and the times if they are not
+#   evenly spaced, are written, followed by the pyramid of all six
+#   traces unless pyr is False.
+#
+RAW = ('V1', 'V2', 'Vm')
+DERIVED = ('V1-V2', 'V1+V2', 'Vdiv')
+
+
+def save_snapshot(snap: ScanSnapshot, fname: str, meta: dict = None,
+                  compress: bool = False, pyr: bool = True) -> None:
+    m = {'kind': 'scan', 'sample_rate': snap.sample_rate,
+         'duration': snap.duration, 'derived': True}
+    m.update(meta or {})
+    names, columns = _with_axis(m, 't', snap.times, RAW,
+                                (snap.v1, snap.v2, snap.vm))
+    sections = {}
+    if pyr:
+        levels = pyramid.build(snap.traces)
+        if levels:
+            m['pyramid'] = {'columns': list(snap.traceNames),
+                            'stats': list(pyramid.STATS),
+                            'levels': sorted(levels)}
+            sections = {f'pyramid{k}': v for k, v in levels.items()}
+    write_capture(fname, names, columns, m, sections, compress)
+
+
+#
+#   The magnitude spectra of a scan, freq plus the six traces.
+#
+def save_spectra(spectra, fname: str, meta: dict = None,
+                 compress: bool = False) -> None:
+    m = {'kind': 'spectrum', 'npoint_time': spectra.npoint}
+    m.update(meta or {})
+    names, columns = _with_axis(m, 'freq', spectra.freq,
+                                ScanSnapshot.traceNames, tuple(spectra.mag))
+    write_capture(fname, names, columns, m, compress=compress)
+
+
+#
+#   The bytes of a column grouped by their place in each value.
+#
+def _shuffle(col) -> bytes:
+    a = np.ascontiguousarray(col, dtype=DTYPE)
+    return a.view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+#
+#   Put x in the header as an axis if np.linspace rebuilds it to within
+#   AXIS_ULP, otherwise add it as the first column.
+#
+def _with_axis(meta, name, x, names, columns):
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if n > 1 and _is_linear(x):
+        meta['axis'] = {'name': name, 'start': float(x[0]),
+                        'stop': float(x[-1]),
+                        'interval': float((x[-1] - x[0]) / (n - 1))}
+        return tuple(names), tuple(columns)
+    return (name,) + tuple(names), (x,) + tuple(columns)
+
+
+def _is_linear(x) -> bool:
+    if not np.all(np.isfinite(x[[0, -1]])):
+        return False
+    err = np.abs(x - np.linspace(x[0], x[-1], len(x)))
+    return bool(np.all(err <= AXIS_ULP * np.spacing(np.max(np.abs(x)))))
+
+
+# ******************************************************************
+#
+#   Reading. CaptureFile.open maps a .fcap file, CaptureFile.fromCSV
+#   reads one of the old text files into the same form.
+#
+# ******************************************************************
+class CaptureFile:
+    def __init__(self, header: dict, data: np.ndarray, fname: str = None,
+                 start: int = 0):
+        self.header = header
+        self.data = data
+        self.fname = fname
+        self._start = start
+        self._derived = {}
+
+    @classmethod
+    def open(cls, fname: str, mmap: bool = True):
+        with open(fname, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise RuntimeError(f'{fname} is not a capture file.')
+            hlen, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(hlen).decode('utf-8'))
+        start = len(MAGIC) + 4 + hlen
+        shape = (len(header['columns']), header['npoint'])
+        if header.get('compression') == COMPRESSION:
+            data = cls._inflate(fname, header, start, shape)
+        elif 'compression' in header:
+            raise RuntimeError(f'{fname} uses unknown compression'
+                               f' {header["compression"]}.')
+        else:
+            data = cls._map(fname, header['dtype'], start, shape, mmap)
+        return cls(header, data, fname, start)
+
+    @classmethod
+    def fromCSV(cls, fname: str):
+        names, data = read_csv(fname)
+        kind = 'spectrum' if names[0] == 'freq' else 'scan'
+        header = {'version': VERSION, 'columns': names, 'kind': kind,
+                  'npoint': data.shape[1], 'dtype': DTYPE, 'sections': {}}
+        return cls(header, data, fname)
+
+    #
+    #   Every column that can be read, stored or rebuilt.
+    #
+    @property
+    def columns(self) -> list:
+        cols = list(self.header['columns'])
+        axis = self.header.get('axis')
+        if axis is not None:
+            cols.insert(0, axis['name'])
+        if self.header.get('derived'):
+            cols.extend(DERIVED)
+        return cols
+
+    @property
+    def npoint(self) -> int:
+        return self.header['npoint']
+
+    @property
+    def sample_rate(self):
+        return self.header.get('sample_rate')
+
+    @property
+    def config(self):
+        return self.header.get('config')
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        stored = self.header['columns']
+        if name in stored:
+            return self.data[stored.index(name)]
+        if name not in self._derived:
+            self._derived[name] = self._derive(name)
+        return self._derived[name]
+
+    def section(self, name: str) -> np.ndarray:
+        s = self.header['sections'][name]
+        return self._map(self.fname, s['dtype'], self._start + s['offset'],
+                         tuple(s['shape']), True)
+
+    #
+    #   Trace name between points i0 and i1 reduced to about npix
+    #   buckets, at least npix when the range has that many points. Returns
+    #   (x, lo, hi, mean) with x the axis value at the start of each
+    #   bucket. The coarsest stored pyramid level that is fine enough is
+    #   read, so only the buckets in range are touched; without one the
+    #   trace itself is reduced.
+    #
+    def overview(self, name: str, npix: int, i0: int = 0, i1: int = None):
+        i1 = self.npoint if i1 is None else min(i1, self.npoint)
+        level = pyramid.choose_level(i1 - i0, npix)
+        pyr = self.header.get('pyramid') or {'columns': [], 'levels': []}
+        stored = [k for k in pyr['levels'] if k <= level]
+        if name in pyr['columns'] and stored:
+            level = max(stored)
+            step = 2**level
+            b0, b1 = i0 // step, -(-i1 // step)
+            sec = self.section(f'pyramid{level}')
+            lo, hi, mean = np.array(sec[:, pyr['columns'].index(name),
+                                        b0:b1])
+        else:
+            step = 2**level
+            b0 = i0 // step
+            lo, hi, total, count = pyramid.reduce(self[name][b0*step:i1],
+                                                  step)
+            mean = total / count
+        return self._axis_at(step*np.arange(b0, b0 + len(lo))), lo, hi, mean
+
+    def snapshot(self) -> ScanSnapshot:
+        return ScanSnapshot(self['t'], self['V1'], self['V2'], self['Vm'],
+                            sample_rate=self.header.get('sample_rate', 0),
+                            duration=self.header.get('duration', 0.0))
+
+    #
+    #   Write the columns as text in the old CSV layout.
+    #
+    def exportCSV(self, fname: str) -> None:
+        darray = np.stack([self[c] for c in self.columns], axis=1)
+        np.savetxt(fname, darray, header=','.join(self.columns),
+                   delimiter=', ')
+
+    #
+    #   Helpers
+    #
+    def _derive(self, name: str) -> np.ndarray:
+        axis = self.header.get('axis')
+        if axis is not None and name == axis['name']:
+            return np.linspace(axis['start'], axis['stop'], self.npoint)
+        if self.header.get('derived'):
+            if name == 'V1-V2':
+                return self['V1'] - self['V2']
+            if name == 'V1+V2':
+                return self['V1'] + self['V2']
+            if name == 'Vdiv':
+                return self['V1-V2'] / self['V1+V2']
+        raise KeyError(f'No column {name} in {self.fname}')
+
+    def _axis_at(self, idx) -> np.ndarray:
+        axis = self.header.get('axis')
+        if axis is not None:
+            return axis['start'] + idx*axis['interval']
+        return np.asarray(self[self.columns[0]][idx])
+
+    @staticmethod
+    def _inflate(fname, header, start, shape):
+        data = np.empty(shape, dtype=header['dtype'])
+        with open(fname, 'rb') as f:
+            f.seek(start)
+            for i, n in enumerate(header['clength']):
+                raw = np.frombuffer(zlib.decompress(f.read(n)), np.uint8)
+                data[i] = raw.reshape(8, -1).T.copy().view(data.dtype)[:, 0]
+        return data
+
+    @staticmethod
+    def _map(fname, dtype, offset, shape, mmap):
+        count = int(np.prod(shape))
+        if count == 0:
+            return np.zeros(shape, dtype=dtype)
+        if mmap:
+            return np.memmap(fname, dtype=dtype, mode='r', offset=offset,
+                             shape=shape)
+        return np.fromfile(fname, dtype=dtype, count=count,
+                           offset=offset).reshape(shape)
+
+
+#
+#   Read one of the old text files, as (names, data) with data a
+#   (ncol, npoint) array. The numbers are parsed in one pass by
+#   np.fromstring, which is several times quicker than np.loadtxt;
+#   anything it cannot read to the end goes to np.loadtxt so the error
+#   says where. The oldest scans have no header line and are space
+#   separated, so they get the standard names.
+#
+def read_csv(fname: str):
+    with open(fname, 'rb') as f:
+        raw = f.read()
+    names = None
+    if raw.startswith(b'#'):
+        nl = raw.find(b'\n')
+        names = raw[1:nl].decode('ascii').strip().split(',')
+        raw = raw[nl + 1:] if nl >= 0 else b''
+    nl = raw.find(b'\n')
+    ncol = len(raw[:nl if nl >= 0 else None].replace(b',', b' ').split())
+    text = raw.replace(b',', b' ').decode('ascii', errors='replace')
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            vals = np.fromstring(text, dtype=np.float64, sep=' ')
+        except (DeprecationWarning, ValueError):
+            vals = None
+    if vals is None or ncol == 0 or vals.size % ncol:
+        vals = np.loadtxt(fname, delimiter=',' if names else None,
+                          ndmin=2).ravel()
+    if names is None:
+        names = _default_names(fname, ncol)
+    if len(names) != ncol:
+        raise RuntimeError(f'{fname} has {len(names)} names for'
+                           f' {ncol} columns.')
+    data = np.ascontiguousarray(vals.reshape(-1, ncol).T)
+    return names, data
+
+
+def _default_names(fname: str, ncol: int) -> list:
+    first = 'freq' if fname.endswith('Four.csv') else 't'
+    if ncol == len(ScanSnapshot.traceNames) + 1:
+        return [first] + list(ScanSnapshot.traceNames)
+    return [f'c{i}' for i in range(ncol)]
+
+
+#
+#   Open a capture. Old CSV files go through the csvcache sidecar so
+#   only the first load of each one pays for the text parse.
+#
+def load(fname: str, mmap: bool = True, cache: bool = True) -> CaptureFile:
+    if fname.endswith('.csv'):
+        if cache:
+            import csvcache
+            return csvcache.load(fname)
+        return CaptureFile.fromCSV(fname)
+    return CaptureFile.open(fname, mmap)
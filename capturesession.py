@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+capturesession.py
+Faraday
+
+Names for saved captures that never collide, grouped by session.
+
+The old names, prefix + '%m%d%y-%M%H', had no seconds and put the
+minute before the hour, so two saves in the same minute wrote over
+each other. A CaptureSession instead makes one directory per session,
+    <root>/<prefix>-YYYYmmdd-HHMMSS/
+and names each capture in it
+    <prefix>-YYYYmmdd-HHMMSS-NNNN
+from the time it was named and a sequence number that only goes up.
+The sequence number alone keeps names unique, so naming is a counter
+increment under a lock and never has to look at the disk.
+
+Each session directory holds a manifest, manifest.jsonl, of one JSON
+object per line. The first line describes the session, its start time
+and anything passed as meta, and each save adds a line with the
+name, label, files, size and write time of the capture.
+Appending a line costs the same however long the session runs.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import json
+import threading
+from datetime import datetime
+
+MANIFEST = 'manifest.jsonl'
+
+
+class CaptureSession:
+    def __init__(self, root: str = '.', prefix: str = 'FData',
+                 meta: dict = None):
+        self.prefix = prefix
+        self.start = datetime.now()
+        base = os.path.join(root, f'{prefix}-{self.start:%Y%m%d-%H%M%S}')
+        self.path = base
+        n = 1
+        while os.path.exists(self.path):
+            n += 1
+            self.path = f'{base}-{n}'
+        os.makedirs(self.path)
+        self.manifest = os.path.join(self.path, MANIFEST)
+        self._lock = threading.Lock()
+        self._seq = 0
+        entry = {'session': os.path.basename(self.path), 'prefix': prefix,
+                 'started': self.start.isoformat()}
+        entry.update(meta or {})
+        self._append(entry)
+
+    #
+    #   A new base name, a path without extension, for the next capture.
+    #
+    def next_name(self) -> str:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.path, f'{self.prefix}-{stamp}-{seq:04d}')
+
+    @property
+    def count(self) -> int:
+        return self._seq
+
+    #
+    #   Add a line for a written capture to the manifest. files are the
+    #   paths written, the scan first.
+    #
+    def record(self, label: str, files, nbytes: int = None,
+               seconds: float = None) -> None:
+        name = os.path.splitext(os.path.basename(files[0]))[0]
+        self._append({'capture': name, 'label': label,
+                      'files': [os.path.relpath(f, self.path) for f in files],
+                      'bytes': nbytes, 'seconds': seconds,
+                      'written': datetime.now().isoformat()})
+
+    #
+    #   Helpers
+    #
+    def _append(self, entry: dict) -> None:
+        with self._lock, open(self.manifest, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+#
+#   The manifest of a session directory as (session, captures), the
+#   first line and a list of the rest.
+#
+def read_manifest(path: str):
+    with open(os.path.join(path, MANIFEST)) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    return lines[0], lines[1:]
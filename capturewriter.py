@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+capturewriter.py
+Faraday
+
+Writes captures to disk on a thread of their own so the Qt slots that
+save them return at once, and so that saves do not queue behind, or
+hold up, the analysis jobs on the AnalysisExecutor.
+
+A save is a job, fn(*args), that writes its files and returns their
+names. Jobs wait in a bounded queue and are run one at a time, in the
+order given. put never waits: when QUEUE_SIZE captures are already
+waiting it refuses the job and returns False, so a slow disk can not
+freeze the GUI, and the memory held by captures waiting to be written
+stays bounded. busy says whether a put would be refused.
+The arguments should be ScanSnapshots and other data that nothing
+else will change, so the writer never sees a scan being refilled.
+
+The capturefile writers write to a temporary name and rename it over
+the real one when complete, so a crash or full disk never leaves a
+half written capture behind.
+
+When a job is done written(label, report) is emitted with a
+WriteReport of the files, their total size and how long they took.
+Errors come back through failed(label, message). Both are emitted from
+the writer thread and so are queued onto the GUI thread by Qt.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import time
+import queue
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+import capturefile
+from scansnapshot import ScanSnapshot
+
+QUEUE_SIZE = 4
+
+
+class WriteReport:
+    def __init__(self, files, nbytes, seconds):
+        self.files = files
+        self.nbytes = nbytes
+        self.seconds = seconds
+
+    #   Throughput in MB/s
+    @property
+    def rate(self) -> float:
+        return self.nbytes / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f'{len(self.files)} files, {self.nbytes/1e6:.2f} MB in'
+                f' {self.seconds:.3f} s ({self.rate:.1f} MB/s)')
+
+
+class CaptureWriter(QObject):
+    written = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, maxsize: int = QUEUE_SIZE, parent=None):
+        super().__init__(parent)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name='writer',
+                                        daemon=True)
+        self._thread.start()
+
+    #
+    #   Queue fn(*args). Returns False, without queueing it, if the
+    #   queue is full.
+    #
+    def put(self, label: str, fn, *args) -> bool:
+        if not self._thread.is_alive():
+            raise RuntimeError('The capture writer has been shut down.')
+        try:
+            self._queue.put_nowait((label, fn, args))
+        except queue.Full:
+            print(f'Capture writer busy, {label} not queued')
+            return False
+        return True
+
+    def busy(self) -> bool:
+        return self._queue.full()
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    #
+    #   Finish the queued writes and stop the thread.
+    #
+    def shutdown(self) -> None:
+        print(f'Shut down capture writer, {self.pending()} writes pending')
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    #
+    #   Helpers
+    #
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, label, fn, args) -> None:
+        t0 = time.perf_counter()
+        try:
+            files = fn(*args)
+        except Exception as e:
+            print(f'Write of {label} failed: {e}')
+            self.failed.emit(label, str(e))
+            return
+        nbytes = sum(os.path.getsize(f) for f in files)
+        self.written.emit(label, WriteReport(files, nbytes,
+                                             time.perf_counter() - t0))
+
+
+#
+#   A job that saves a scan as base_name.fcap and, with csv, as
+#   base_name.csv too. Returns the names of the files written.
+#
+def save_scan(snap: ScanSnapshot, base_name: str, meta: dict = None,
+              csv: bool = False, compress: bool = False) -> list:
+    files = [base_name + capturefile.EXT]
+    capturefile.save_snapshot(snap, files[0], meta, compress)
+    if csv:
+        files.append(base_name + '.csv')
+        with capturefile.atomic(files[-1]) as tmp:
+            snap.saveTo(tmp)
+    return files
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+catalog.py
+Faraday
+
+A SQLite catalog of the captures under a data directory, so past runs
+can be found and compared without opening every file.
+
+There is one row per scan in the captures table. It holds the file,
+when the scan was taken, its sample rate, duration and length, the
+channel map and configuration it was taken with (as JSON), and the
+results of the usual analysis: the modulation peak, its Vdiv signal,
+the fitted noise under it and their ratio. The traces table holds the
+mean and standard deviation of each of the six traces of each scan.
+The provenance table records where converted files came from, see
+migrate.py.
+
+Both .fcap files and the old CSVs are indexed; a CSV is skipped when
+the same capture was also saved as .fcap. Spectra (Four) and harmonic
+tables are not captures of their own, but a scan's spectrum file is
+recorded with it. The time of an old CSV comes from its name, which
+the old code wrote as month, day, year, minute, hour.
+
+update only opens files that are new or whose size or modification
+time has changed since they were indexed, and drops rows for files
+that have gone. add indexes a single file and is what the GUI calls
+after every save. Queries are plain SQL, e.g.
+
+    cat = Catalog('.')
+    cat.update()
+    cat.query('snr > ? AND sample_rate = ?', (100, 10000))
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import re
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import capturefile
+import fourieranalysis
+from fourieranalysis import check_cancel
+from scansnapshot import ScanSnapshot
+
+DB_NAME = 'catalog.sqlite'
+NOISE_LO = 1.0      # Noise fit range, as the RPlotter defaults
+NOISE_HI = 6.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    format TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    captured TEXT,
+    sample_rate REAL,
+    duration REAL,
+    npoint INTEGER,
+    channels TEXT,
+    config TEXT,
+    spectrum_path TEXT,
+    peak_freq REAL,
+    signal REAL,
+    noise REAL,
+    snr REAL
+);
+CREATE INDEX IF NOT EXISTS captures_captured ON captures(captured);
+CREATE INDEX IF NOT EXISTS captures_rate_snr ON captures(sample_rate, snr);
+CREATE TABLE IF NOT EXISTS traces (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    trace TEXT NOT NULL,
+    mean REAL,
+    std REAL,
+    PRIMARY KEY (capture_id, trace)
+);
+CREATE TABLE IF NOT EXISTS provenance (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    source_size INTEGER,
+    source_mtime_ns INTEGER,
+    source_sha256 TEXT,
+    converted TEXT,
+    tool TEXT,
+    max_error REAL,
+    note TEXT
+);
+'''
+
+_LEGACY_NAME = re.compile(r'^\D*(\d{2})(\d{2})(\d{2})-(\d{2})(\d{2})$')
+
+
+class Catalog:
+    def __init__(self, root: str = '.', fname: str = None):
+        self.root = os.path.abspath(root)
+        self.fname = fname or os.path.join(self.root, DB_NAME)
+        self._lock = threading.Lock()
+        # Saves are indexed from executor threads, the lock serialises them
+        self._db = sqlite3.connect(self.fname, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA foreign_keys = ON')
+        self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    #
+    #   Bring the catalog up to date with the files under root. Returns
+    #   (added, removed), the numbers of rows written and dropped.
+    #
+    def update(self, recursive: bool = True, cancel=None):
+        paths = set(scan_files(self.root, recursive))
+        with self._lock:
+            known = {r['path']: (r['size'], r['mtime_ns']) for r in
+                     self._db.execute('SELECT path, size, mtime_ns'
+                                      ' FROM captures')}
+        added = 0
+        for path in sorted(paths):
+            st = os.stat(os.path.join(self.root, path))
+            if known.get(path) == (st.st_size, st.st_mtime_ns):
+                continue
+            check_cancel(cancel)
+            try:
+                self.add(os.path.join(self.root, path))
+                added += 1
+            except Exception as e:
+                print(f'Cannot catalog {path}: {type(e).__name__}: {e}')
+        gone = [p for p in known if p not in paths]
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM captures WHERE path = ?',
+                                 [(p,) for p in gone])
+        return added, len(gone)
+
+    #
+    #   Index one scan file, replacing any row it already has. Returns
+    #   the row id.
+    #
+    def add(self, fname: str, cancel=None) -> int:
+        cap = capturefile.load(fname)
+        st = os.stat(fname)
+        path = self._rel(fname)
+        row = summarize(cap, cancel=cancel)
+        row.update(path=path, size=st.st_size, mtime_ns=st.st_mtime_ns,
+                   format=os.path.splitext(fname)[1].lstrip('.'),
+                   spectrum_path=_spectrum_path(path, self.root))
+        if row['captured'] is None:
+            row['captured'] = name_time(fname) or datetime.fromtimestamp(
+                st.st_mtime).isoformat(timespec='seconds')
+        traces = row.pop('traces')
+        cols = ', '.join(row)
+        marks = ', '.join('?' * len(row))
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM captures WHERE path = ?', (path,))
+            cid = self._db.execute(f'INSERT INTO captures ({cols})'
+                                   f' VALUES ({marks})',
+                                   tuple(row.values())).lastrowid
+            self._db.executemany('INSERT INTO traces VALUES (?, ?, ?, ?)',
+                                 [(cid,) + t for t in traces])
+        return cid
+
+    #
+    #   Captures matching an SQL condition on the captures table, in
+    #   time order, as sqlite3.Row objects.
+    #
+    def query(self, where: str = '1', params=(),
+              order: str = 'captured') -> list:
+        with self._lock:
+            return self._db.execute(f'SELECT * FROM captures WHERE {where}'
+                                    f' ORDER BY {order}', params).fetchall()
+
+    #
+    #   Record that path was made from source. Paths are relative to
+    #   root; info holds any of the other provenance columns.
+    #
+    def add_provenance(self, path: str, source: str, **info) -> None:
+        row = {'path': self._rel(path), 'source': self._rel(source)}
+        row.update(info)
+        cols = ', '.join(row)
+        marks = ', '.join('?' * len(row))
+        with self._lock, self._db:
+            self._db.execute(f'INSERT OR REPLACE INTO provenance ({cols})'
+                             f' VALUES ({marks})', tuple(row.values()))
+
+    def provenance(self, path: str):
+        with self._lock:
+            return self._db.execute('SELECT * FROM provenance WHERE'
+                                    ' path = ?', (self._rel(path),)).fetchone()
+
+    #
+    #   The per trace statistics of one capture, keyed by trace name.
+    #
+    def traces(self, capture_id: int) -> dict:
+        with self._lock:
+            rows = self._db.execute('SELECT trace, mean, std FROM traces'
+                                    ' WHERE capture_id = ?', (capture_id,))
+            return {r['trace']: (r['mean'], r['std']) for r in rows}
+
+    #
+    #   Helpers
+    #
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+
+#
+#   Paths, relative to root, of every scan file under it. Spectra,
+#   harmonic tables, csvcache sidecars and CSVs with a .fcap twin are
+#   left out.
+#
+def scan_files(root: str, recursive: bool = True):
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames[:] = [d for d in dirnames if recursive
+                       and not d.startswith('.')]
+        names = set(files)
+        for f in files:
+            base, ext = os.path.splitext(f)
+            if base.endswith(('Four', 'Harm')):
+                continue
+            if ext == '.csv' and base + capturefile.EXT in names:
+                continue
+            if ext in ('.csv', capturefile.EXT):
+                yield os.path.relpath(os.path.join(dirpath, f), root)
+
+
+#
+#   The catalog fields of one capture as a dict of captures columns
+#   plus 'traces', a list of (name, mean, std). The analysis fields are
+#   None when the scan is too short to fit.
+#
+def summarize(cap, flo: float = NOISE_LO, fhi: float = NOISE_HI,
+              cancel=None) -> dict:
+    if cap.header.get('kind') != 'scan':
+        raise RuntimeError(f'{cap.fname} is not a scan.')
+    snap = cap.snapshot()
+    rate = cap.sample_rate
+    if not rate and snap.npoint > 1:
+        rate = (snap.npoint - 1) / (snap.times[-1] - snap.times[0])
+    duration = cap.header.get('duration') or (snap.npoint / rate
+                                              if rate else 0.0)
+    traces = snap.traces
+    row = {'captured': cap.header.get('saved'), 'sample_rate': rate,
+           'duration': duration, 'npoint': snap.npoint,
+           'channels': json.dumps(cap.header.get('channels')),
+           'config': json.dumps(cap.config),
+           'peak_freq': None, 'signal': None, 'noise': None, 'snr': None,
+           'traces': list(zip(ScanSnapshot.traceNames,
+                              np.mean(traces, axis=1).tolist(),
+                              np.std(traces, axis=1).tolist()))}
+    try:
+        spectra = fourieranalysis.compute_spectra(snap, cancel=cancel)
+        fit = fourieranalysis.fit_noise(spectra, flo, fhi, cancel=cancel)
+    except (RuntimeError, IndexError, ValueError) as e:
+        print(f'No noise fit for {cap.fname}: {e}')
+        return row
+    row.update(peak_freq=float(fit.peak_freq), signal=float(fit.signal),
+               noise=float(fit.noise), snr=float(fit.snr))
+    return row
+
+
+def _spectrum_path(path: str, root: str):
+    base = os.path.splitext(path)[0]
+    for ext in (capturefile.EXT, '.csv'):
+        if os.path.exists(os.path.join(root, base + 'Four' + ext)):
+            return base + 'Four' + ext
+    return None
+
+
+#
+#   Time from an old style name, prefix + %m%d%y-%M%H, or None.
+#
+def name_time(fname: str):
+    m = _LEGACY_NAME.search(os.path.splitext(os.path.basename(fname))[0])
+    if m is None:
+        return None
+    mon, day, yr, minute, hour = (int(g) for g in m.groups())
+    try:
+        return datetime(2000 + yr, mon, day, hour,
+                        minute).isoformat(timespec='seconds')
+    except ValueError:
+        return None
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    cat = Catalog(sys.argv[1] if len(sys.argv) > 1 else '.')
+    t0 = time.perf_counter()
+    added, removed = cat.update()
+    print(f'{added} captures indexed, {removed} removed, in'
+          f' {time.perf_counter() - t0:.2f} s')
+    if len(sys.argv) > 2:
+        for r in cat.query(sys.argv[2]):
+            print(f"{r['captured']}  {r['path']:40s} {r['sample_rate']:10.1f}"
+                  f" {r['duration']:8.2f} {r['snr'] or float('nan'):8.2f}")
+    cat.close()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+comparewidget.py
+Faraday
+
+A window overlaying, or stacking, one trace of many captures, spectra
+from different days say, drawn from a comparison.Comparison.
+
+    python comparewidget.py "old scans" .
+    python comparewidget.py --catalog . --where "snr > 100"
+    python comparewidget.py "old scans" --scans --trace V1-V2
+
+Each capture has its own curve and a line in the list beside the
+graph, where it can be hidden. A curve is only given what the view
+needs, and a hidden one is given nothing. Views are redrawn a moment
+after panning or zooming stops, and only for curves whose data no
+longer cover the view at the resolution it needs. Stacked curves are
+offset by the spacing times their place in the list, or with a log
+y axis multiplied by 10**(spacing*place).
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import sys
+import argparse
+
+#
+#   PyQt5 imports for the GUI
+#
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
+from PyQt5.QtWidgets import (QApplication, QCheckBox, QHBoxLayout,
+                             QListWidget, QListWidgetItem, QVBoxLayout,
+                             QWidget)
+#
+#   PyQtGraph imports
+#
+from pyqtgraph import PlotWidget, intColor, mkPen, setConfigOption
+#
+#   Our imports
+#
+import bcwidgets
+import comparison
+from comparison import Comparison
+
+DEFAULT_WIDTH = 1000    # Pixels, for a view not yet laid out
+SETTLE_MS = 50          # Redraw this long after the view stops moving
+
+
+class CompareWidget(QWidget):
+    def __init__(self, comp: Comparison, trace: str = 'Vdiv',
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.comp = comp
+        self.setWindowTitle(f'Compare {len(comp.members)} captures')
+        setConfigOption('background', 'w')
+        setConfigOption('foreground', 'k')
+        layout0 = QHBoxLayout()
+        self.graph = PlotWidget(parent=self)
+        self.graph.showGrid(x=True, y=True)
+        layout0.addWidget(self.graph, stretch=4)
+        #
+        #   Controls and the list of captures at the side
+        #
+        side = QVBoxLayout()
+        names = comp.columns()
+        self.trace = bcwidgets.NamedCombo('Trace', names)
+        if trace in names:
+            self.trace.box.setCurrentIndex(names.index(trace))
+        self.trace.box.currentIndexChanged.connect(self.on_change)
+        side.addLayout(self.trace.layout)
+        self.logY = QCheckBox('Log y axis')
+        self.logY.stateChanged.connect(self.on_change)
+        side.addWidget(self.logY)
+        self.stack = QCheckBox('Stack')
+        self.stack.stateChanged.connect(self.on_change)
+        side.addWidget(self.stack)
+        self.spacing = bcwidgets.NamedFloatEdit('Spacing', 1.0)
+        self.spacing.box.editingFinished.connect(self.on_change)
+        side.addLayout(self.spacing.layout)
+        self.list = QListWidget()
+        n = max(len(comp.members), 9)
+        for k, m in enumerate(comp.members):
+            item = QListWidgetItem(m.label if m.error is None
+                                   else f'{m.label} ({m.error})')
+            item.setForeground(intColor(k, hues=n))
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if m.error is None
+                               else Qt.Unchecked)
+            self.list.addItem(item)
+        self.list.itemChanged.connect(self.on_change)
+        side.addWidget(self.list)
+        layout0.addLayout(side, stretch=1)
+        self.setLayout(layout0)
+        #
+        #   One curve per capture, made when first shown, with the
+        #   window and offset of what it was last given.
+        #
+        self._curves = [None] * len(comp.members)
+        self._drawn = [None] * len(comp.members)
+        self._settle = QTimer(self)
+        self._settle.setSingleShot(True)
+        self._settle.timeout.connect(self.redraw)
+        vb = self.graph.getViewBox()
+        vb.sigXRangeChanged.connect(self.on_view_moved)
+        vb.sigResized.connect(self.on_view_moved)
+        x0, x1 = comp.extent()
+        self.graph.setXRange(x0, x1, padding=0)
+
+    @pyqtSlot()
+    def on_view_moved(self):
+        self._settle.start(SETTLE_MS)
+
+    # Anything but the view changing redraws every curve
+    @pyqtSlot()
+    def on_change(self, *args):
+        self._drawn = [None] * len(self._drawn)
+        self.graph.setLogMode(y=self.logY.isChecked())
+        self.redraw()
+
+    #
+    #   Give each shown curve what the view needs, if it does not have
+    #   it already, and empty the hidden ones.
+    #
+    @pyqtSlot()
+    def redraw(self):
+        if not self.isVisible():
+            return
+        vb = self.graph.getViewBox()
+        x0, x1 = vb.viewRange()[0]
+        npix = int(vb.width()) or DEFAULT_WIDTH
+        name = self.trace.text()
+        place = 0
+        for k, m in enumerate(self.comp.members):
+            shown = (m.error is None
+                     and self.list.item(k).checkState() == Qt.Checked)
+            if not shown:
+                if self._curves[k] is not None and self._drawn[k] is not None:
+                    self._curves[k].setData([], [])
+                    self._drawn[k] = None
+                continue
+            offset = self._offset(place)
+            place += 1
+            try:
+                self._draw(k, name, x0, x1, npix, offset)
+            except (OSError, RuntimeError, ValueError, KeyError) as e:
+                m.error = str(e)
+                print(f'Cannot draw {m.path}: {e}')
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.redraw()
+
+    def closeEvent(self, event):
+        self.comp.close()
+        super().closeEvent(event)
+
+    #
+    #   Helpers
+    #
+    def _draw(self, k, name, x0, x1, npix, offset):
+        drawn = self._drawn[k]
+        if drawn is not None:
+            (j0, j1, step), off = drawn
+            i0, i1, want = self.comp.needs(k, x0, x1, npix)
+            if off == offset and step == want and j0 <= i0 and i1 <= j1:
+                return
+        x, y, window = self.comp.view(k, name, x0, x1, npix)
+        if self.stack.isChecked():
+            y = y * offset if self.logY.isChecked() else y + offset
+        if self._curves[k] is None:
+            colour = intColor(k, hues=max(len(self._curves), 9))
+            self._curves[k] = self.graph.plot(pen=mkPen(colour))
+            self._curves[k].setToolTip(self.comp.members[k].label)
+        self._curves[k].setData(x, y)
+        self._drawn[k] = (window, offset)
+
+    def _offset(self, place):
+        if not self.stack.isChecked():
+            return None
+        try:
+            spacing = self.spacing.value()
+        except ValueError:
+            spacing = 1.0
+        if self.logY.isChecked():
+            return 10.0**(spacing*place)
+        return spacing*place
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Overlay one trace of many'
+                                 ' captures.')
+    ap.add_argument('paths', nargs='*',
+                    help='directories or glob patterns of captures')
+    ap.add_argument('--catalog', default=None,
+                    help='data root whose catalog to choose captures from')
+    ap.add_argument('--where', default='1',
+                    help='SQL condition on the catalog captures table')
+    ap.add_argument('--scans', action='store_true',
+                    help='compare scans rather than their spectra')
+    ap.add_argument('--trace', default='Vdiv', help='trace to show')
+    ap.add_argument('--recursive', action='store_true',
+                    help='also look in subdirectories')
+    args = ap.parse_args(argv)
+
+    paths = comparison.find_files(args.paths, not args.scans,
+                                  args.recursive) if args.paths else []
+    labels = [None] * len(paths)
+    if args.catalog is not None:
+        more, names = comparison.from_catalog(args.catalog, args.where,
+                                              spectra=not args.scans)
+        paths += more
+        labels += names
+    if not paths:
+        print('No captures to compare')
+        return 1
+    comp = Comparison(paths, labels)
+    n = comp.prepare(progress=lambda done, total:
+                     print(f'Prepared {done} of {total} CSV files'))
+    print(f'Comparing {n} captures')
+    app = QApplication(sys.argv)
+    w = CompareWidget(comp, args.trace)
+    w.resize(1200, 700)
+    w.show()
+    return app.exec_()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+comparison.py
+Faraday
+
+The data side of comparing many captures at once, spectra from
+different days say, with no Qt dependency. comparewidget.py draws it.
+
+A Comparison holds a list of files, .fcap captures or old CSVs, found
+in directories or from the catalog. Nothing is read until it is
+drawn: a file is opened, as a memory map, the first time one of its
+traces is asked for, and view gives only what a view of npix pixels
+needs, one min/max pair of a trace per pixel column over the x range
+asked for and PAD of a view width either side.
+
+Ranges are read at powers of two. A file with a pyramid, see
+pyramid.py, is read from its coarsest level that is fine enough; one
+without gets a pyramid of the trace built in memory on first use,
+a few percent of the size of the trace. Most files of a comparison
+share an axis, the same frequencies or times, so where on the axis a
+range falls, and the x values of its buckets, are worked out once per
+axis and shared by every file on it. Pyramids, index ranges and
+bucket x values are kept in one least recently used cache of at most
+CACHE_BYTES, so the memory used does not grow with the number of
+files compared or how long they are.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import glob
+from collections import OrderedDict
+
+import numpy as np
+
+import capturefile
+import csvcache
+import pyramid
+from catalog import Catalog
+from fourieranalysis import check_cancel
+
+CACHE_BYTES = 64_000_000
+PAD = 0.5
+
+
+# ****
+#   One file of a comparison, opened when first used
+# ****
+class Member:
+    def __init__(self, path: str, label: str = None):
+        self.path = path
+        self.label = label or os.path.splitext(os.path.basename(path))[0]
+        self.error = None
+        self._cap = None
+        self._axis = None
+
+    @property
+    def cap(self) -> capturefile.CaptureFile:
+        if self._cap is None:
+            self._cap = capturefile.load(self.path)
+        return self._cap
+
+    #
+    #   A key naming the member's axis, the same for every file whose
+    #   axis has the same first and last value and length.
+    #
+    @property
+    def axis(self) -> tuple:
+        if self._axis is None:
+            cap = self.cap
+            name = cap.columns[0]
+            ends = self.x_at(np.array([0, cap.npoint - 1]))
+            self._axis = (name, float(ends[0]), float(ends[1]), cap.npoint)
+        return self._axis
+
+    #
+    #   Axis values at indices idx. An axis kept in the header as its
+    #   start and interval is never built whole.
+    #
+    def x_at(self, idx) -> np.ndarray:
+        axis = self.cap.header.get('axis')
+        if axis is not None:
+            return axis['start'] + idx*axis['interval']
+        return np.asarray(self.cap[self.cap.columns[0]][idx])
+
+    #
+    #   Points j0 to j1 of trace name. Traces derived from V1 and V2
+    #   are made for just those points, not kept whole by the file.
+    #
+    def trace(self, name: str, j0: int = 0, j1: int = None) -> np.ndarray:
+        cap = self.cap
+        if name in cap.header['columns'] or name not in capturefile.DERIVED:
+            return cap[name][j0:j1]
+        v1 = np.asarray(cap['V1'][j0:j1])
+        v2 = np.asarray(cap['V2'][j0:j1])
+        if name == 'V1-V2':
+            return v1 - v2
+        if name == 'V1+V2':
+            return v1 + v2
+        return (v1 - v2) / (v1 + v2)
+
+    def close(self) -> None:
+        self._cap = None
+
+
+class Comparison:
+    def __init__(self, paths, labels=None, cache_bytes: int = CACHE_BYTES):
+        labels = labels or [None] * len(paths)
+        self.members = [Member(p, l) for p, l in zip(paths, labels)]
+        self._cache = _Cache(cache_bytes)
+
+    #
+    #   Make the csvcache sidecars of any old CSVs that have none, in a
+    #   process pool, or one at a time in this thread with workers 0,
+    #   so drawing them later only maps files. Members that cannot be
+    #   read have error set. Returns the number of members that can be
+    #   drawn.
+    #
+    def prepare(self, workers: int = None, progress=None,
+                cancel=None) -> int:
+        stale = [m.path for m in self.members if m.path.endswith('.csv')
+                 and csvcache.cached(m.path) is None]
+        check_cancel(cancel)
+        errors = {}
+        if stale and workers == 0:
+            for fname in stale:
+                check_cancel(cancel)
+                try:
+                    csvcache.load(fname)
+                except Exception as e:
+                    errors[fname] = f'{type(e).__name__}: {e}'
+        elif stale:
+            _, errors = csvcache.load_many(stale, workers, progress)
+        for m in self.members:
+            if m.path in errors:
+                m.error = errors[m.path]
+                print(f'Cannot compare {m.path}: {m.error}')
+        check_cancel(cancel)
+        return len(self.usable())
+
+    def usable(self) -> list:
+        return [m for m in self.members if m.error is None]
+
+    #
+    #   The traces that can be compared, those of the first member
+    #   after its axis.
+    #
+    def columns(self) -> list:
+        for m in self.usable():
+            try:
+                return m.cap.columns[1:]
+            except (OSError, RuntimeError, ValueError) as e:
+                m.error = str(e)
+        return []
+
+    #
+    #   The smallest and largest x of all the members, read from the
+    #   ends of each axis only.
+    #
+    def extent(self):
+        ends = [m.axis[1:3] for m in self.usable()]
+        if not ends:
+            return 0.0, 1.0
+        return min(e[0] for e in ends), max(e[1] for e in ends)
+
+    #
+    #   Trace name of member k between x0 and x1, reduced for a view
+    #   npix pixels wide. Returns (x, y, window) where window is
+    #   (j0, j1, step), the points covered and the points a bucket;
+    #   another view inside the window at the same step needs no new
+    #   data. With step 1 x and y are the points themselves, otherwise
+    #   each bucket gives its min at its first x and its max at its
+    #   last.
+    #
+    def view(self, k: int, name: str, x0: float, x1: float, npix: int):
+        m = self.members[k]
+        axis = m.axis
+        n = axis[3]
+        i0, i1, step = self.needs(k, x0, x1, npix)
+        level = int(np.log2(step))
+        pad = int(PAD*max(i1 - i0, 1))
+        b0 = max(i0 - pad, 0) // step
+        b1 = -(-min(i1 + pad, n) // step)
+        j0, j1 = b0*step, min(b1*step, n)
+        if step == 1:
+            x = self._cache.get(('x', axis, j0, j1, 1),
+                                lambda: m.x_at(np.arange(j0, j1)))
+            return x, m.trace(name, j0, j1), (j0, j1, 1)
+        lo, hi = self._buckets(m, name, level, b0, b1)
+        x = self._cache.get(('x', axis, j0, j1, step),
+                            lambda: self._bucket_x(m, j0, j1, step))
+        y = np.column_stack((lo, hi)).ravel()
+        return x, y, (j0, j1, step)
+
+    #
+    #   The points of member k between x0 and x1 and the points a
+    #   bucket would hold in a view npix pixels wide, as (i0, i1, step).
+    #
+    def needs(self, k: int, x0: float, x1: float, npix: int):
+        m = self.members[k]
+        i0, i1 = self._cache.get(('range', m.axis, x0, x1),
+                                 lambda: self._index_range(m, x0, x1))
+        level = pyramid.choose_level(max(i1 - i0, 1), max(npix, 1))
+        return i0, i1, 2**level
+
+    def close(self) -> None:
+        for m in self.members:
+            m.close()
+        self._cache.clear()
+
+    #
+    #   Helpers
+    #
+    def _index_range(self, m, x0, x1):
+        n = m.axis[3]
+        axis = m.cap.header.get('axis')
+        if axis is not None:
+            i0 = int(np.floor((x0 - axis['start']) / axis['interval']))
+            i1 = int(np.ceil((x1 - axis['start']) / axis['interval'])) + 1
+        else:
+            i0, i1 = np.searchsorted(m.cap[m.axis[0]], (x0, x1))
+        return (int(np.clip(i0 - 1, 0, n)), int(np.clip(i1 + 1, 0, n)))
+
+    def _bucket_x(self, m, j0, j1, step):
+        starts = np.arange(j0, j1, step)
+        ends = np.minimum(starts + step, j1) - 1
+        return np.column_stack((m.x_at(starts), m.x_at(ends))).ravel()
+
+    #
+    #   Min and max of buckets b0 to b1 of 2**level points, from the
+    #   coarsest pyramid level at or below level, the file's own or one
+    #   built here, reduced the rest of the way.
+    #
+    def _buckets(self, m, name, level, b0, b1):
+        levels = self._levels(m, name)
+        stored = [k for k in levels if k <= level]
+        if not stored:
+            step = 2**level
+            return pyramid.reduce(m.trace(name, b0*step, b1*step), step)[:2]
+        have = max(stored)
+        f = 2**(level - have)
+        lo, hi = levels[have]
+        lo = lo[b0*f:b1*f]
+        hi = hi[b0*f:b1*f]
+        if f == 1:
+            return np.array(lo), np.array(hi)
+        return pyramid.reduce(lo, f)[0], pyramid.reduce(hi, f)[1]
+
+    #
+    #   A dict of level to (min, max) of the trace. The file's pyramid
+    #   sections are mapped, not read; otherwise one is built.
+    #
+    def _levels(self, m, name) -> dict:
+        cap = m.cap
+        pyr = cap.header.get('pyramid')
+        if pyr is not None and name in pyr['columns']:
+            col = pyr['columns'].index(name)
+            return {k: (cap.section(f'pyramid{k}')[0, col],
+                        cap.section(f'pyramid{k}')[1, col])
+                    for k in pyr['levels']}
+
+        def build():
+            levels = pyramid.build(m.trace(name)[None, :])
+            return {k: (v[0, 0], v[1, 0]) for k, v in levels.items()}
+        return self._cache.get(('pyramid', m.path, name), build)
+
+
+#
+#   The spectra (Four) files, or with spectra False the scans, named
+#   by directories or glob patterns, once each and in name order. A
+#   CSV with a .fcap twin is left out.
+#
+def find_files(args, spectra: bool = True, recursive: bool = False) -> list:
+    if not spectra:
+        import reprocess
+        return reprocess.expand(args, recursive)
+    found = set()
+    for arg in args:
+        if os.path.isdir(arg):
+            pattern = os.path.join(glob.escape(arg),
+                                   '**' if recursive else '', '*Four.*')
+        else:
+            pattern = arg
+        found.update(f for f in glob.glob(pattern, recursive=recursive)
+                     if f.endswith(('Four.csv', 'Four' + capturefile.EXT))
+                     and csvcache.CACHE_DIR not in f.split(os.sep))
+    return sorted(os.path.normpath(f) for f in found
+                  if not (f.endswith('.csv') and f[:-len('.csv')]
+                          + capturefile.EXT in found))
+
+
+#
+#   The files of captures in the catalog at root matching an SQL
+#   condition, see Catalog.query, as (paths, labels) with each labelled
+#   by when it was taken. With spectra, captures without a spectrum
+#   file are left out.
+#
+def from_catalog(root: str, where: str = '1', params=(),
+                 spectra: bool = True):
+    cat = Catalog(root)
+    try:
+        rows = cat.query(where, params)
+    finally:
+        cat.close()
+    paths = []
+    labels = []
+    for r in rows:
+        path = r['spectrum_path'] if spectra else r['path']
+        if path is None:
+            continue
+        paths.append(os.path.join(root, path))
+        labels.append(f'{r["captured"] or ""} {os.path.basename(path)}'
+                      .strip())
+    return paths, labels
+
+
+# ****
+#   Least recently used cache of arrays, bounded by their total size
+# ****
+class _Cache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+
+    #
+    #   The value under key, made by make() if it is not held.
+    #
+    def get(self, key, make):
+        if key in self._items:
+            self._items.move_to_end(key)
+            return self._items[key][0]
+        value = make()
+        size = _nbytes(value)
+        self._items[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes and len(self._items) > 1:
+            _, (_, old) = self._items.popitem(last=False)
+            self.nbytes -= old
+        return value
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.nbytes = 0
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 64
@@ -15,7 +15,9 @@ Created on 2/4/2023
 #
 #   PyQt5 imports for the GUI
 #
-from PyQt5.QtCore import pyqtSlot
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 from PyQt5.QtWidgets import (QComboBox, QHBoxLayout, QLineEdit, QPushButton,
                              QVBoxLayout, QWidget, QFormLayout, QSpacerItem,
                              QGroupBox, QSizePolicy)
@@ -26,6 +28,54 @@ from PyQt5.QtWidgets import (QComboBox, QHBoxLayout, QLineEdit, QPushButton,
 #   Import our configuration
 #
 from fconfig import FConfig
+import startup
+
+#
+#   NI devices on this machine as a list of 'name product' strings.
+#   Asking the system is slow, so it is done once, off the GUI thread,
+#   and the answer kept for every later Configurator.
+#
+_devices = None
+_devLock = threading.Lock()
+
+
+def find_devices() -> list:
+    global _devices
+    with _devLock:
+        if _devices is None:
+            import nidaqmx.system
+            daqsys = nidaqmx.system.System.local()
+            _devices = [f"{dev.name} {dev.product_type}"
+                        for dev in daqsys.devices]
+        return _devices
+
+
+# ******************************************************************
+#
+#   Runs find_devices on a thread and reports back with found, or
+#   failed if the NI system could not be asked.
+#
+# ******************************************************************
+class DeviceFinder(QObject):
+    found = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            devices = find_devices()
+        except Exception as e:
+            self._emit(self.failed, f'{type(e).__name__}: {e}')
+            return
+        self._emit(self.found, devices)
+
+    def _emit(self, signal, value):
+        try:
+            signal.emit(value)
+        except RuntimeError:
+            pass    # The Configurator went away first
 
 
 class Configurator(QWidget):
@@ -50,27 +100,19 @@ class Configurator(QWidget):
         sysPanel.setLayout(sysLayout)
         #
         # Input parameters
-        # First build description of DAQ system if we have
-        # a valid device name in the incoming cfg
+        # The devices offered are those in the incoming cfg until the
+        # DAQ system has been asked, in the background, if we have a
+        # valid device name in the cfg.
         #
         self.devList = []
         self.chanList = ['ai0', 'ai1', 'ai2', 'ai3',
                          'ai4', 'ai5', 'ai6', 'ai7']
-        if cfg.inputs_get('InDev').startswith('Dev'):
-            import nidaqmx.system
-            daqsys = nidaqmx.system.System.local()
-            for dev in daqsys.devices:
-                self.devList.append(dev)
         # Then the panel
         inputPanel = QGroupBox('Input parameters')
         inputLayout = QFormLayout()
         # Device
         self.inDev = QComboBox()
-        i = 0
-        for d in self.devList:
-            self.inDev.insertItem(i, f"{d.name} {d.product_type}")
-            i += 1
-        self.inDev.setCurrentIndex(0)
+        self.inDev.addItem(cfg.inputs_get('InDev'))
         inputLayout.addRow('Input device', self.inDev)
         # Voltage 1 input
         self.inV1 = QComboBox()
@@ -111,11 +153,7 @@ class Configurator(QWidget):
         outputLayout = QFormLayout()
         # Device
         self.outDev = QComboBox()
-        i = 0
-        for d in self.devList:
-            self.outDev.insertItem(i, f"{d.name} {d.product_type}")
-            i += 1
-        self.outDev.setCurrentIndex(0)
+        self.outDev.addItem(cfg.outputs_get('OutDev'))
         outputLayout.addRow('Output device', self.outDev)
         outputPanel.setLayout(outputLayout)
         #
@@ -153,6 +191,37 @@ class Configurator(QWidget):
                              QSizePolicy.Expanding)
         configLayout.addItem(vSpace)
         self.setLayout(configLayout)
+        if cfg.inputs_get('InDev').startswith('Dev'):
+            self.finder = DeviceFinder(self)
+            self.finder.found.connect(self.on_devices_found)
+            self.finder.failed.connect(self.on_devices_failed)
+            self.finder.start()
+
+    #
+    #   Offer the devices found, keeping the configured ones selected
+    #   if they are still there.
+    #
+    @pyqtSlot(object)
+    def on_devices_found(self, devices):
+        startup.mark(f'{len(devices)} NI devices found')
+        if not devices:
+            return
+        self.devList = list(devices)
+        for box in (self.inDev, self.outDev):
+            current = box.currentText()
+            box.clear()
+            box.addItems(self.devList)
+            names = [d.split(' ')[0] for d in self.devList]
+            if current in self.devList:
+                box.setCurrentIndex(self.devList.index(current))
+            elif current.split(' ')[0] in names:
+                box.setCurrentIndex(names.index(current.split(' ')[0]))
+            else:
+                box.setCurrentIndex(0)
+
+    @pyqtSlot(str)
+    def on_devices_failed(self, msg):
+        print(f'Could not list NI devices: {msg}')
 
     def update(self):
         # Work through all the fields and copy values into config
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+csvcache.py
+Faraday
+
+Fast loading of the archive of old CSV captures.
+
+Each CSV is parsed once and its columns written unchanged to a binary
+sidecar, <dir>/.fcache/<name>.csv.fcap, in the capturefile format.
+The sidecar records the size and modification time of the CSV it came
+from, and is used only while those still match, so an edited or
+replaced CSV is parsed again. After the first load a capture is a
+memory map of its sidecar and costs next to nothing until its columns
+are touched.
+
+load_many parses the files that have no valid sidecar in a process
+pool, as the parse is CPU bound, and opens the rest directly. A file
+that cannot be read is reported and left out rather than stopping the
+whole load.
+
+Run as a script to build the cache for whole directories,
+    python csvcache.py . "old scans"
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import sys
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import capturefile
+from capturefile import CaptureFile
+
+CACHE_DIR = '.fcache'
+
+
+def cache_name(fname: str) -> str:
+    head, tail = os.path.split(os.path.abspath(fname))
+    return os.path.join(head, CACHE_DIR, tail + capturefile.EXT)
+
+
+#
+#   The sidecar for fname if it exists and still matches the CSV,
+#   otherwise None.
+#
+def cached(fname: str):
+    cname = cache_name(fname)
+    if not os.path.exists(cname):
+        return None
+    try:
+        cap = CaptureFile.open(cname)
+    except (OSError, RuntimeError, ValueError):
+        return None
+    if cap.header.get('source') != _stamp(fname):
+        return None
+    return cap
+
+
+#
+#   Parse fname and write its sidecar. write_capture renames the
+#   sidecar into place once it is complete, so a reader, or another
+#   worker converting the same file, never sees half of one. Returns
+#   the sidecar name.
+#
+def build(fname: str) -> str:
+    stamp = _stamp(fname)
+    names, data = capturefile.read_csv(fname)
+    kind = 'spectrum' if names[0] == 'freq' else 'scan'
+    cname = cache_name(fname)
+    os.makedirs(os.path.dirname(cname), exist_ok=True)
+    capturefile.write_capture(cname, names, data,
+                              {'kind': kind, 'source': stamp})
+    return cname
+
+
+#
+#   One CSV as a CaptureFile, from its sidecar when there is a valid
+#   one. If the sidecar cannot be written, say on a read only share,
+#   the parsed data is returned directly.
+#
+def load(fname: str) -> CaptureFile:
+    cap = cached(fname)
+    if cap is not None:
+        return cap
+    try:
+        return CaptureFile.open(build(fname))
+    except OSError as e:
+        print(f'Cannot cache {fname}: {e}')
+        return CaptureFile.fromCSV(fname)
+
+
+#
+#   Load many CSVs. Returns (captures, errors), dicts keyed by file name
+#   in the order given, of CaptureFile and of the error message for
+#   files that could not be read. progress, if given, is called as
+#   progress(done, total) as files finish.
+#
+def load_many(fnames, workers: int = None, progress=None):
+    fnames = list(fnames)
+    found = {}
+    errors = {}
+    stale = []
+    for fname in fnames:
+        cap = cached(fname)
+        if cap is None:
+            stale.append(fname)
+        else:
+            found[fname] = cap
+    done = len(found)
+    if progress is not None:
+        progress(done, len(fnames))
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for fname, (cname, err) in zip(stale,
+                                           pool.map(_build_safe, stale)):
+                if err is None:
+                    found[fname] = CaptureFile.open(cname)
+                else:
+                    errors[fname] = err
+                done += 1
+                if progress is not None:
+                    progress(done, len(fnames))
+    captures = {f: found[f] for f in fnames if f in found}
+    return captures, errors
+
+
+#
+#   The CSVs in a directory, sorted by name. Sidecars are not listed.
+#
+def find_csv(root: str, recursive: bool = False) -> list:
+    pattern = os.path.join(glob.escape(root), '**' if recursive else '',
+                           '*.csv')
+    return sorted(f for f in glob.glob(pattern, recursive=recursive)
+                  if CACHE_DIR not in f.split(os.sep))
+
+
+#
+#   Helpers
+#
+def _stamp(fname: str) -> dict:
+    st = os.stat(fname)
+    return {'name': os.path.basename(fname), 'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns}
+
+
+#
+#   For the pool: errors come back as text so one bad file does not
+#   abort the map.
+#
+def _build_safe(fname: str):
+    try:
+        return build(fname), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+if __name__ == '__main__':
+    dirs = sys.argv[1:] or ['.']
+    fnames = [f for d in dirs for f in find_csv(d)]
+    t0 = time.perf_counter()
+    nfresh = sum(cached(f) is not None for f in fnames)
+    caps, errs = load_many(fnames)
+    t1 = time.perf_counter()
+    npoint = sum(c.npoint for c in caps.values())
+    print(f'{len(caps)} of {len(fnames)} files, {npoint} points, in'
+          f' {t1 - t0:.2f} s ({nfresh} already cached)')
+    for fname, err in errs.items():
+        print(f'Could not read {fname}: {err}')
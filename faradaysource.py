@@ -88,7 +88,7 @@ class FaradaySource(VoltageSource):
         res[2] = np.sin(4 * np.pi * t0) * 4
         return res
 
-    def readN(self, n2read: int) -> np.ndarray:
+    def readN(self, n2read: int, tmax=2) -> np.ndarray:
         res = np.zeros((self.n_chan, n2read))
         res[0, :] = np.random.random(n2read) * 0.04
         res[1] = np.random.random(n2read) * 0.04
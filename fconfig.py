@@ -26,6 +26,9 @@ class FConfig:
         self._inDict['NAverage'] = 10.0
         self._inDict['LXLimit'] = 0
         self._inDict['RXLimit'] = 0
+        # Live history kept for saving after the fact, see history.py
+        self._inDict['HistorySeconds'] = 600.0
+        self._inDict['HistoryMB'] = 50.0
 
         # outputs section
         self._outDict = {'OutDev': 'Dev1'}
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fourieranalysis.py
+Faraday
+
+The Fourier, magnetic peak, and noise fit calculations that used to
+live inside RPlotter, pulled out as plain functions on ScanSnapshots.
+Nothing here touches Qt so the functions can be run on a worker
+thread by the AnalysisExecutor, or from scripts.
+
+Every long running function takes an optional cancel argument, a
+threading.Event. When it is set the function gives up at its next
+check point by raising AnalysisCancelled.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+
+from scansnapshot import ScanSnapshot
+import capturefile
+
+#
+#   Only the first PEAK_BINS bins of the spectrum are plotted and
+#   searched for the modulation peak. The noise fit only looks below
+#   NOISE_FMAX Hz.
+#
+PEAK_BINS = 600
+NOISE_FMAX = 25.0
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+def check_cancel(cancel) -> None:
+    if cancel is not None and cancel.is_set():
+        raise AnalysisCancelled()
+
+
+# ******************************************************************
+#
+#   The spectra of all six traces of one scan.
+#   spec holds the complex rfft of each trace, one row per trace in
+#   IScan order, and mag holds their magnitudes. npoint is the length
+#   of the transformed traces.
+#
+# ******************************************************************
+class SpectrumSet:
+    traceNames = ScanSnapshot.traceNames
+
+    def __init__(self, freq: np.ndarray, spec: np.ndarray, npoint=None):
+        self.freq = freq
+        self.spec = spec
+        self.mag = np.absolute(spec)
+        if npoint is None:
+            npoint = 2 * (spec.shape[1] - 1)
+        self.npoint = npoint
+
+    def saveTo(self, fname: str):
+        darray = np.vstack((self.freq, self.mag)).T
+        hdr = 'freq,V1,V2,Vm,V1-V2,V1+V2,Vdiv'
+        np.savetxt(fname, darray, header=hdr, delimiter=', ')
+
+
+# ******************************************************************
+#
+#   Result of a noise fit. Keeps the arrays used for the fit so the
+#   GUI can draw its diagnostic plot.
+#
+# ******************************************************************
+class NoiseFit:
+    def __init__(self, peak_index, peak_freq, signal, noise,
+                 slope, intercept, window, cleaned, fit):
+        self.peak_index = peak_index
+        self.peak_freq = peak_freq
+        self.signal = signal
+        self.noise = noise
+        self.snr = signal / noise if noise != 0 else np.inf
+        self.slope = slope
+        self.intercept = intercept
+        self.window = window      # (freq, Vdiv) below NOISE_FMAX
+        self.cleaned = cleaned    # same with the peak removed
+        self.fit = fit            # (freq, fitted line) in fit range
+
+
+#
+#   Transform all six traces in one call. The frequency axis follows
+#   the original RPlotter convention of running from 0 to the Nyquist
+#   frequency of the first sample step.
+#
+def compute_spectra(snap: ScanSnapshot, cancel=None) -> SpectrumSet:
+    check_cancel(cancel)
+    spec = np.fft.rfft(snap.traces, axis=1)
+    check_cancel(cancel)
+    fmax = 0.5/(snap.times[1] - snap.times[0])
+    freq = np.linspace(0, fmax, spec.shape[1])
+    return SpectrumSet(freq, spec, snap.npoint)
+
+
+#
+#   Index into the spectrum of the modulation peak, the largest Vm
+#   bin in the displayed range, skipping DC.
+#
+def magnetic_peak(spectra: SpectrumSet, nbin: int = PEAK_BINS) -> int:
+    return 1 + int(np.argmax(spectra.mag[2, 1:nbin]))
+
+
+#
+#   Return (x, y) restricted to start <= x <= end.
+#
+def adjust_fit_range(data, start, end):
+    x = np.asarray(data[0])
+    y = np.asarray(data[1])
+    keep = (x >= start) & (x <= end)
+    return (x[keep], y[keep])
+
+
+#
+#   Fit a line to the Vdiv spectrum between flo and fhi Hz, with the
+#   modulation peak removed, on the assumption that the line gives the
+#   noise at every frequency. The noise is the line evaluated at the
+#   peak frequency.
+#
+def fit_noise(spectra: SpectrumSet, flo: float, fhi: float,
+              peak_index: int = None, cancel=None) -> NoiseFit:
+    check_cancel(cancel)
+    if peak_index is None:
+        peak_index = magnetic_peak(spectra)
+    fx = spectra.freq[1:PEAK_BINS]
+    fy = spectra.mag[5, 1:PEAK_BINS]
+    window = adjust_fit_range((fx, fy), 0, NOISE_FMAX)
+    keep = np.arange(1, 1 + len(fx)) != peak_index
+    cleaned = adjust_fit_range((fx[keep], fy[keep]), 0, NOISE_FMAX)
+    fit_x, fit_y = adjust_fit_range(cleaned, flo, fhi)
+    if len(fit_x) < 2:
+        raise RuntimeError(f'Noise fit range {flo}-{fhi} Hz holds'
+                           f' {len(fit_x)} points, need at least 2.')
+    check_cancel(cancel)
+    slope, intercept = np.polyfit(fit_x, fit_y, 1)
+    peak_freq = spectra.freq[peak_index]
+    noise = slope * peak_freq + intercept
+    return NoiseFit(peak_index, peak_freq, spectra.mag[5, peak_index], noise,
+                    slope, intercept, window, cleaned,
+                    (fit_x, slope * fit_x + intercept))
+
+
+#
+#   Save a scan and its spectra as base_name.fcap and base_nameFour.fcap,
+#   with meta added to both headers. If spectra is None they are
+#   computed here. With nharm > 0 the harmonic table is saved too, as
+#   base_nameHarm.csv. With csv the old text files are written as well.
+#   Returns the names of the files written, the scan first.
+#
+def save_fourier(snap: ScanSnapshot, spectra: SpectrumSet, base_name: str,
+                 nharm: int = 0, sideband: float = 0.0, meta: dict = None,
+                 csv: bool = False, compress: bool = False,
+                 cancel=None) -> list:
+    if spectra is None:
+        spectra = compute_spectra(snap, cancel=cancel)
+    check_cancel(cancel)
+    files = [base_name + capturefile.EXT,
+             base_name + 'Four' + capturefile.EXT]
+    capturefile.save_snapshot(snap, files[0], meta, compress)
+    capturefile.save_spectra(spectra, files[1], meta, compress)
+    if nharm > 0:
+        # harmonics builds on this module so only import it here
+        from harmonics import extract_harmonics
+        table = extract_harmonics(spectra, nharm, sideband, cancel=cancel)
+        files.append(base_name + 'Harm.csv')
+        with capturefile.atomic(files[-1]) as tmp:
+            table.saveTo(tmp)
+    if csv:
+        check_cancel(cancel)
+        files += [base_name + '.csv', base_name + 'Four.csv']
+        with capturefile.atomic(files[-2]) as tmp:
+            snap.saveTo(tmp)
+        with capturefile.atomic(files[-1]) as tmp:
+            spectra.saveTo(tmp)
+    return files
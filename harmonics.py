@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+harmonics.py
+Faraday
+
+Reads the harmonics of the modulation frequency out of a SpectrumSet.
+The fundamental is located on the Vm spectrum, refined to a fraction
+of a bin by fitting a parabola through the peak and its neighbours.
+Then the amplitude and phase of DC and the first nharm harmonics, and
+of nside sidebands either side of each spaced by sideband Hz, are
+picked out of all six traces with a single fancy index into the
+complex spectra.
+
+Amplitudes are single sided peak amplitudes in volts, so a pure
+A*sin(2 pi f t) reads A at its harmonic and the DC row reads the
+trace mean. Phases are in radians relative to the start of the scan.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+
+from fourieranalysis import SpectrumSet, magnetic_peak, check_cancel
+
+N_HARMONIC = 4
+
+
+# ******************************************************************
+#
+#   Amplitudes and phases held as (trace, harmonic, sideband) arrays.
+#   harmonic runs 0..nharm with 0 for DC and sideband runs
+#   -nside..nside. Bins that fall outside the spectrum hold NaN.
+#
+# ******************************************************************
+class HarmonicTable:
+    traceNames = SpectrumSet.traceNames
+    header = 'trace,harmonic,sideband,freq,amplitude,phase'
+
+    def __init__(self, f0, harmonic, sideband, freq, amplitude, phase):
+        self.f0 = f0
+        self.harmonic = harmonic
+        self.sideband = sideband
+        self.freq = freq
+        self.amplitude = amplitude
+        self.phase = phase
+
+    def amp(self, trace: int, h: int, s: int = 0) -> float:
+        return self.amplitude[trace, h, self._side(s)]
+
+    def phi(self, trace: int, h: int, s: int = 0) -> float:
+        return self.phase[trace, h, self._side(s)]
+
+    #
+    #   Total harmonic distortion of one trace, the rms of harmonics
+    #   2 and up over the fundamental. Used on Vm to check the coil
+    #   drive.
+    #
+    def thd(self, trace: int = 2) -> float:
+        a = self.amplitude[trace, :, self._side(0)]
+        return np.sqrt(np.nansum(a[2:]**2)) / a[1]
+
+    #
+    #   One row per (trace, harmonic, sideband) as a structured array.
+    #
+    def rows(self) -> np.ndarray:
+        nt, nh, ns = self.amplitude.shape
+        r = np.empty(nt * nh * ns, dtype=[('trace', 'U8'),
+                                          ('harmonic', 'i4'),
+                                          ('sideband', 'i4'),
+                                          ('freq', 'f8'),
+                                          ('amplitude', 'f8'),
+                                          ('phase', 'f8')])
+        r['trace'] = np.repeat(self.traceNames, nh * ns)
+        r['harmonic'] = np.tile(np.repeat(self.harmonic, ns), nt)
+        r['sideband'] = np.tile(self.sideband, nt * nh)
+        r['freq'] = np.tile(self.freq.ravel(), nt)
+        r['amplitude'] = self.amplitude.ravel()
+        r['phase'] = self.phase.ravel()
+        return r
+
+    def saveTo(self, fname: str):
+        np.savetxt(fname, self.rows(), delimiter=', ', header=self.header,
+                   fmt=('%s', '%d', '%d', '%.9e', '%.9e', '%.9e'))
+
+    def __str__(self):
+        lines = [f'Fundamental {self.f0:.5f} Hz',
+                 'trace     h   s       freq     amplitude     phase']
+        for r in self.rows():
+            lines.append(f'{r[0]:8s} {r[1]:2d} {r[2]:3d} {r[3]:10.4f}'
+                         f' {r[4]:13.6e} {r[5]:9.4f}')
+        return '\n'.join(lines)
+
+    #
+    #   Helpers
+    #
+    def _side(self, s: int) -> int:
+        return s + (len(self.sideband) - 1) // 2
+
+
+#
+#   Fundamental as a fractional bin index on the Vm spectrum.
+#
+def fundamental_bin(spectra: SpectrumSet) -> float:
+    k = magnetic_peak(spectra)
+    m = spectra.mag[2]
+    if 0 < k < len(m) - 1:
+        den = m[k-1] - 2*m[k] + m[k+1]
+        if den != 0:
+            return k + 0.5*(m[k-1] - m[k+1])/den
+    return float(k)
+
+
+def extract_harmonics(spectra: SpectrumSet, nharm: int = N_HARMONIC,
+                      sideband: float = 0.0, nside: int = None,
+                      cancel=None) -> HarmonicTable:
+    check_cancel(cancel)
+    if nside is None:
+        nside = 1 if sideband > 0 else 0
+    nbin = spectra.spec.shape[1]
+    df = spectra.freq[1] - spectra.freq[0]
+    k0 = fundamental_bin(spectra)
+    harmonic = np.arange(nharm + 1)
+    side = np.arange(-nside, nside + 1)
+    idx = np.rint(harmonic[:, None]*k0
+                  + side[None, :]*(sideband/df)).astype(int)
+    valid = (idx >= 0) & (idx < nbin)
+    x = spectra.spec[:, np.clip(idx, 0, nbin - 1)]
+    scale = np.where(idx == 0, 1.0, 2.0) / spectra.npoint
+    amplitude = np.where(valid, np.absolute(x) * scale, np.nan)
+    phase = np.where(valid, np.angle(x), np.nan)
+    freq = np.where(valid, spectra.freq[np.clip(idx, 0, nbin - 1)], np.nan)
+    return HarmonicTable(k0 * df, harmonic, side, freq, amplitude, phase)
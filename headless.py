@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+headless.py
+Faraday
+
+Takes and analyses scans without the GUI, for unattended runs on a
+machine with no display.
+
+    python headless.py single --duration 2 --rate 10000 --shots 10
+        --interval 60
+    python headless.py live --duration 10 --update-rate 10 --sweeps 6
+
+The source is chosen from the configuration file, Faraday.toml by
+default, as the GUI chooses it, so with no input device set the
+simulator is used. Each single shot is Fourier transformed and its
+noise fitted between --flo and --fhi; each live sweep reports the
+mean and standard deviation of every trace, and a live run ends with
+the Allan deviation of Vdiv. Scans are saved as .fcap files named by
+a CaptureSession under DataPrefix and added to its catalog, unless
+--no-save is given.
+
+Only the Qt-free modules are imported, scanmodel rather than iscan,
+so nothing here loads PyQt5, pyqtgraph or matplotlib. The same runs
+can be made from Python with run_single and run_live.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+import capturefile
+import fourieranalysis
+from catalog import Catalog, NOISE_LO, NOISE_HI
+from capturesession import CaptureSession
+from fconfig import FConfig
+from scanmodel import ScanModel, find_source
+from scansnapshot import ScanSnapshot
+
+
+#
+#   Take shots single shots of duration seconds at rate samples/s,
+#   interval seconds apart from start to start. Each is analysed and,
+#   with a session, saved. Returns a list of one result dict a shot.
+#
+def run_single(model: ScanModel, duration: float, rate: int,
+               shots: int = 1, interval: float = 0.0,
+               flo: float = NOISE_LO, fhi: float = NOISE_HI,
+               session: CaptureSession = None, meta: dict = None,
+               compress: bool = False) -> list:
+    results = []
+    t_next = time.monotonic()
+    for shot in range(shots):
+        _wait_until(t_next)
+        t_next += interval
+        model.singleScan(duration, rate)
+        snap = model.snapshot()
+        result = analyse(snap, flo, fhi)
+        if session is not None:
+            result['file'] = _save(session, snap, 'single', meta,
+                                   compress)
+        results.append(result)
+        print(_describe(f'Shot {shot + 1}', result))
+    return results
+
+
+#
+#   Run a live scan of sweeps sweeps of duration seconds, one sample,
+#   the mean of n_average readings, every 1/update_rate seconds. Each
+#   sweep is summarised and, with a session, saved. Returns a list of
+#   one result dict a sweep.
+#
+def run_live(model: ScanModel, duration: float, update_rate: int,
+             n_average: int = 30, sweeps: int = 1,
+             session: CaptureSession = None, meta: dict = None,
+             compress: bool = False) -> list:
+    model.setDuration(duration)
+    model.setNAverage(n_average)
+    model.startScan(update_rate)
+    results = []
+    t_next = time.monotonic()
+    while len(results) < sweeps:
+        _wait_until(t_next)
+        t_next += 1.0 / update_rate
+        if not model.stepScan():
+            continue
+        snap = model.snapshot()
+        result = {'captured': datetime.now().isoformat(),
+                  'traces': _trace_stats(snap)}
+        if session is not None:
+            result['file'] = _save(session, snap, 'live',
+                                   dict(meta or {}, update_rate=update_rate,
+                                        n_average=n_average), compress)
+        results.append(result)
+        print(_describe(f'Sweep {len(results)}', result))
+    model.stopScan()
+    return results
+
+
+#
+#   Fourier transform and noise fit of a snapshot, with the mean and
+#   standard deviation of each trace. A failed fit leaves the fit
+#   fields None.
+#
+def analyse(snap: ScanSnapshot, flo: float = NOISE_LO,
+            fhi: float = NOISE_HI) -> dict:
+    result = {'captured': datetime.now().isoformat(),
+              'traces': _trace_stats(snap), 'peak_freq': None,
+              'signal': None, 'noise': None, 'snr': None}
+    try:
+        spectra = fourieranalysis.compute_spectra(snap)
+        fit = fourieranalysis.fit_noise(spectra, flo, fhi)
+    except (RuntimeError, IndexError, ValueError) as e:
+        print(f'No noise fit: {e}')
+        return result
+    result.update(peak_freq=float(fit.peak_freq), signal=float(fit.signal),
+                  noise=float(fit.noise), snr=float(fit.snr))
+    return result
+
+
+#
+#   Helpers
+#
+def _wait_until(t: float) -> None:
+    delay = t - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _trace_stats(snap: ScanSnapshot) -> list:
+    traces = snap.traces
+    return list(zip(ScanSnapshot.traceNames,
+                    np.mean(traces, axis=1).tolist(),
+                    np.std(traces, axis=1).tolist()))
+
+
+def _save(session, snap, mode, meta, compress) -> str:
+    fname = session.next_name() + capturefile.EXT
+    t0 = time.perf_counter()
+    capturefile.save_snapshot(snap, fname,
+                              dict(meta or {}, mode=mode,
+                                   saved=datetime.now().isoformat()),
+                              compress=compress)
+    session.record(mode, [fname], os.path.getsize(fname),
+                   time.perf_counter() - t0)
+    return fname
+
+
+def _describe(label, result) -> str:
+    text = label + ': ' + ', '.join(f'{name} {mean:.5g}+-{std:.2g}'
+                                    for name, mean, std in result['traces'])
+    if result.get('snr') is not None:
+        text += (f'; peak {result["peak_freq"]:.4g} Hz,'
+                 f' SNR {result["snr"]:.4g}')
+    return text
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Take Faraday scans without'
+                                 ' the GUI.')
+    ap.add_argument('mode', choices=('single', 'live'),
+                    help='single shots or a live scan of averaged samples')
+    ap.add_argument('--config', default='Faraday.toml',
+                    help='configuration file, defaults if it is missing')
+    ap.add_argument('--duration', type=float, default=None,
+                    help='seconds a shot or sweep, default LiveDuration')
+    ap.add_argument('--rate', type=int, default=None,
+                    help='single shot sample rate, default SampleRate')
+    ap.add_argument('--shots', type=int, default=1,
+                    help='number of single shots')
+    ap.add_argument('--interval', type=float, default=0.0,
+                    help='seconds from the start of one shot to the next')
+    ap.add_argument('--update-rate', type=int, default=None,
+                    help='live samples a second, default UpdateRate')
+    ap.add_argument('--navg', type=int, default=30,
+                    help='readings averaged a live sample')
+    ap.add_argument('--sweeps', type=int, default=1,
+                    help='number of live sweeps')
+    ap.add_argument('--flo', type=float, default=NOISE_LO,
+                    help='low end of the noise fit range (Hz)')
+    ap.add_argument('--fhi', type=float, default=NOISE_HI,
+                    help='high end of the noise fit range (Hz)')
+    ap.add_argument('--no-save', action='store_true',
+                    help='analyse only, saving nothing')
+    ap.add_argument('--compress', action='store_true',
+                    help='compress saved captures')
+    args = ap.parse_args(argv)
+
+    cfg = FConfig()
+    if os.path.exists(args.config):
+        cfg.loadFrom(args.config)
+    duration = args.duration or cfg.inputs_get('LiveDuration')
+    model = ScanModel(find_source(cfg))
+    meta = {'channels': list(model.src.chan_names), 'config': cfg._config}
+    session = None
+    if not args.no_save:
+        prefix = cfg._config.get('DataPrefix', 'FData')
+        root = os.path.dirname(prefix) or '.'
+        session = CaptureSession(root, os.path.basename(prefix),
+                                 dict(meta, headless=True))
+        print(f'Saving captures in {session.path}')
+    try:
+        if args.mode == 'single':
+            results = run_single(model, duration,
+                                 args.rate or cfg.inputs_get('SampleRate'),
+                                 args.shots, args.interval, args.flo,
+                                 args.fhi, session, meta, args.compress)
+        else:
+            urate = args.update_rate or int(cfg.inputs_get('UpdateRate'))
+            results = run_live(model, duration, urate, args.navg,
+                               args.sweeps, session, meta, args.compress)
+            tau, adev, _ = model.allan.deviations()
+            for t, d in zip(tau, adev[:, 5]):
+                print(f'Vdiv Allan deviation {d:.4g} at {t:.4g} s')
+    except KeyboardInterrupt:
+        print('Stopped')
+        return 1
+    finally:
+        model.close()
+    if session is not None:
+        catalog = Catalog(root)
+        for r in results:
+            catalog.add(r['file'])
+        catalog.close()
+        print(f'{len(results)} captures saved in {session.path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
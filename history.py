@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+history.py
+Faraday
+
+A bounded record of the recent live stream, so something seen during
+a live scan can still be saved after the sweep that showed it has
+been overwritten.
+
+A History is a ring of the averaged samples of a live run, each its
+time since the run started and V1, V2 and Vm, 32 bytes a sample; the
+other traces are rebuilt from those when a window is taken. It holds
+the last SECONDS of the run, or fewer if that would take more than
+MBYTES. The ring is kept as one row per quantity, so the times it
+holds are contiguous either side of the write slot and a window is
+found by searching those two halves in place. Adding a sample is a
+single column store and taking a window copies only the samples in
+it, so either can be done between samples without holding up
+acquisition.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+
+from scansnapshot import ScanSnapshot
+
+SECONDS = 600.0
+MBYTES = 50.0
+ROW = 4     # t, V1, V2, Vm
+
+
+class History:
+    def __init__(self, rate: float, seconds: float = SECONDS,
+                 mbytes: float = MBYTES):
+        self.rate = rate
+        n = int(seconds * rate)
+        if mbytes:
+            n = min(n, int(mbytes * 1e6) // (8 * ROW))
+        self.size = max(n, 1)
+        self._rows = np.zeros((ROW, self.size))
+        self.count = 0      # Samples added, the latest in slot count-1
+
+    @property
+    def held(self) -> int:
+        return min(self.count, self.size)
+
+    #
+    #   First and last time held, or None when empty.
+    #
+    @property
+    def span(self):
+        if self.count == 0:
+            return None
+        return (self._rows[0, (self.count - self.held) % self.size],
+                self._rows[0, (self.count - 1) % self.size])
+
+    def add(self, t: float, v1: float, v2: float, vm: float) -> None:
+        self._rows[:, self.count % self.size] = (t, v1, v2, vm)
+        self.count += 1
+
+    #
+    #   The samples held between run times t0 and t1, oldest first, as
+    #   a ScanSnapshot. Either end may be None for the oldest or
+    #   latest sample held.
+    #
+    def window(self, t0: float = None, t1: float = None) -> ScanSnapshot:
+        n = self.held
+        start = (self.count - n) % self.size
+        # Oldest first the samples are the ring from start, then from 0
+        parts = []
+        for half in (self._rows[:, start:start + n],
+                     self._rows[:, :max(start + n - self.size, 0)]):
+            i0 = 0 if t0 is None else np.searchsorted(half[0], t0)
+            i1 = (half.shape[1] if t1 is None
+                  else np.searchsorted(half[0], t1, side='right'))
+            parts.append(half[:, i0:i1])
+        rows = np.concatenate(parts, axis=1)
+        duration = rows[0, -1] - rows[0, 0] if rows.shape[1] else 0.0
+        return ScanSnapshot(rows[0], rows[1], rows[2], rows[3],
+                            sample_rate=self.rate, duration=duration)
+
+    #
+    #   The last seconds held, ending ago seconds before the latest
+    #   sample.
+    #
+    def last(self, seconds: float, ago: float = 0.0) -> ScanSnapshot:
+        span = self.span
+        if span is None:
+            return self.window()
+        end = span[1] - ago
+        return self.window(end - seconds, end)
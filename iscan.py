@@ -27,6 +27,9 @@ rate limitation, none markedly successful yet.
 5/10/23 Extend IScan to support single scans so that the
 rplotter always talks to a scan and the data are always
 organized in a scan.
+
+10/19/26 The data side is now scanmodel.ScanModel, which has no Qt
+dependency; IScan adds the plots.
 @author: bcollett
 """
 #
@@ -38,12 +41,14 @@ import time
 #   our imports
 #
 from voltagesource import VoltageSource
-from threeplotwidget import ThreePlotWidget
+from scanmodel import ScanModel
 import ttimer
 # import nipy
 
 
-class IScan():
+
+
+class IScan(ScanModel):
     plotNames = ['PD1 voltage (V)',
                  'PD2 voltage (V)',
                  'Modulation voltage (V)',
@@ -56,43 +61,22 @@ class IScan():
         IScan.nInstance += 1
         self.instance = IScan.nInstance
         print(f'Create IScan {self.instance}')
-        self.src = src
+        super().__init__(src)
         self.plotter = None
-        self.duration = 0.1      # Will be reset when built
-        self.sample_rate = 100_000
-        self.n_sample = int(self.sample_rate * self.duration)
-        self.nAverage = 30
         # These control what gets plotted in each pane
         self.pane1 = 0
         self.pane2 = 1
         self.pane3 = 2
-        self.v1 = np.zeros(self.n_sample)
-        self.v2 = np.zeros(self.n_sample)
-        self.vm = np.zeros(self.n_sample)
-        self.v1mv2 = np.zeros(self.n_sample)
-        self.v1pv2 = np.zeros(self.n_sample)
-        self.div = np.zeros(self.n_sample)
-        self.traces = (self.v1, self.v2, self.vm,
-                       self.v1mv2, self.v1pv2, self.div)
-        self.gvals = [1.0, 1.0, 0.0, 0.0, 0.0, 0.0]   # Starting averages
-        self.gerrs = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]   # and std. devs.
+        # Live lines and what each last drew, as (samples, trace)
+        self.line1 = self.line2 = self.line3 = None
+        self._paneDrawn = [None, None, None]
 
-    def sendPlotsTo(self, threep: ThreePlotWidget):
+    def sendPlotsTo(self, threep: 'ThreePlotWidget'):
         print(f'send plots to {threep}')
         self.plotter = threep
 
-    def setDuration(self, time: float) -> None:
-        self.duration = time
-
-    def setSampleRate(self, rate: int) -> None:
-        self.sample_rate = rate
-        self.src.setDataRate(rate)
-
-    def setUpdateRate(self, rate: int) -> None:
-        self.update_rate = time
-
     def setNAverage(self, nAvg: int) -> None:
-        self.nAverage = nAvg
+        super().setNAverage(nAvg)
         print(f'In setNAverage nAvg = {self.nAverage}')
 
     def plotInPane1(self, idx: int):
@@ -136,18 +120,12 @@ class IScan():
         #   Validate state and arguments.
         #   Note any previous data will be silently deleted.
         #
-        self.update_rate = update_rate
-        self.n_sample = int(self.duration * self.update_rate)
+        super().startScan(update_rate)
         print('nsamp', self.n_sample, self.duration, self.update_rate)
         self.data = np.zeros((3, self.n_sample), dtype=np.float64)
-        self.data[2, 0] = 10
-        self.data[2, 1] = -10
-        self.times = np.linspace(0.0, self.duration, self.n_sample)
-        print(self.n_sample, self.times[-10:])
         self.data[0, :] = np.sin(2*np.pi*self.times)
         self.data[1, :] = np.sin(3*np.pi*self.times)
         self.data[2, :] = 5*np.sin(4*np.pi*self.times)
-#        print(self.times[:10])
         # Build the plots
         if self.plotter:
             self.plotter.g1.clear()
@@ -171,124 +149,44 @@ class IScan():
                                               symbolSize=2, pxMode=True)
         print('Start scan')
         self.tick_rate = ttimer.init()
-        self.scanIndex = 0
-        self.v1 = np.zeros(self.n_sample)
-        self.v2 = np.zeros(self.n_sample)
-        self.vm = np.zeros(self.n_sample)
-        self.v1mv2 = np.zeros(self.n_sample)
-        self.v1pv2 = np.zeros(self.n_sample)
-        self.div = np.zeros(self.n_sample)
-        self.startTime = time.monotonic()
         self._ngap = 5  # Number of samples in gap between old and new data
-        # self._glim = self.n_sample - self._ngap    # REMOVE?
-
-        # self.rdTime = 0
-        # self.calcTime = 0
-        # self.plotTime = 0
-        # self.cnt = 0
-        # self.src.single_init()
+        self._paneDrawn = [None, None, None]
 
     #
-    #   Take and plot one more data point.
-    #   Argument determines whether we maintain the running gap that makes
-    #   it easier to watch in multi-scan mode.
+    #   Take one more data point. Nothing is drawn here; the plotter's
+    #   render timer calls render for the latest data when it has time.
+    #   At the end of a sweep the graph limits are set from the traces.
     #
-    # def stepScan(self, do_gap=True) -> bool:
-    def stepScan(self, do_plot=True) -> bool:
-        # st = ttimer.now()
-        graph_end = False
-        #
-        # Finally, we can actually run the scan.
-        #
-        #        self.data = self.src.readOne()
-        t1 = time.monotonic()
-        # nit1 = ttimer.now()
-        # This line takes 60ms!!
-        tdata = self.src.readAvg(self.nAverage)
-        # tdata = self.src.single_read()
-        # tdata = (0.0, 0.1, 3.4)
-        # tdata = nipy.read(self.nAverage)
-        # nit2 = ttimer.now()
-        # print('iscan ', (nit2-nit1)/self.tick_rate)
-        # self.data = self.src.readOne()
-        # t2 = time.monotonic()
-        i = self.scanIndex
-        # ig = self.scanIndex + self._ngap
-        self.times[i] = t1 - self.startTime
-        self.v1[i] = tdata[0]
-        self.v2[i] = tdata[1]
-        self.vm[i] = tdata[2]
-        self.v1mv2[i] = tdata[0]-tdata[1]
-        self.v1pv2[i] = tdata[0]+tdata[1]
-        self.div[i] = self.v1mv2[i]/self.v1pv2[i]
-        self.traces = (self.v1, self.v2, self.vm,
-                       self.v1mv2, self.v1pv2, self.div)
+    def stepScan(self) -> bool:
+        graph_end = super().stepScan()
+        if graph_end and self.plotter:
+            self._setYRanges()
+        return graph_end
 
-#            self.v1[ig] = self.gval1
-#            self.v2[ig] = self.gval2
-#            self.vm[ig] = self.gval3
-        self.scanIndex += 1
-        #
-        #   Check for end of scan and process if found
-        #
-        if self.scanIndex >= self.n_sample:  # End of graph, reset
-            # print(self.times)
-            # print('')
-            graph_end = True
-            #
-            #   Compute ranges of visible traces and use to set
-            #   graph limits
-            #
-            mx1 = np.max(self.traces[self.pane1])
-            mn1 = np.min(self.traces[self.pane1])
-            r1 = 0.55*(mx1-mn1)
-            a1 = 0.5*(mx1+mn1)
-            self.plotter.g1.setYRange(a1-r1, a1+r1)
-            mx2 = np.max(self.traces[self.pane2])
-            mn2 = np.min(self.traces[self.pane2])
-            r2 = 0.55*(mx2-mn2)
-            a2 = 0.5*(mx2+mn2)
-            self.plotter.g2.setYRange(a2-r2, a2+r2)
-            mx3 = np.max(self.traces[self.pane3])
-            mn3 = np.min(self.traces[self.pane3])
-            r3 = 0.55*(mx3-mn3)
-            a3 = 0.5*(mx3+mn3)
-            self.plotter.g3.setYRange(a3-r3, a3+r3)
-            # Save averages and std. devs.
-            for i in range(6):
-                self.gvals[i] = np.average(self.traces[i])
-                self.gerrs[i] = np.std(self.traces[i])
-#            self.gvals[1] = np.average(self.v2[:-5])
-            self.scanIndex = 0
-            self.startTime = time.monotonic()
-        #
-        #   Update plots
-        #
-        if do_plot:
-            # print('Update live plot')
-            t1c = self.traces[self.pane1].copy()
-            t2c = self.traces[self.pane2].copy()
-            t3c = self.traces[self.pane3].copy()
+    #
+    #   Draw the live traces as they are now, with the running gap that
+    #   makes it easier to watch in multi-scan mode. Only panes that can
+    #   be seen and have had a sample, or a new trace chosen, since they
+    #   were last drawn are sent. Returns whether anything was drawn.
+    #
+    def render(self) -> bool:
+        if self.plotter is None or self.line1 is None:
+            return False
+        drew = False
+        lines = (self.line1, self.line2, self.line3)
+        panes = (self.pane1, self.pane2, self.pane3)
+        for k in range(3):
+            state = (self.steps, panes[k])
+            if (state == self._paneDrawn[k] or lines[k].getViewBox() is None
+                    or not self.plotter.paneVisible(k)):
+                continue
+            tc = self.traces[panes[k]].copy()
             if self.scanIndex > 0:
-                t1c[self.scanIndex:self.scanIndex+self._ngap] = self.gvals[self.pane1]
-                t2c[self.scanIndex:self.scanIndex+self._ngap] = self.gvals[self.pane2]
-                t3c[self.scanIndex:self.scanIndex+self._ngap] = self.gvals[self.pane3]
-            if self.plotter:
-                self.line1.setData(self.times, t1c)
-                self.line2.setData(self.times, t2c)
-                self.line3.setData(self.times, t3c)
-            # print('Update done')
-        # t4 = time.monotonic()
-        # self.rdTime += t2 - t1
-        # self.calcTime += t3 - t2
-        # self.plotTime += t4 - t3
-        # self.cnt += 1
-        #print((ttimer.now() - st)/self.tick_rate)
-        return graph_end
-    
-    def stopScan(self):
-        # self.src.single_close()
-        pass
+                tc[self.scanIndex:self.scanIndex+self._ngap] = self.gvals[panes[k]]
+            lines[k].setData(self.times, tc)
+            self._paneDrawn[k] = state
+            drew = True
+        return drew
     
     
     # A monolithic scan.
@@ -296,73 +194,10 @@ class IScan():
     # wait box.
           
     def singleScan(self, duration, rate):
-        self.setSampleRate(rate)
-        self.duration = duration
         print(f'Single sample duration {duration}')
         print(f'Single sample rate set to {rate}')
-        npoint = int(duration * rate)
-        print(f'Single collect {npoint} points')
-        d = self.src.readN(npoint, tmax=duration+1)
-        self.data = d
-        self.times = np.linspace(0, duration, npoint)
-        self.v1 = d[0, :]
-        self.v2 = d[1, :]
-        self.vm = d[2, :]
-        self.v1mv2 = self.v1 - self.v2
-        self.v1pv2 = self.v1 + self.v2
-        self.div = self.v1mv2/self.v1pv2
-        self.traces = (self.v1, self.v2, self.vm,
-                        self.v1mv2, self.v1pv2, self.div)
-        #
-        #   Get scaling
-        #
-        mx1 = np.max(self.traces[self.pane1])
-        mn1 = np.min(self.traces[self.pane1])
-        r1 = 0.55*(mx1-mn1)
-        a1 = 0.5*(mx1+mn1)
-        self.plotter.g1.setYRange(a1-r1, a1+r1)
-        mx2 = np.max(self.traces[self.pane2])
-        mn2 = np.min(self.traces[self.pane2])
-        r2 = 0.55*(mx2-mn2)
-        a2 = 0.5*(mx2+mn2)
-        self.plotter.g2.setYRange(a2-r2, a2+r2)
-        mx3 = np.max(self.traces[self.pane3])
-        mn3 = np.min(self.traces[self.pane3])
-        r3 = 0.55*(mx3-mn3)
-        a3 = 0.5*(mx3+mn3)
-        self.plotter.g3.setYRange(a3-r3, a3+r3)
-        self.plotter.setXRangeLabel(0.0, duration, 'Time (s)')
-        # Save averages and std. devs.
-        for i in range(6):
-            self.gvals[i] = np.average(self.traces[i])
-            self.gerrs[i] = np.std(self.traces[i])
-        #
-        #   Plot with titles and styles
-        #
-        if self.plotter:
-            self.plotter.g1.clear()
-            self.plotter.g2.clear()
-            self.plotter.g3.clear()
-            print('Using 3-trace plotter')
-            print(self.pane1, self.pane2, self.pane3)
-            self.plotter.g1.plot(x=self.times,
-                                  y=self.traces[self.pane1],
-                                  name= IScan.plotNames[0], pen='b',
-                                  symbol='o', symbolPen='b',
-                                  symbolBrush='b',
-                                  symbolSize=2, pxMode=True)
-            self.plotter.g2.plot(x=self.times,
-                                  y=self.traces[self.pane2],
-                                  name= IScan.plotNames[1], pen='g',
-                                  symbol='o', symbolPen='g',
-                                  symbolBrush='g',
-                                  symbolSize=2, pxMode=True)
-            self.plotter.g3.plot(x=self.times,
-                                  y=self.traces[self.pane3],
-                                  name= IScan.plotNames[2], pen='r',
-                                  symbol='o', symbolPen='r',
-                                  symbolBrush='r',
-                                  symbolSize=2, pxMode=True)
+        super().singleScan(duration, rate)
+        self._plotShot()
             
     # Description: Works the same as singleScan except data is passed as a parameter so that this function only handles plotting,
     #              NOT data acqusition AND plotting.
@@ -370,76 +205,9 @@ class IScan():
     # Parameter, rate: An integer representing the sample rate of the NI board
     # Parameter, data: A signal array containing 2 elements, an x and a y data array.
     def singleScanPlot(self, duration, rate, data):
-
-        npoint = int(duration * rate)
-        d = data
-            
-        self.times = np.linspace(0, duration, npoint)
-        self.v1 = d[0, :]
-        self.v2 = d[1, :]
-        self.vm = d[2, :]
-        self.v1mv2 = self.v1 - self.v2
-        self.v1pv2 = self.v1 + self.v2
-        self.div = self.v1mv2/self.v1pv2
-        self.traces = (self.v1, self.v2, self.vm,
-                        self.v1mv2, self.v1pv2, self.div)
-        #
-        #   Get scaling
-        #
-        mx1 = np.max(self.traces[self.pane1])
-        mn1 = np.min(self.traces[self.pane1])
-        r1 = 0.55*(mx1-mn1)
-        a1 = 0.5*(mx1+mn1)
-        self.plotter.g1.setYRange(a1-r1, a1+r1)
-        mx2 = np.max(self.traces[self.pane2])
-        mn2 = np.min(self.traces[self.pane2])
-        r2 = 0.55*(mx2-mn2)
-        a2 = 0.5*(mx2+mn2)
-        self.plotter.g2.setYRange(a2-r2, a2+r2)
-        mx3 = np.max(self.traces[self.pane3])
-        mn3 = np.min(self.traces[self.pane3])
-        r3 = 0.55*(mx3-mn3)
-        a3 = 0.5*(mx3+mn3)
-        self.plotter.g3.setYRange(a3-r3, a3+r3)
-        self.plotter.setXRangeLabel(0.0, duration, 'Time (s)')
-        # Save averages and std. devs.
-        for i in range(6):
-            self.gvals[i] = np.average(self.traces[i])
-            self.gerrs[i] = np.std(self.traces[i])
-        #
-        #   Plot with titles and styles
-        #
-        if self.plotter:
-            self.plotter.g1.clear()
-            self.plotter.g2.clear()
-            self.plotter.g3.clear()
-            print('Using 3-trace plotter')
-            print(self.pane1, self.pane2, self.pane3)
-            self.plotter.g1.plot(x=self.times,
-                                  y=self.traces[self.pane1],
-                                  name= IScan.plotNames[0], pen='b',
-                                  symbol='o', symbolPen='b',
-                                  symbolBrush='b',
-                                  symbolSize=2, pxMode=True)
-            self.plotter.g2.plot(x=self.times,
-                                  y=self.traces[self.pane2],
-                                  name= IScan.plotNames[1], pen='g',
-                                  symbol='o', symbolPen='g',
-                                  symbolBrush='g',
-                                  symbolSize=2, pxMode=True)
-            self.plotter.g3.plot(x=self.times,
-                                  y=self.traces[self.pane3],
-                                  name= IScan.plotNames[2], pen='r',
-                                  symbol='o', symbolPen='r',
-                                  symbolBrush='r',
-                                  symbolSize=2, pxMode=True)
-
-    def get_err(self, idx: int) -> float:
-        return self.gerrs[idx]
-
-    def get_avg(self, idx: int) -> float:
-        # print(self.gvals[idx])
-        return self.gvals[idx]
+        # Recorded with the capture, and so in the catalog
+        self.setData(duration, rate, data)
+        self._plotShot()
 
     def dump(self):
         pass
@@ -461,23 +229,43 @@ class IScan():
     def _plotOn(self, axis, array, errors, name='B Field'):
         pass
 
-    #
-    #   Send data in text form to a .csv file
-    #
-    def saveTo(self, fname: str):
-        darray = np.stack((self.times, self.v1, self.v2, self.vm,
-                           self.v1mv2, self.v1pv2, self.div), axis=1)
-        hdr = 't,V1,V2,Vm,V1-V2,V1+V2,Vdiv'
-        np.savetxt(fname, darray, header=hdr, delimiter=', ')
-
     def close(self):
         print(f'Close iscan instance {self.instance}')
         self.instance = -1
-        if self.src is not None:
-            print('Close source')
-            self.src.close()
-        self.src = None
+        super().close()
 
     #
     #   Helpers
     #
+    #
+    #   Scale each pane to 10% beyond the range of the trace it shows.
+    #
+    def _setYRanges(self):
+        for g, idx in ((self.plotter.g1, self.pane1),
+                       (self.plotter.g2, self.pane2),
+                       (self.plotter.g3, self.pane3)):
+            mx = np.max(self.traces[idx])
+            mn = np.min(self.traces[idx])
+            r = 0.55*(mx-mn)
+            a = 0.5*(mx+mn)
+            g.setYRange(a-r, a+r)
+
+    #
+    #   Plot a single shot with titles and styles.
+    #
+    def _plotShot(self):
+        if not self.plotter:
+            return
+        self._setYRanges()
+        self.plotter.setXRangeLabel(0.0, self.duration, 'Time (s)')
+        print('Using 3-trace plotter')
+        print(self.pane1, self.pane2, self.pane3)
+        self.plotter.plotTrace(0, self.times, self.traces[self.pane1],
+                               'b', IScan.plotNames[0],
+                               key=('shot', self.shot, self.pane1))
+        self.plotter.plotTrace(1, self.times, self.traces[self.pane2],
+                               'g', IScan.plotNames[1],
+                               key=('shot', self.shot, self.pane2))
+        self.plotter.plotTrace(2, self.times, self.traces[self.pane3],
+                               'r', IScan.plotNames[2],
+                               key=('shot', self.shot, self.pane3))
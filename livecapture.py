@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+livecapture.py
+Faraday
+
+A capture file that other processes can read while it is being
+written, so a notebook or monitoring script can analyse a long single
+shot as it arrives.
+
+A .flive file is
+    8 bytes     magic, the same as a .fcap file
+    4 bytes     little endian length of the header
+    header      UTF-8 JSON, padded with spaces to a 64 byte boundary
+    control     64 bytes, little endian uint64 committed row count at
+                0 and a closed flag at 8
+    data        rows of one little endian float64 per column, appended
+
+Unlike .fcap, where each column is stored whole, the data are stored
+a sample (row) at a time so they can be appended as they come. Rows
+are only ever added after the last one. The writer appends a block of
+rows, flushes it, and only then stores the new row count, a single
+aligned 8 byte store, so every row below the count a reader sees is
+complete. Readers never lock and never change the file.
+
+The writer extends the file GROW_ROWS rows of zeros at a time, ahead
+of the rows written, so readers need only re-map it now and then.
+When closed it sets the closed flag and then trims the file back to
+the committed rows. A reader maps the file and returns the committed rows as a
+view of the map, so new samples cost no copies.
+
+The header holds the column names, sample rate, the offsets of the
+control block and the data, and whatever meta the writer was given.
+Sample times are not stored; they are row/sample_rate.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import json
+import time
+import struct
+
+import numpy as np
+
+import capturefile
+from scansnapshot import ScanSnapshot
+
+EXT = '.flive'
+CONTROL = 64
+GROW_ROWS = 1 << 16
+
+
+class LiveCaptureWriter:
+    def __init__(self, fname: str, names, sample_rate: float,
+                 meta: dict = None):
+        self.fname = fname
+        self.names = list(names)
+        self.n_col = len(self.names)
+        self.rows = 0
+        header = {'version': capturefile.VERSION, 'kind': 'live',
+                  'layout': 'rows', 'columns': self.names,
+                  'dtype': capturefile.DTYPE, 'sample_rate': sample_rate}
+        header.update(meta or {})
+        # Offsets depend on the header length, which depends on them
+        header['control'] = header['data'] = 0
+        hlen = len(json.dumps(header).encode('utf-8')) + 32
+        align = capturefile.ALIGN
+        self._control = -(-(len(capturefile.MAGIC) + 4 + hlen)
+                          // align) * align
+        self._start = self._control + CONTROL
+        header['control'] = self._control
+        header['data'] = self._start
+        hb = json.dumps(header).encode('utf-8')
+        hb = hb + b' ' * (self._control - len(capturefile.MAGIC) - 4
+                          - len(hb))
+        self._f = open(fname, 'w+b')
+        self._f.write(capturefile.MAGIC)
+        self._f.write(struct.pack('<I', len(hb)))
+        self._f.write(hb)
+        self._f.write(bytes(CONTROL))
+        self._f.flush()
+        self._capacity = 0
+        self._count = np.memmap(fname, dtype='<u8', mode='r+',
+                                offset=self._control, shape=(2,))
+
+    #
+    #   Append a block in the layout DAQ sources return, (column, n).
+    #
+    def append(self, block) -> None:
+        rows = np.ascontiguousarray(np.asarray(block, dtype=np.float64).T)
+        n = rows.shape[0]
+        if rows.shape[1] != self.n_col:
+            raise RuntimeError(f'Block has {rows.shape[1]} columns, the'
+                               f' live capture has {self.n_col}.')
+        if self.rows + n > self._capacity:
+            self._capacity = self.rows + n + GROW_ROWS
+            self._f.truncate(self._start + self._capacity*self.n_col*8)
+        self._f.seek(self._start + self.rows*self.n_col*8)
+        self._f.write(memoryview(rows).cast('B'))
+        self._f.flush()
+        self.rows += n
+        self._count[0] = self.rows
+
+    #
+    #   Mark the capture closed and trim the unused tail. The writer's
+    #   own map is dropped first, as Windows will not truncate a mapped
+    #   file; a reader's map can still stop the trim, which is reported.
+    #
+    def close(self) -> None:
+        if self._f is None:
+            return
+        self._count[1] = 1
+        self._count.flush()
+        del self._count
+        try:
+            self._f.truncate(self._start + self.rows*self.n_col*8)
+        except OSError as e:
+            print(f'Could not trim {self.fname}, {self._capacity - self.rows}'
+                  f' rows of padding left: {e}')
+        self._f.close()
+        self._f = None
+
+
+class LiveCapture:
+    def __init__(self, fname: str):
+        self.fname = fname
+        with open(fname, 'rb') as f:
+            if f.read(len(capturefile.MAGIC)) != capturefile.MAGIC:
+                raise RuntimeError(f'{fname} is not a capture file.')
+            hlen, = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(hlen).decode('utf-8'))
+        if self.header.get('layout') != 'rows':
+            raise RuntimeError(f'{fname} is not a live capture.')
+        self.names = self.header['columns']
+        self.sample_rate = self.header['sample_rate']
+        self._start = self.header['data']
+        self._control = np.memmap(fname, dtype='<u8', mode='r',
+                                  offset=self.header['control'], shape=(2,))
+        self._map = np.zeros((0, len(self.names)))
+
+    @property
+    def committed(self) -> int:
+        return int(self._control[0])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._control[1])
+
+    #
+    #   The committed rows, (row, column), as a view of the file. The
+    #   file is mapped again only when it has grown past the last map.
+    #
+    def rows(self) -> np.ndarray:
+        n = self.committed
+        if n > len(self._map):
+            ncol = len(self.names)
+            size = (os.path.getsize(self.fname) - self._start) // (ncol*8)
+            self._map = np.memmap(self.fname, dtype=self.header['dtype'],
+                                  mode='r', offset=self._start,
+                                  shape=(size, ncol))
+        return self._map[:n]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name == 't':
+            return np.arange(self.committed) / self.sample_rate
+        return self.rows()[:, self.names.index(name)]
+
+    #
+    #   Wait until at least n rows are committed or the writer has
+    #   closed. Returns the committed count, which is less than n on a
+    #   timeout or when the capture ended short.
+    #
+    def wait(self, n: int, timeout: float = None,
+             poll: float = 0.01) -> int:
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while self.committed < n and not self.closed:
+            if t_end is not None and time.monotonic() >= t_end:
+                break
+            time.sleep(poll)
+        return self.committed
+
+    #
+    #   The committed rows so far as a ScanSnapshot, for the analysis
+    #   functions. This copies.
+    #
+    def snapshot(self) -> ScanSnapshot:
+        r = self.rows()
+        n = len(r)
+        return ScanSnapshot(np.arange(n) / self.sample_rate, r[:, 0],
+                            r[:, 1], r[:, 2], sample_rate=self.sample_rate,
+                            duration=n / self.sample_rate)
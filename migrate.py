@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+migrate.py
+Faraday
+
+Converts the archive of old CSV captures to .fcap files, once.
+
+    python migrate.py . "old scans" --delete
+
+Each scan CSV becomes a .fcap file beside it, written by
+capturefile.save_snapshot. Only t, V1, V2 and Vm are kept, once the
+CSV's V1-V2, V1+V2 and Vdiv columns are found to equal what is
+rebuilt from them. If they do not, all six traces are kept. The
+new file is read back and every CSV column compared with what it
+gives; a file is only counted as migrated if the largest difference,
+relative to the largest value in its column, is within RTOL.
+
+A spectrum CSV (Four) is dropped when it is what compute_spectra
+gives for its scan, since it can always be recomputed. Otherwise,
+which is the usual case as the old names let a later scan overwrite
+an earlier one in the same minute, it is converted to its own .fcap
+and verified the same way.
+
+Each new file's header holds the name, size, modification time and
+SHA-256 of the CSV it came from, and the same is recorded in the
+provenance table of the catalog at --root, where the new scans are
+also catalogued. With --delete the CSVs, and their csvcache sidecars,
+are removed once their files are verified; without it they are kept
+and the space that would be saved is reported. Files are converted in
+a process pool. A CSV already converted from the same bytes is skipped.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import capturefile
+import csvcache
+import fourieranalysis
+from capturefile import CaptureFile
+from catalog import Catalog, name_time
+from fourieranalysis import SpectrumSet
+from scansnapshot import ScanSnapshot
+
+RTOL = 1e-12
+TOOL = 'migrate.py 1'
+
+
+#
+#   Pair each scan CSV under dirs with its spectrum CSV, if it has one.
+#   Spectra without a scan are returned with a scan of None.
+#
+def find_pairs(dirs, recursive: bool = False) -> list:
+    fnames = set()
+    for d in dirs:
+        fnames.update(csvcache.find_csv(d, recursive))
+    pairs = []
+    for f in sorted(fnames):
+        base = f[:-len('.csv')]
+        if base.endswith('Four'):
+            if base[:-len('Four')] + '.csv' not in fnames:
+                pairs.append((None, f))
+        elif not base.endswith('Harm'):
+            four = base + 'Four.csv'
+            pairs.append((f, four if four in fnames else None))
+    return pairs
+
+
+#
+#   Convert one scan and its spectrum, in a worker process. Returns a
+#   dict describing what was done, with 'error' set if it failed; in
+#   that case nothing is left behind.
+#
+def migrate_pair(scan: str, four: str, delete: bool = False) -> dict:
+    result = {'scan': scan, 'four': four, 'files': [], 'sources': [],
+              'source_bytes': 0, 'bytes': 0, 'skipped': [],
+              'dropped': None, 'error': None}
+    made = []
+    try:
+        snap = None
+        if scan is not None:
+            snap = _migrate_scan(scan, result, made)
+        if four is not None:
+            _migrate_spectrum(four, snap, result, made)
+    except Exception as e:
+        for f in made:
+            if os.path.exists(f):
+                os.remove(f)
+        result['files'] = []
+        result['error'] = f'{type(e).__name__}: {e}'
+        return result
+    result['bytes'] = sum(os.path.getsize(f) for f, _ in result['files'])
+    if delete:
+        for src in result['sources']:
+            os.remove(src['source'])
+            side = csvcache.cache_name(src['source'])
+            if os.path.exists(side):
+                os.remove(side)
+    return result
+
+
+#
+#   Helpers
+#
+def _migrate_scan(fname, result, made):
+    names, data = capturefile.read_csv(fname)
+    if names[:4] != ['t', 'V1', 'V2', 'Vm']:
+        raise RuntimeError(f'{fname} has columns {names}, not a scan.')
+    out = fname[:-len('.csv')] + capturefile.EXT
+    src = _source(fname)
+    # Old CSVs do not record the rate, so it is taken from t
+    t = data[0]
+    span = t[-1] - t[0] if len(t) > 1 else 0.0
+    rate = (len(t) - 1) / span if span > 0 else 0
+    snap = ScanSnapshot(data[0], data[1], data[2], data[3],
+                        sample_rate=rate, duration=span)
+    if _already(out, src):
+        result['skipped'].append(fname)
+        result['sources'].append(src)
+        result['source_bytes'] += src['size']
+        result['files'].append((out, 0.0))
+        return snap
+    meta = {'provenance': src, 'saved': name_time(fname)}
+    derivable = (names == ['t'] + list(ScanSnapshot.traceNames)
+                 and _max_error(snap.traces[3:], data[4:]) <= RTOL)
+    made.append(out)
+    if derivable:
+        capturefile.save_snapshot(snap, out, meta)
+    else:
+        meta.update({'kind': 'scan', 'sample_rate': snap.sample_rate,
+                     'duration': snap.duration})
+        capturefile.write_capture(out, names, data, meta)
+    err = _verify(out, names, data)
+    result['sources'].append(src)
+    result['source_bytes'] += src['size']
+    result['files'].append((out, err))
+    return snap
+
+
+def _migrate_spectrum(fname, snap, result, made):
+    names, data = capturefile.read_csv(fname)
+    src = _source(fname)
+    result['sources'].append(src)
+    result['source_bytes'] += src['size']
+    if snap is not None and names == ['freq'] + list(SpectrumSet.traceNames):
+        spectra = fourieranalysis.compute_spectra(snap)
+        if (spectra.mag.shape == data[1:].shape
+                and _max_error(spectra.freq[None, :], data[:1]) <= RTOL
+                and _max_error(spectra.mag, data[1:]) <= RTOL):
+            result['dropped'] = fname
+            return
+    out = fname[:-len('.csv')] + capturefile.EXT
+    if _already(out, src):
+        result['skipped'].append(fname)
+        result['files'].append((out, 0.0))
+        return
+    made.append(out)
+    capturefile.save_spectra(SpectrumSet(data[0], data[1:]), out,
+                             {'provenance': src})
+    result['files'].append((out, _verify(out, names, data)))
+
+
+#
+#   Largest difference between two (column, n) arrays relative to the
+#   largest magnitude in each column of b.
+#
+def _max_error(a, b) -> float:
+    a = np.asarray(a)
+    b = np.asarray(b)
+    if a.shape != b.shape:
+        return np.inf
+    if a.size == 0:
+        return 0.0
+    scale = np.max(np.abs(b), axis=1, keepdims=True)
+    scale[scale == 0] = 1.0
+    with np.errstate(invalid='ignore'):
+        err = np.abs(a - b) / scale
+    # NaN in the same place on both sides is a match
+    err[np.isnan(a) & np.isnan(b)] = 0.0
+    return float(np.max(np.where(np.isnan(err), np.inf, err)))
+
+
+#
+#   Read out back and compare every CSV column with what it gives.
+#
+def _verify(out, names, data) -> float:
+    cap = CaptureFile.open(out)
+    err = _max_error(np.stack([np.asarray(cap[n]) for n in names]), data)
+    if err > RTOL:
+        raise RuntimeError(f'{out} differs from its CSV by {err:.3g}.')
+    return err
+
+
+def _source(fname) -> dict:
+    st = os.stat(fname)
+    with open(fname, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {'source': fname, 'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+
+
+def _already(out, src) -> bool:
+    if not os.path.exists(out):
+        return False
+    try:
+        prov = CaptureFile.open(out).header.get('provenance') or {}
+    except (OSError, RuntimeError, ValueError):
+        return False
+    return prov.get('sha256') == src['sha256']
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Convert old CSV captures to'
+                                 ' .fcap files.')
+    ap.add_argument('dirs', nargs='*', default=['.'],
+                    help='directories of CSV captures')
+    ap.add_argument('--root', default='.',
+                    help='data root holding the catalog')
+    ap.add_argument('--recursive', action='store_true',
+                    help='also convert CSVs in subdirectories')
+    ap.add_argument('--delete', action='store_true',
+                    help='remove each CSV once its conversion is verified')
+    ap.add_argument('--workers', type=int, default=None,
+                    help='worker processes, default one per CPU')
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    pairs = find_pairs(args.dirs, args.recursive)
+    scans = [p[0] for p in pairs]
+    fours = [p[1] for p in pairs]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(migrate_pair, scans, fours,
+                                [args.delete]*len(pairs), chunksize=4))
+    cat = Catalog(args.root)
+    now = datetime.now().isoformat(timespec='seconds')
+    nsrc = nout = ndrop = nskip = 0
+    src_bytes = out_bytes = 0
+    for r in results:
+        if r['error'] is not None:
+            print(f'Could not migrate {r["scan"] or r["four"]}: {r["error"]}')
+            continue
+        # Space is counted for earlier conversions too, so that a
+        # second run with --delete reports what it freed
+        src_bytes += r['source_bytes']
+        out_bytes += r['bytes']
+        # A pair may have one file converted before and one new
+        nskip += len(r['skipped'])
+        ndrop += r['dropped'] is not None
+        files = dict(r['files'])
+        for src in r['sources']:
+            if src['source'] in r['skipped']:
+                continue
+            made = [f for f in files if f[:-len(capturefile.EXT)]
+                    == src['source'][:-len('.csv')]]
+            # A dropped spectrum is counted in ndrop, not as converted
+            if made:
+                nsrc += 1
+                nout += len(made)
+            note = 'recomputable spectrum dropped' if not made else None
+            cat.add_provenance(made[0] if made else src['source'],
+                               src['source'], source_size=src['size'],
+                               source_mtime_ns=src['mtime_ns'],
+                               source_sha256=src['sha256'], converted=now,
+                               tool=TOOL, note=note,
+                               max_error=files[made[0]] if made else None)
+        if r['scan'] is not None and r['scan'] not in r['skipped']:
+            cat.add(r['files'][0][0])
+    cat.close()
+    print(f'{nsrc} CSV files became {nout} .fcap files, {ndrop} spectra'
+          f' dropped as recomputable, {nskip} already migrated, in'
+          f' {time.perf_counter() - t0:.2f} s')
+    saved = src_bytes - out_bytes
+    print(f'{src_bytes/1e6:.2f} MB of CSV to {out_bytes/1e6:.2f} MB,'
+          f' {saved/1e6:.2f} MB ({100*saved/max(src_bytes, 1):.0f}%)'
+          f' {"saved" if args.delete else "to be saved with --delete"}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
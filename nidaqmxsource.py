@@ -24,10 +24,6 @@ from nidaqmx.stream_readers import AnalogMultiChannelReader
 #import ttimer
 #import nipy
 
-import tracemalloc
-
-tracemalloc.start()
-
 
 class NidaqmxSource:
     nInstance = 0;
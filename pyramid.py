@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pyramid.py
+Faraday
+
+Min/max/mean pyramids of long traces, so a viewer can show a whole
+capture, or any part of it, at screen resolution without reading
+every point.
+
+Level L of a pyramid holds, for each trace and each run of 2**L
+points, the minimum, maximum and mean of the run, as a (3, trace,
+bucket) array. The last bucket of a level may be short; its mean is
+still the mean of the points it holds. Levels start at LEVEL0, since
+finer levels would be nearly as big as the trace, and stop before a
+level would have fewer than MIN_BUCKETS buckets. Traces too short to
+have any level are simply read whole.
+
+capturefile stores the levels of a scan's six traces as sections,
+'pyramid<L>', and CaptureFile.overview reads the coarsest level that
+still gives the resolution asked for.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+
+LEVEL0 = 7          # Finest stored level, 128 points a bucket
+MIN_BUCKETS = 512   # Coarsest stored level has at least this many
+STATS = ('min', 'max', 'mean')
+
+
+#
+#   Min, max, sum and count of runs of step points along the last axis
+#   of y, (trace, n). A short last run is kept.
+#
+def reduce(y, step: int):
+    y = np.asarray(y)
+    n = y.shape[-1]
+    full = n // step
+    body = y[..., :full*step].reshape(y.shape[:-1] + (full, step))
+    lo = body.min(axis=-1)
+    hi = body.max(axis=-1)
+    total = body.sum(axis=-1)
+    count = np.full(full, step)
+    if n > full*step:
+        tail = y[..., full*step:]
+        lo = np.concatenate((lo, tail.min(axis=-1)[..., None]), axis=-1)
+        hi = np.concatenate((hi, tail.max(axis=-1)[..., None]), axis=-1)
+        total = np.concatenate((total, tail.sum(axis=-1)[..., None]),
+                               axis=-1)
+        count = np.append(count, n - full*step)
+    return lo, hi, total, count
+
+
+#
+#   The levels of traces, (trace, n), as a dict of level to
+#   (3, trace, bucket) arrays of min, max and mean. Each level is made
+#   from the one below so the traces are read only once.
+#
+def build(traces) -> dict:
+    traces = np.asarray(traces, dtype=np.float64)
+    n = traces.shape[-1]
+    levels = {}
+    if -(-n // 2**LEVEL0) < MIN_BUCKETS:
+        return levels
+    lo, hi, total, count = reduce(traces, 2**LEVEL0)
+    level = LEVEL0
+    while True:
+        levels[level] = np.stack((lo, hi, total / count))
+        if -(-len(count) // 2) < MIN_BUCKETS:
+            return levels
+        lo = reduce(lo, 2)[0]
+        hi = reduce(hi, 2)[1]
+        total = reduce(total, 2)[2]
+        count = reduce(count, 2)[2]
+        level += 1
+
+
+#
+#   The level to read for npix buckets across a range of span points:
+#   the coarsest whose buckets are no wider than span/npix. Returns a
+#   level below LEVEL0 when no stored level is fine enough, and 0 for
+#   ranges of fewer than npix points.
+#
+def choose_level(span: int, npix: int) -> int:
+    if span <= npix:
+        return 0
+    return int(np.floor(np.log2(span / npix)))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+reprocess.py
+Faraday
+
+Recomputes the Fourier transform, noise fit and SNR of many captures
+without the GUI, and writes a summary table of the results.
+
+    python reprocess.py "old scans" 'FData-2026*/*.fcap' --flo 1 --fhi 6
+        --out summary.csv
+
+Arguments are directories, searched for scans as the catalog does, or
+glob patterns. Files are processed in a process pool, one file per
+task, with the same catalog.summarize used when scans are catalogued.
+
+Results are kept in a cache, a JSON file, under each file's path
+with its size and modification time and the fit range. A file whose
+entry still matches is not opened again, so rerunning after a few new
+captures only processes those. --force ignores the cache.
+
+The summary has one row per file, in name order, with the time, rate,
+duration and length of the scan, the peak frequency, signal, noise and
+SNR, and the mean and standard deviation of each trace. Files that
+could not be processed are listed at the end of the run.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import capturefile
+import catalog
+from scansnapshot import ScanSnapshot
+
+CACHE_NAME = '.reprocess.json'
+FIELDS = (['path', 'captured', 'sample_rate', 'duration', 'npoint',
+           'peak_freq', 'signal', 'noise', 'snr']
+          + [f'{stat}_{name}' for name in ScanSnapshot.traceNames
+             for stat in ('mean', 'std')])
+
+
+#
+#   The scan files named by the arguments, directories or globs, once
+#   each and in name order. Spectra, harmonic tables and anything in
+#   exclude are left out.
+#
+def expand(args, recursive: bool = True, exclude=()) -> list:
+    found = set()
+    for arg in args:
+        if os.path.isdir(arg):
+            found.update(os.path.join(arg, p)
+                         for p in catalog.scan_files(arg, recursive))
+        else:
+            found.update(f for f in glob.glob(arg, recursive=recursive)
+                         if f.endswith(('.csv', capturefile.EXT)))
+    skip = {os.path.abspath(f) for f in exclude}
+    return sorted(os.path.normpath(f) for f in found
+                  if os.path.abspath(f) not in skip
+                  and not os.path.splitext(f)[0].endswith(('Four', 'Harm')))
+
+
+#
+#   Summary rows for fnames, from the cache where it is still valid
+#   and otherwise from a process pool. Returns (rows, errors) with rows
+#   keyed by file name in the order given and errors a dict of file
+#   name to message. The cache dict is updated in place.
+#
+def reprocess(fnames, flo: float, fhi: float, cache: dict = None,
+              workers: int = None, force: bool = False):
+    cache = {} if cache is None else cache
+    params = {'flo': flo, 'fhi': fhi}
+    rows = {}
+    todo = []
+    for fname in fnames:
+        if not force and cached(cache, fname, params):
+            rows[fname] = cache[os.path.abspath(fname)]['row']
+        else:
+            todo.append(fname)
+    errors = {}
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = pool.map(_process, todo, [flo]*len(todo),
+                            [fhi]*len(todo), chunksize=4)
+            for fname, (stamp, row, err) in zip(todo, jobs):
+                if err is not None:
+                    errors[fname] = err
+                    continue
+                rows[fname] = row
+                cache[os.path.abspath(fname)] = {'stamp': stamp,
+                                                 'params': params,
+                                                 'row': row}
+    return {f: rows[f] for f in fnames if f in rows}, errors
+
+
+def cached(cache: dict, fname: str, params: dict) -> bool:
+    entry = cache.get(os.path.abspath(fname))
+    return (entry is not None and entry['params'] == params
+            and entry['stamp'] == _stamp(fname))
+
+
+def write_summary(rows: dict, fname: str) -> None:
+    with capturefile.atomic(fname) as tmp, open(tmp, 'w', newline='') as f:
+        w = csv.DictWriter(f, FIELDS)
+        w.writeheader()
+        for path, row in rows.items():
+            w.writerow(dict(row, path=path))
+
+
+def load_cache(fname: str) -> dict:
+    if not os.path.exists(fname):
+        return {}
+    try:
+        with open(fname) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'Ignoring unreadable cache {fname}: {e}')
+        return {}
+
+
+def save_cache(cache: dict, fname: str) -> None:
+    with capturefile.atomic(fname) as tmp, open(tmp, 'w') as f:
+        json.dump(cache, f)
+
+
+#
+#   Helpers
+#
+def _stamp(fname: str) -> list:
+    st = os.stat(fname)
+    return [st.st_size, st.st_mtime_ns]
+
+
+#
+#   One file, in a worker process. Errors come back as text so one bad
+#   file does not abort the map.
+#
+def _process(fname: str, flo: float, fhi: float):
+    try:
+        stamp = _stamp(fname)
+        s = catalog.summarize(capturefile.load(fname), flo, fhi)
+    except Exception as e:
+        return None, None, f'{type(e).__name__}: {e}'
+    row = {k: s[k] for k in FIELDS[1:9]}
+    for name, mean, std in s['traces']:
+        row[f'mean_{name}'] = mean
+        row[f'std_{name}'] = std
+    if row['captured'] is None:
+        row['captured'] = catalog.name_time(fname)
+    return stamp, row, None
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Recompute the Fourier, noise'
+                                 ' fit and SNR of captures.')
+    ap.add_argument('paths', nargs='+',
+                    help='directories or glob patterns of captures')
+    ap.add_argument('--flo', type=float, default=catalog.NOISE_LO,
+                    help='low end of the noise fit range (Hz)')
+    ap.add_argument('--fhi', type=float, default=catalog.NOISE_HI,
+                    help='high end of the noise fit range (Hz)')
+    ap.add_argument('--out', default='summary.csv',
+                    help='summary table to write')
+    ap.add_argument('--cache', default=CACHE_NAME,
+                    help='results cache file')
+    ap.add_argument('--workers', type=int, default=None,
+                    help='worker processes, default one per CPU')
+    ap.add_argument('--force', action='store_true',
+                    help='reprocess every file, ignoring the cache')
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    fnames = expand(args.paths, exclude=[args.out])
+    cache = load_cache(args.cache)
+    params = {'flo': args.flo, 'fhi': args.fhi}
+    nvalid = 0 if args.force else sum(cached(cache, f, params)
+                                      for f in fnames)
+    rows, errors = reprocess(fnames, args.flo, args.fhi, cache,
+                             args.workers, args.force)
+    save_cache(cache, args.cache)
+    write_summary(rows, args.out)
+    print(f'{len(rows)} of {len(fnames)} captures summarised in {args.out}'
+          f' in {time.perf_counter() - t0:.2f} s'
+          f' ({len(rows) - nvalid} processed, {nvalid} from the cache,'
+          f' {len(errors)} failed)')
+    for fname, err in errors.items():
+        print(f'Could not process {fname}: {err}')
+    return 1 if errors and not rows else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -26,6 +26,8 @@ to display comes first, then an interactive section, then a single-shot
 section.
 """
 import numpy as np
+import os
+import copy
 import time
 from datetime import datetime
 #
@@ -36,28 +38,39 @@ from PyQt5.QtCore import (pyqtSlot, Qt, QTimer, pyqtSignal, QThread)
 from PyQt5.QtGui import QMovie
 from PyQt5.QtWidgets import (QApplication, QHBoxLayout, QGroupBox,
                              QPushButton, QVBoxLayout, QWidget, QCheckBox,
-                             QProgressBar, QLabel)
-from pyqtgraph import PlotWidget, plot, setConfigOption, ViewBox, mkPen
-
+                             QProgressBar, QLabel, QTableWidget,
+                             QTableWidgetItem)
+#
+#   pyqtgraph, through threeplotwidget, and matplotlib are only
+#   imported when something is first plotted, so the window comes up
+#   without them.
+#
 # from pyqtgraph import GraphicsLayoutWidget, GraphicsLayout
 #
 #   Support imports
 #
 import iscan
-import threeplotwidget
+import scanmodel
+import fourieranalysis
+import harmonics
+import allandev
+import sinefit
+import capturefile
+import livecapture
+import history
+import comparison
+import spectrogram
+from catalog import Catalog
+from capturesession import CaptureSession
+from spectralaverager import SpectralAverager
+from analysisexecutor import AnalysisExecutor
+from capturewriter import CaptureWriter, save_scan
 from voltagesource import VoltageSource
-from faradaysource import FaradaySource
 import bcwidgets
 from fconfig import FConfig
 # from windowcontroller import WindowController
 import ttimer
 
-#
-#   Diagnostic Imports for Noise fit
-# 
-from scipy.optimize import curve_fit
-import matplotlib.pyplot as plt
-
 
 
 # class RPlotter(QWidget, WindowController):
@@ -67,9 +80,7 @@ class RPlotter(QWidget):
         # Build our basic structure
         super().__init__(*args, **kwargs)
         self.cfg = cfg
-        self.plotter = threeplotwidget.ThreePlotWidget()
-        self.plotter.resize(cfg.graphs_get('GraphWidth'),
-                            cfg.graphs_get('GraphHeight'))
+        self._plotter = None    # Made by the plotter property on first use
 #        WindowController(self).__init__(self.plotter)
         self.showPlot = False
         self.scan = None
@@ -77,6 +88,41 @@ class RPlotter(QWidget):
         print(f'Create scan with source {self.src}')
         self.scan = iscan.IScan(self.src)
         #
+        #   Fourier transforms, noise fits, and saves run on the
+        #   analysis executor and report back to on_analysis_done.
+        #
+        self.spectra = None
+        self.spectraSerial = 0  # Numbers spectra so panes showing them
+        self.harmonics = None   # are not redrawn for a new range
+        self.wantNoiseFit = False
+        self.executor = AnalysisExecutor(parent=self)
+        self.executor.finished.connect(self.on_analysis_done)
+        self.executor.failed.connect(self.on_analysis_failed)
+        #
+        #   Saves are written by the capture writer, which reports back
+        #   to on_capture_written. Every saved scan is then indexed in
+        #   the catalog of the data directory, on the executor.
+        #
+        self.writer = CaptureWriter(parent=self)
+        self.writer.written.connect(self.on_capture_written)
+        self.writer.failed.connect(self.on_capture_failed)
+        self.catalog = Catalog(os.path.dirname(cfg.get('DataPrefix')) or '.')
+        #
+        #   Captures are named by a session, whose directory is made on
+        #   the first save.
+        #
+        self.session = None
+        #
+        #   Live traces are drawn by their own timer, at no more than
+        #   the graph update rate, never from the acquisition loop. A
+        #   frame is skipped if drawing it would make the next sample
+        #   late.
+        #
+        self.renderTimer = QTimer(self)
+        self.renderTimer.timeout.connect(self.on_render_frame)
+        self.frameCost = 0.0    # Running mean of the time a frame takes
+        self.nextSample = None  # ttimer tick the next sample is due
+        #
         #   Lay controls out in the window
         #
         manLayout0 = QVBoxLayout()
@@ -98,6 +144,20 @@ class RPlotter(QWidget):
         self.trace3 = bcwidgets.NamedComboDisp('Plot 3 shows', traceNames)
         self.trace3.box.setCurrentIndex(2)
         l1.addLayout(self.trace3.layout)
+        # Allan deviation of the traces shown, from the live stream or
+        # the last single shot, in its own three-pane window
+        self.allanBtn = QPushButton("Show Allan Deviation")
+        self.allanBtn.clicked.connect(self.on_click_allan)
+        l1.addWidget(self.allanBtn)
+        self.allanPlotter = None
+        self.lastRunLive = False
+        # A scrolling spectrogram of the Plot 1 trace as the data come,
+        # in its own window, for live scans and single shots
+        self.waterfallCheckbox = QCheckBox('Show a waterfall of Plot 1')
+        self.waterfallCheckbox.setChecked(False)
+        self.waterfallCheckbox.stateChanged.connect(self.toggleWaterfall)
+        l1.addWidget(self.waterfallCheckbox)
+        self._waterfall = None  # Made by the waterfall property
         manLayout0.addWidget(box1)
         #
         #   Then start a section for the interactive grapher.
@@ -150,6 +210,18 @@ class RPlotter(QWidget):
         self.saveBtn.clicked.connect(self.on_click_save)
         line3.addWidget(self.saveBtn)
         l2.addLayout(line3)
+        #
+        # The live stream is also kept for a while, see history.py, so
+        # a window of it can be saved at any time, even mid scan.
+        #
+        self.histLen = bcwidgets.NamedFloatEdit('Save the last (s)', 60)
+        l2.addLayout(self.histLen.layout)
+        self.histAgo = bcwidgets.NamedFloatEdit('Ending (s ago)', 0)
+        l2.addLayout(self.histAgo.layout)
+        self.histBtn = QPushButton("Save History")
+        self.histBtn.setEnabled(False)
+        self.histBtn.clicked.connect(self.on_click_save_history)
+        l2.addWidget(self.histBtn)
         manLayout0.addWidget(box2)
         
         #
@@ -178,10 +250,49 @@ class RPlotter(QWidget):
         l3.addLayout(self.noise.layout)
         l3.addLayout(self.signalNoiseRatio.layout)
         
+        # When the modulation frequency is known each RUN is also sine fitted,
+        # refining the frequency on Vm. Zero turns this off.
+        self.modFreq = bcwidgets.NamedFloatEdit('Modulation frequency (Hz)', 0)
+        l3.addLayout(self.modFreq.layout)
+        self.fitVdiv = bcwidgets.NamedReadOnlyEdit('Sine fit Vdiv')
+        l3.addLayout(self.fitVdiv.layout)
+        
+        # Multi-shot averaging. Each RUN is added to running sums of the
+        # spectra, phase referenced to Vm, and the averaged Vdiv peak is
+        # shown, coherent and then incoherent (rms). The averages are kept
+        # apart from this shot's spectra and plotted only when chosen.
+        self.averager = SpectralAverager()
+        self.average = None
+        self.averageSerial = 0
+        self.avgVdiv = bcwidgets.NamedReadOnlyEdit('Averaged Vdiv')
+        l3.addLayout(self.avgVdiv.layout)
+        self.fourierKind = bcwidgets.NamedCombo('Fourier plots show',
+                                                ['This shot',
+                                                 'Coherent average',
+                                                 'Incoherent average'])
+        self.fourierKind.box.currentIndexChanged.connect(self.on_fourier_kind)
+        l3.addLayout(self.fourierKind.layout)
+        lineAvg = QHBoxLayout()
+        self.accumulate = QCheckBox('Accumulate shots')
+        self.accumulate.setChecked(False)
+        lineAvg.addWidget(self.accumulate)
+        self.resetAvgBtn = QPushButton("Reset Average")
+        self.resetAvgBtn.clicked.connect(self.on_click_reset_avg)
+        lineAvg.addWidget(self.resetAvgBtn)
+        l3.addLayout(lineAvg)
+        
         # Initializes a progress bar and puts it on the GUI 
         self.progressBar = ProgressBarWidget()
         l3.addWidget(self.progressBar.progress_bar)
         
+        # Single shots are read on their own thread, which hands back the
+        # samples it read, all of them or as many as it had when cancelled
+        self.daq_thread = None
+        self.shotData = None
+        self.shotRate = 0
+        self.shotDuration = 0.0
+        self.shotLive = None
+        
         #
         # Next line is for three buttons
         #
@@ -190,6 +301,11 @@ class RPlotter(QWidget):
         self.fstrtBtn = QPushButton("RUN")
         self.fstrtBtn.clicked.connect(self.on_click_fstart)
         self.line3.addWidget(self.fstrtBtn)
+        # CANCEL, keeping what has been read
+        self.fstopBtn = QPushButton("CANCEL")
+        self.fstopBtn.setEnabled(False)
+        self.fstopBtn.clicked.connect(self.on_click_fstop)
+        self.line3.addWidget(self.fstopBtn)
         # FOURIER
         self.fshowBtn = QPushButton("Show Fourier")
         self.fshowBtn.setEnabled(False)
@@ -208,6 +324,23 @@ class RPlotter(QWidget):
         l3.addLayout(self.line3)
         manLayout0.addWidget(box3)
         
+        #
+        #   Data are saved as binary .fcap captures. This adds the old CSV files.
+        #
+        self.csvCheckbox = QCheckBox('Also export CSV when saving')
+        self.csvCheckbox.setChecked(False)
+        manLayout0.addWidget(self.csvCheckbox)
+        self.compressCheckbox = QCheckBox('Compress saved captures')
+        self.compressCheckbox.setChecked(False)
+        manLayout0.addWidget(self.compressCheckbox)
+        self.liveCheckbox = QCheckBox('Stream single shots to a live file')
+        self.liveCheckbox.setChecked(False)
+        manLayout0.addWidget(self.liveCheckbox)
+        # What the capture writer last did, or that it had no room for a save
+        self.saveStatus = bcwidgets.NamedReadOnlyEdit('Saves')
+        self.saveStatus.showText('')
+        manLayout0.addLayout(self.saveStatus.layout)
+        
         #
         #   Creates a button for enabling/disabling plot settings box
         #
@@ -256,6 +389,31 @@ class RPlotter(QWidget):
         line4.addWidget(self.noiseSettingsBtn)
         l4.addLayout(line4)
         
+        # Harmonic and sideband extraction, shown in a table window
+        self.nharm = bcwidgets.NamedIntEdit('Number of harmonics', harmonics.N_HARMONIC)
+        l4.addLayout(self.nharm.layout)
+        
+        self.sideband = bcwidgets.NamedFloatEdit('Sideband offset (Hz)', 0)
+        l4.addLayout(self.sideband.layout)
+        
+        line4 = QHBoxLayout()
+        # SET
+        self.harmSettingsBtn = QPushButton("Show Harmonics")
+        self.harmSettingsBtn.clicked.connect(self.on_click_harm_set)
+        line4.addWidget(self.harmSettingsBtn)
+        l4.addLayout(line4)
+        
+        # Overlay the spectra of every catalogued capture in their own window
+        line4 = QHBoxLayout()
+        self.compareBtn = QPushButton("Compare Saved Spectra")
+        self.compareBtn.clicked.connect(self.on_click_compare)
+        line4.addWidget(self.compareBtn)
+        l4.addLayout(line4)
+        self.comparison = None
+        self.compareWidget = None
+        self.harmTable = QTableWidget()
+        self.harmTable.setWindowTitle('Harmonics')
+        
         manLayout0.addWidget(self.box4)
         
         #
@@ -265,160 +423,225 @@ class RPlotter(QWidget):
         manLayout0.addStretch()
         self.setLayout(manLayout0)
     
-    # Description: Checks to see if the graph, plotname, is one of the active traces being plotted    
-    # Parameter, plotname: A string representing the name of the plot you're checking for
-    # Return: plot_data, a tuple where the 1st and 2nd element are the x and y data respectively
-    def checkExistanceOfGraph(self, plotname):
-        
-        if self.trace1.text() == plotname or self.trace2.text() == plotname or self.trace3.text() == plotname:
-            if self.trace1.text() == plotname:
-                plot = self.plotter.g1.getPlotItem()
-                
-                # Get the plot data items                
-                data_items = plot.listDataItems()
-                
-            if self.trace2.text() == plotname:
-                plot = self.plotter.g2.getPlotItem()
-                
-                # Get the plot data items                
-                data_items = plot.listDataItems()
-                
-            if self.trace3.text() == plotname:
-                plot = self.plotter.g3.getPlotItem()
-                
-                # Get the plot data items                
-                data_items = plot.listDataItems()
-                
-            # Extract the plot data from the data items
-            plot_data = []
-            for item in data_items:
-                # The plot data is stored in the 'xData' and 'yData' attributes
-                x_data = item.xData
-                y_data = item.yData
-                plot_data.append((x_data, y_data))
-                
-            return plot_data
-       
-        # Activated if none of the graphs shown are Vm    
-        else:
-            print("U done screwed up my dude")  # Error message courteousy of Rebecca.
-            return None
-        
-        
-    # Description: Finds the position of the main magnetic peak
-    # Return: max_index, the index in the signal arrays where the magnetic peak is located    
-    def getMagneticPeak(self):
-                
-        # Check which trace has Vm in it and return data_items
-        plot_data = self.checkExistanceOfGraph('Vm')
-        
-        # Is there plot data or not? Did you plot the graph of interest?
-        if plot_data:
-            data = plot_data[0] # data is a list of two elements where the 1st is the x and 2nd is the y array
-                
-            # The index of the max value (np.argmax) is the index of the magnetic peak
-            max_index = np.argmax(data[1])
-            
-        else:
-            max_index = None
-            print("There's no plot data, shmuck")
-        
-        return max_index
-    
-    # Description: Takes in a signal and returns a clipped version of the signal based on the x-axis
-    # Parameter, data: A signal array where the 1st element is a list of x values and the 2nd is y values
-    # Parameter, start: A numeric describing the minimum x value to place in the return array
-    # Parameter, end: A numeric describing the maximum x value to place in the return array
-    # Return: subset_data, a signal where  1st and 2nd elements are clipped x,y arrays based on the input data
-    def adjustFitRange(self, data, start, end):
-        
-        # Make lists to hold x,y subset of return data
-        x_array = []
-        y_array = []
-        
-        # Iterate through X data and if element sits in desired range, save it
-        for index, freq in enumerate(data[0]):
-            if freq >= start and freq <= end:
-                intensity = data[1][index]
-                x_array.append(freq)
-                y_array.append(intensity)
-                
-        # shove x and y arrays into tuple to be returned
-        np_x_array = np.array(x_array)
-        np_y_array = np.array(y_array)
-        subset_data = (np_x_array, np_y_array)        
-
-        return subset_data
-    
-    # Descrption: Defines a function to create a linear fit of data
-    # Return: line_of_best_fit, an array of the y values for best fit line
-    def linearFit(self, data):
-        
-        # Perform linear regression (fit a line of best fit)
-        coefficients = np.polyfit(data[0], data[1], 1)
-        slope = coefficients[0]
-        intercept = coefficients[1]
-        
-        # Generate the line of best fit
-        line_of_best_fit = slope * data[0] + intercept
-        
-        return line_of_best_fit
-    
-    # Description: Fits a line to data under the assumption that at every point in frequency space the
-    #              y value of the line is the noise at that point. This noise is then used to display
-    #              the noise and signal to noise ratio.
-    # Parameter, max_index: The index in our data where our signal is at. To fit a line to the data
-    #                       we want to remove the signal so the fit is based on noise and not the signal.
-    def findAndFitNoise(self, max_index):
-
-        # Check which trace has Vm in it and return data_items
-        plot_data = self.checkExistanceOfGraph('V1 - V2/v1 + v2')
-        
-        # Plot data is a list containing two inner lists, grab first list containing
-        # x and y data arrays
-        data = plot_data[0]
-        
-        # Clip our data so that we only plot some subset
-        rerange_data = self.adjustFitRange(data, 0, 25)
-        
-        # Make a new array without signal peak located at index, max_index
-        cleaned_rerange_data = (np.delete(rerange_data[0], max_index), np.delete(rerange_data[1], max_index))
-        
-        # The below variables determine the start and end of the linear fit in Hz. Adjust these values as needed.
-            # To the next dedicated individual, this is worth adding in as text boxes to the plot settings box so 
-            # it can be adjusted from the GUI.
-            # Update: I added in a setting to adjust from the GUI but it's not complete - see on_click_noise_set
-        start = 1
-        end = 6
-        # Take subset of data for fit to get more accurate portrayal of noise
-        # where signal comes in, in frequency space.
-        fit_data = self.adjustFitRange(rerange_data, self.lNoiseLimit.value(), self.rNoiseLimit.value())
-       
-        # Fit a line to the data
-        linear_fit = self.linearFit(fit_data)
-        
+    # Description: Receives results from the analysis executor. Fourier results are cached and
+    #              plotted, noise fits are displayed, and finished saves are reported.
+    # Parameter, kind: A string naming the kind of job that finished
+    # Parameter, result: Whatever that job returned
+    @pyqtSlot(str, object)
+    def on_analysis_done(self, kind, result):
+        if kind == 'fourier':
+            self._set_spectra(result)
+            self._show_fourier()
+            self._request_harmonics()
+            if self.wantNoiseFit:
+                self.wantNoiseFit = False
+                self._request_noise_fit()
+        elif kind == 'noise':
+            self._show_noise_fit(result)
+        elif kind == 'harmonics':
+            self._show_harmonics(result)
+        elif kind == 'accumulate':
+            self._show_average(result)
+        elif kind == 'sinefit':
+            self._show_sine_fit(result)
+        elif kind == 'allan':
+            self._show_allan(result)
+        elif kind == 'catalog':
+            print(f'Catalogued capture {result}')
+        elif kind == 'compare':
+            self._show_comparison(result)
+
+    # Description: Receives the report of a finished save from the capture writer and
+    #              catalogs the scan, which is always the first file written.
+    # Parameter, label: A string naming what was saved
+    # Parameter, report: A WriteReport of the files, their size and the time taken
+    @pyqtSlot(str, object)
+    def on_capture_written(self, label, report):
+        print(f'Saved {label} as {", ".join(report.files)}: {report}')
+        self.saveStatus.showText(f'Saved {label}, {report}')
+        if self.session is not None:
+            self.session.record(label, report.files, report.nbytes, report.seconds)
+        self._catalog_add(report.files[0])
+
+    @pyqtSlot(str, str)
+    def on_capture_failed(self, label, msg):
+        print(f'Save of {label} failed: {msg}')
+        self.saveStatus.showText(f'Save of {label} failed: {msg}')
+
+    @pyqtSlot(str, str)
+    def on_analysis_failed(self, kind, msg):
+        print(f'Analysis {kind} failed: {msg}')
+        self.wantNoiseFit = False
+
+    # Description: Fits a line to the Vdiv spectrum under the assumption that at every point in
+    #              frequency space the y value of the line is the noise at that point. The fit
+    #              runs on the analysis executor and the result comes back to _show_noise_fit.
+    def _request_noise_fit(self):
+        if self.spectra is None:
+            print('There are no Fourier data to fit.')
+            return
+        self.executor.submit('noise', fourieranalysis.fit_noise, self.spectra,
+                             self.lNoiseLimit.value(), self.rNoiseLimit.value())
+
+    # Description: Extracts the amplitude and phase of the first harmonics of the modulation
+    #              frequency, and their sidebands, from every trace on the analysis executor.
+    def _request_harmonics(self):
+        if self.spectra is None:
+            print('There are no Fourier data to analyse.')
+            return
+        self.executor.submit('harmonics', harmonics.extract_harmonics, self.spectra,
+                             self.nharm.value(), self.sideband.value())
+
+    # Description: Fills the harmonics table window, one row per trace, harmonic and sideband.
+    # Parameter, table: A harmonics.HarmonicTable
+    def _show_harmonics(self, table):
+        self.harmonics = table
+        self.harmTable.setWindowTitle(f'Harmonics, Vm THD {table.thd():.5f}')
+        rows = table.rows()
+        self.harmTable.clear()
+        self.harmTable.setColumnCount(len(rows.dtype.names))
+        self.harmTable.setRowCount(len(rows))
+        self.harmTable.setHorizontalHeaderLabels(rows.dtype.names)
+        for i, r in enumerate(rows):
+            self.harmTable.setItem(i, 0, QTableWidgetItem(r[0]))
+            self.harmTable.setItem(i, 1, QTableWidgetItem(str(r[1])))
+            self.harmTable.setItem(i, 2, QTableWidgetItem(str(r[2])))
+            for j in range(3, 6):
+                self.harmTable.setItem(i, j, QTableWidgetItem(f'{r[j]:.5g}'))
+        self.harmTable.show()
+
+    # Description: Keeps the averages of the shots so far and shows the averaged Vdiv peak, coherent
+    #              and incoherent, with their standard errors. If an average is chosen for the
+    #              Fourier plots it is plotted there as it converges.
+    # Parameter, summary: A spectralaverager.AverageSummary
+    def _show_average(self, summary):
+        if summary.n == 0:
+            return
+        self.average = summary
+        self.averageSerial += 1
+        k = fourieranalysis.magnetic_peak(summary.spectra)
+        rms = np.sqrt(summary.power[5, k])
+        rms_err = summary.power_err[5, k] / (2 * rms) if rms > 0 else np.inf
+        self.avgVdiv.showText(f'{summary.spectra.mag[5, k]:.5f}'
+                              f'+/-{summary.coherent_err[5, k]:.5f},'
+                              f' rms {rms:.5f}+/-{rms_err:.5f}'
+                              f' ({summary.n} shots)')
+        if self.fourierKind.value() > 0:
+            self._swapActiveButtonWidget(self.fshowBtn, self.dshowBtn)
+            self.dshowBtn.setEnabled(True)
+            self._show_fourier()
+
+    # Description: Shows the sine fit amplitude of Vdiv with the standard error implied by the
+    #              residual noise, and the fitted frequency.
+    # Parameter, fit: A sinefit.SineFit of the six traces in IScan order
+    def _show_sine_fit(self, fit):
+        err = fit.rms[5] * np.sqrt(2.0 / fit.npoint)
+        self.fitVdiv.showText(f'{fit.amplitude[5]:.5f}+/-{err:.5f}'
+                              f' at {fit.freq[5]:.4f} Hz')
+
+    # Description: Plots overlapping and modified Allan deviations of the three selected traces
+    #              in the Allan window, one trace per pane.
+    # Parameter, devs: A tuple (taus, adev, mdev) with one column per trace in adev and mdev
+    def _show_allan(self, devs):
+        taus, adev, mdev = devs
+        if len(taus) == 0:
+            print('Not enough data for an Allan deviation.')
+            return
+        if self.allanPlotter is None:
+            import threeplotwidget
+            self.allanPlotter = threeplotwidget.ThreePlotWidget()
+            self.allanPlotter.setWindowTitle('Allan deviation')
+        panes = [self.trace1.value(), self.trace2.value(), self.trace3.value()]
+        for idx, tr in enumerate(panes):
+            self.allanPlotter.plotLogLog(idx, taus,
+                                         [(adev[:, tr], 'b', 'Allan'),
+                                          (mdev[:, tr], 'r', 'Modified Allan')],
+                                         'Averaging time (s)',
+                                         iscan.IScan.plotNames[tr])
+        self.allanPlotter.show()
+
+    # Description: Shows the comparison once its files are ready.
+    # Parameter, n: The number of spectra that could be read
+    def _show_comparison(self, n):
+        print(f'{n} of {len(self.comparison.members)} spectra can be compared')
+        import comparewidget
+        self.compareWidget = comparewidget.CompareWidget(self.comparison)
+        self.compareWidget.resize(self.cfg.graphs_get('GraphWidth'),
+                                  self.cfg.graphs_get('GraphHeight'))
+        self.compareWidget.show()
+
+    # Description: Displays the noise, signal to noise ratio, and Vdiv peak from a noise fit and
+    #              draws the diagnostic plot of the fit.
+    # Parameter, fit: A fourieranalysis.NoiseFit
+    def _show_noise_fit(self, fit):
+        self.fVdiv.show(fit.signal)
+        self.noise.show(fit.noise)
+        self.signalNoiseRatio.show(fit.snr)
+
         # Plot the original data and the fitted curve
-        plt.scatter(rerange_data[0], rerange_data[1], color = "blue", label='Signal')
-        plt.scatter(cleaned_rerange_data[0], cleaned_rerange_data[1], color = "red")
-        plt.plot(fit_data[0], linear_fit, 'b-', label = 'Linear Fit')
+        import matplotlib.pyplot as plt
+        plt.scatter(fit.window[0], fit.window[1], color = "blue", label='Signal')
+        plt.scatter(fit.cleaned[0], fit.cleaned[1], color = "red")
+        plt.plot(fit.fit[0], fit.fit[1], 'b-', label = 'Linear Fit')
         plt.xlabel('x')
         plt.ylabel('y')
         plt.legend()
         plt.show()
-        
-        noise = linear_fit[max_index]
-        self.noise.show(noise)
-        self.signalNoiseRatio.show(rerange_data[1][max_index] / noise)
 
     def close(self):
         print('Close rplotter')
-        if self.plotter is not None:
-            self.plotter.hide()
-        self.plotter = None
+        self.renderTimer.stop()
+        if self.daq_thread is not None and self.daq_thread.isRunning():
+            self.daq_thread.stop()
+            self.daq_thread.wait()
+        # A shot cut short by closing still marks its live file closed, so readers stop waiting
+        if self.shotLive is not None:
+            self.shotLive.close()
+        self.shotLive = None
+        if self.writer is not None:
+            self.writer.shutdown()
+        self.writer = None
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.executor = None
+        if self._plotter is not None:
+            self._plotter.hide()
+        self._plotter = None
+        self.harmTable.hide()
+        if self.compareWidget is not None:
+            self.compareWidget.close()
+        self.compareWidget = None
+        if self.allanPlotter is not None:
+            self.allanPlotter.hide()
+        if self._waterfall is not None:
+            self._waterfall.hide()
+        self._waterfall = None
         if self.scan is not None:
             self.scan.close()
         self.scan = None
 
+    #
+    #   The graph window, made on first use so that pyqtgraph is not
+    #   imported until something is plotted.
+    #
+    @property
+    def plotter(self):
+        if self._plotter is None:
+            import threeplotwidget
+            self._plotter = threeplotwidget.ThreePlotWidget()
+            self._plotter.resize(self.cfg.graphs_get('GraphWidth'),
+                                 self.cfg.graphs_get('GraphHeight'))
+            self._plotter.exposed.connect(self.on_plot_exposed)
+        return self._plotter
+
+    @property
+    def waterfall(self):
+        if self._waterfall is None:
+            import waterfallwidget
+            self._waterfall = waterfallwidget.WaterfallWidget(
+                self.cfg.graphs_get('UpdateRate'))
+        return self._waterfall
+
     def closeEvent(self, event):
         print('rplotter closing')
         self.close()
@@ -427,6 +650,14 @@ class RPlotter(QWidget):
         self.saveBtn.setEnabled(False)
         self.showPlot = False
         
+    # Description: Show or hide the waterfall window. It is fed from the next run started.
+    # Parameter, state: The state of the waterfall checkbox
+    def toggleWaterfall(self, state):
+        if state == Qt.Checked:
+            self.waterfall.show()
+        elif self._waterfall is not None:
+            self._waterfall.hide()
+
     # Description: Handle displaying a plot settings box when user checks plot settings box
     # Parameter, state: a boolean representing the state of plot settings checkbox (true or false).
     def togglePlotSettingsWidget(self, state):
@@ -437,10 +668,10 @@ class RPlotter(QWidget):
         # Make the plot settings box visible
         self.box4.setVisible(checked)
        
-        # If user turns off plot settings, show original Fourier plot by calling _do_fourier
-        # but don't do this unless Fourier data has been collected - hasattr checks if class attribute 'fv1', fourier data, exists.
-        if self.plotSettingsCheckbox.isChecked() == False and hasattr(self, "fv1"): 
-            self._do_fourier()
+        # If user turns off plot settings, show original Fourier plot by calling _show_fourier
+        # but don't do this unless Fourier data has been collected.
+        if self.plotSettingsCheckbox.isChecked() == False and self.spectra is not None:
+            self._show_fourier()
         
         # Adjust the size of the parent widget to accommodate the visibility change
         self.adjustSize()
@@ -448,19 +679,79 @@ class RPlotter(QWidget):
     @pyqtSlot()
     def on_click_plot_set(self):
         print("Changing plot settings")
-        self._do_fourier()
+        if self.spectra is not None:
+            self._show_fourier()
     
-    # *** This setting kinda works, there are several bugs to be sorted out however:
-        # 1. findAndFitNoise should verify that linear_fit[max_index] is the frequency
-        #    of the magnetic peak and not just the corresponding index along the line
-        # 2. if the fit range is set outside of the frequency of the signal you can't grab the noise
-        #    so a check should be put in to prevent this
-        # Apologies, just didn't have time to finish this setting.
+    # Refits the noise with the new limits. The fitted line is evaluated at the frequency of
+    # the magnetic peak, and a fit range holding fewer than two points is reported as a failure.
     @pyqtSlot()
     def on_click_noise_set(self):
-        print("Changing fit settings - NOTE THIS FEATURE IS NOT COMPLETE")
-        max_index = self.getMagneticPeak()
-        self.findAndFitNoise(max_index)
+        print("Changing fit settings")
+        self._request_noise_fit()
+
+    # Description: Shows the Allan deviations of the last run, kept as it ran for a live scan and
+    #              computed on the executor for a single shot.
+    @pyqtSlot()
+    def on_click_allan(self):
+        print('Show Allan deviation')
+        if self.lastRunLive and self.scan.allan is not None:
+            self._show_allan(self.scan.allan.deviations())
+        else:
+            self.executor.submit('allan', allandev.snapshot_deviations,
+                                 self.scan.snapshot())
+
+    @pyqtSlot()
+    def on_click_reset_avg(self):
+        print('Reset spectral average')
+        self.averager.reset()
+        self.average = None
+        self.avgVdiv.showText('')
+
+    # Redraws the Fourier plots, if they are showing, with this shot or an average
+    @pyqtSlot(int)
+    def on_fourier_kind(self, index):
+        if self.fshowBtn.isHidden():
+            self._show_fourier()
+
+    @pyqtSlot()
+    def on_click_harm_set(self):
+        self._request_harmonics()
+
+    # Description: Opens a window comparing the spectra of every capture in the catalog. Old CSV
+    #              spectra are first cached as binary files on the executor, one at a time.
+    @pyqtSlot()
+    def on_click_compare(self):
+        paths, labels = comparison.from_catalog(self.catalog.root)
+        if not paths:
+            print('No catalogued spectra to compare')
+            return
+        print(f'Comparing {len(paths)} spectra')
+        if self.compareWidget is not None:
+            self.compareWidget.close()
+        self.compareWidget = None
+        self.comparison = comparison.Comparison(paths, labels)
+        self.executor.submit('compare', self.comparison.prepare, 0)
+
+    @pyqtSlot()
+    def on_render_frame(self):
+        if self.nextSample is not None:
+            slack = (self.nextSample - ttimer.now()) / self.tickRate
+            if slack < self.frameCost:
+                return
+        t0 = time.perf_counter()
+        if self.scan.render():
+            # Draw now, so the cost counted is the whole frame
+            self.plotter.repaint()
+            self.frameCost = (0.8*self.frameCost
+                              + 0.2*(time.perf_counter() - t0))
+        if self.scan.spectrogram is not None:
+            self.waterfall.refresh()
+
+    # Panes hidden while the live traces changed are drawn when shown
+    @pyqtSlot()
+    def on_plot_exposed(self):
+        if self.scan is not None:
+            self.scan.render()
 
     @pyqtSlot()
     def on_click_start(self):
@@ -488,12 +779,38 @@ class RPlotter(QWidget):
 
     @pyqtSlot()
     def on_click_save(self):
-        if self.scan is not None:
-            fname = self._unique_file_name()
-            fname = fname + ".csv"
+        if self.scan is not None and not self._writer_busy('scan'):
+            base_name = self._unique_file_name()
+            fname = base_name + capturefile.EXT
             print(f'Save data to {fname}')
-            self.scan.saveTo(fname)
+            self._queue_save('scan', save_scan, self.scan.snapshot(), base_name,
+                             self._capture_meta(), self.csvCheckbox.isChecked(),
+                             self.compressCheckbox.isChecked())
             
+    # Description: Saves a window of the live history, without stopping a scan that is running.
+    @pyqtSlot()
+    def on_click_save_history(self):
+        hist = self.scan.history
+        if hist is None or hist.count == 0:
+            print('No live history to save')
+            return
+        snap = hist.last(self.histLen.value(), self.histAgo.value())
+        if snap.npoint < 2:
+            print(f'Only {snap.npoint} samples of history in that window')
+            return
+        if self._writer_busy('history'):
+            return
+        base_name = self._unique_file_name()
+        meta = self._capture_meta()
+        meta.update(mode='history', history={'start': float(snap.times[0]),
+                                             'end': float(snap.times[-1])})
+        print(f'Save {snap.npoint} samples of history, {snap.times[0]:.1f}'
+              f' to {snap.times[-1]:.1f} s into the run, to'
+              f' {base_name}{capturefile.EXT}')
+        self._queue_save('history', save_scan, snap, base_name, meta,
+                         self.csvCheckbox.isChecked(),
+                         self.compressCheckbox.isChecked())
+
     # Description: A slot function that describes how to control the GUI and collect data in single shot data acqusition.
     @pyqtSlot()
     def on_click_fstart(self):
@@ -504,14 +821,75 @@ class RPlotter(QWidget):
         # Use the below chunk if you'd like to have a progress bar and please note the chunk size can be adjusted by setting daq_thread.chunk_size
         # to make the chunks bigger so less jumps are introduced.
         
-        self.daq_thread = DAQThread(self.src, self.fdur.value(), self.fsrate.value())
+        # New data make any cached or pending Fourier results stale
+        self._drop_spectra()
+        self.lastRunLive = False
+        self.scan.spectrogram = None
+        spec = self._start_waterfall(self.fsrate.value())
+        live = None
+        if self.liveCheckbox.isChecked():
+            # Other processes can read this with livecapture.LiveCapture as it fills
+            fname = self._unique_file_name() + livecapture.EXT
+            print(f'Streaming single shot to {fname}')
+            live = livecapture.LiveCaptureWriter(fname, capturefile.RAW,
+                                                 self.fsrate.value(),
+                                                 self._capture_meta())
+        self.shotLive = live
+        self.shotRate = self.fsrate.value()
+        self.daq_thread = DAQThread(self.src, self.fdur.value(), self.shotRate,
+                                    live=live, spectrogram=spec)
+        if spec is not None:
+            self.daq_thread.data_ready.connect(self.on_waterfall_data)
+        self.daq_thread.captured.connect(self.on_single_captured)
+        
+        # The live scan shares the source, so it waits for the shot
+        self.fstrtBtn.setEnabled(False)
+        self.fstopBtn.setEnabled(True)
+        self.strtBtn.setEnabled(False)
+        self.fsaveBtn.setEnabled(False)
         self.progressBar.start_progress(self.daq_thread)
+    
+    # Description: Stops a single shot early. The samples read so far are kept and shown.
+    @pyqtSlot()
+    def on_click_fstop(self):
+        if self.daq_thread is not None and self.daq_thread.isRunning():
+            print('Cancel single shot')
+            self.daq_thread.stop()
+    
+    # Description: Receives the samples of a single shot from its thread, then plots and analyses them.
+    # Parameter, data: A (channel, n) array of the samples read, fewer than asked for if cancelled
+    @pyqtSlot(object)
+    def on_single_captured(self, data):
+        if self.shotLive is not None:
+            self.shotLive.close()
+        self.shotLive = None
+        self.fstrtBtn.setEnabled(True)
+        self.fstopBtn.setEnabled(False)
+        self.strtBtn.setEnabled(True)
+        if self.daq_thread.spectrogram is not None:
+            self.waterfall.refresh(force=True)
+        npoint = data.shape[1]
+        if npoint < 2:
+            print('Single shot stopped before any data were read')
+            return
+        if npoint < self.daq_thread.npoint:
+            print(f'Single shot stopped after {npoint} of'
+                  f' {self.daq_thread.npoint} samples; keeping those')
+        self.shotData = data
+        self.shotDuration = npoint / self.shotRate
         
         self._swapActiveButtonWidget(self.dshowBtn, self.fshowBtn)
         self._do_single_plot()
         self.fsaveBtn.setEnabled(True)
         self.fshowBtn.setEnabled(True)
         
+        if self.modFreq.value() > 0:
+            self.executor.submit('sinefit', sinefit.fit_snapshot,
+                                 self.scan.snapshot(), self.modFreq.value(), True)
+        if self.accumulate.isChecked():
+            self.executor.submit('accumulate', self.averager.add,
+                                 self.scan.snapshot(), replace=False)
+        
         # The below chunk of code acquires a constant stream of raw data at the cost of the progres bar. This is because if the data is continuously collected
         # there is no point to signal the progress bar should be updated. Use the below chunk of code if there seems to be an issue in data acqusition because it is
         # more safe but as of writing this comment we have seen no issues in the chunk data acquisition when the fourier is run on the data.
@@ -521,6 +899,12 @@ class RPlotter(QWidget):
         # self.fsaveBtn.setEnabled(True)
         # self.fshowBtn.setEnabled(True)
     
+    # Description: Draws any new waterfall columns as a single shot comes in, no faster than the frame rate
+    # Parameter, data_index: How many samples have been read, unused
+    @pyqtSlot(int)
+    def on_waterfall_data(self, data_index):
+        self.waterfall.refresh()
+
     # Description: A slot function that switches the active plots from fourier data to raw data
     @pyqtSlot()
     def on_click_dshow(self):
@@ -535,28 +919,47 @@ class RPlotter(QWidget):
     def on_click_fshow(self):
         print('Show Fourier in Fourier')
         self._swapActiveButtonWidget(self.fshowBtn, self.dshowBtn)
+        self.wantNoiseFit = True
         self._do_fourier()
         self.dshowBtn.setEnabled(True)
-        max_index = self.getMagneticPeak()
-        self.findAndFitNoise(max_index)
-        self.fVdiv.show(self.fdiv[max_index + 1])
 
     @pyqtSlot()
     def on_click_fsave(self):
         print('Save Fourier pressed')
+        if self._writer_busy('fourier'):
+            return
         base_name = self._unique_file_name()
-        fname = base_name + "Four.csv"
-        print(f'Save Fourier to {fname}')
-        darray = np.stack((self.freq, self.fv1, self.fv2, self.fvm,
-                           self.fv1mv2, self.fv1pv2, self.fdiv), axis=1)
-        hdr = 'freq,V1,V2,Vm,V1-V2,V1+V2,Vdiv'
-        np.savetxt(fname, darray, header=hdr, delimiter=', ')
-        self.scan.saveTo(base_name + '.csv')
+        print(f'Save Fourier to {base_name}Four{capturefile.EXT}')
+        # The spectra are recomputed by the writer if none are cached for these data
+        self._queue_save('fourier', fourieranalysis.save_fourier,
+                         self.scan.snapshot(), self.spectra, base_name,
+                         self.nharm.value(), self.sideband.value(),
+                         self._capture_meta(), self.csvCheckbox.isChecked(),
+                         self.compressCheckbox.isChecked())
 
 #
 #   Internal helpers
 #
 
+    # Description: Says in the GUI if the capture writer has no room for another save, which is
+    #              then not taken rather than freezing the window until the disk catches up.
+    # Parameter, label: A string naming what would be saved
+    # Return: Whether the writer is busy
+    def _writer_busy(self, label):
+        if not self.writer.busy():
+            return False
+        self.saveStatus.showText(f'Writer busy, {label} not saved; try again shortly')
+        return True
+
+    # Description: Hands a save to the capture writer and says so in the GUI.
+    # Parameter, label: A string naming what is saved
+    # Parameter, fn: The job, called as fn(*args) on the writer thread
+    def _queue_save(self, label, fn, *args):
+        if self.writer.put(label, fn, *args):
+            self.saveStatus.showText(f'Saving {label}, {self.writer.pending()} saves pending')
+        else:
+            self.saveStatus.showText(f'Writer busy, {label} not saved; try again shortly')
+
     # Description: A VERY SIMPLE widget swapper that swaps the visibility of two widgets.
     #              In its current form it requires that the widgets be in the same layout group.
     #              This could be made more general by returning the layout of widget 1 and swapping it with that of 
@@ -566,101 +969,127 @@ class RPlotter(QWidget):
         widget1.setVisible(False)
         widget2.setVisible(True)
 
+    # Description: Sets the waterfall up for a run, if it is wanted.
+    # Parameter, rate: Samples per second of the data it will be given
+    # Return: The spectrogram.Spectrogram to feed, or None
+    def _start_waterfall(self, rate):
+        if not self.waterfallCheckbox.isChecked():
+            return None
+        spec = spectrogram.Spectrogram(rate, self.trace1.value())
+        self.waterfall.reset(spec)
+        self.waterfall.show()
+        return spec
+
     def _find_source(self, cfg: FConfig) -> VoltageSource:
         print('rplotter')
         print(cfg._config)
-        rate = cfg.inputs_get('SampleRate')
-        head = cfg.inputs_get('InDev')
-        print(head)
-        print(f'len(head) = { len(head)}')
-        ch_names = [cfg.inputs_get('V1Chan'),
-                    cfg.inputs_get('V2Chan'),
-                    cfg.inputs_get('VMChan')]
-        full_names = ch_names
-        for i in range(3):
-            full_names[i] = head + '/' + ch_names[i]
-        if len(head) < 1:
-            return FaradaySource(ch_names, rate)
-        print(full_names)
-        if head.startswith('Dev'):
-            # return FaradaySource(ch_names, rate)
-            # Only import if needed!
-            from nidaqmxsource import NidaqmxSource
-            return NidaqmxSource(full_names, rate)
-        return VoltageSource(ch_names, rate)
+        return scanmodel.find_source(cfg)
+
+    # Description: Extra header fields saved with every capture.
+    # Return: A dict of the channel names and a copy of the configuration
+    def _capture_meta(self) -> dict:
+        return {'channels': list(self.src.chan_names),
+                'saved': datetime.now().isoformat(),
+                'config': copy.deepcopy(self.cfg._config)}
 
+    def _catalog_add(self, fname: str):
+        self.executor.submit('catalog', self.catalog.add, fname, replace=False)
+
+    # Description: Names the next capture in this session, starting the session if need be.
+    #              DataPrefix gives the directory for session directories and the file prefix.
+    # Return: A path without extension that no earlier capture has used
     def _unique_file_name(self) -> str:
-        dstr = datetime.today().strftime('%m%d%y-%M%H')
-        root = self.cfg.get('DataPrefix')
-        return f'{root}{dstr}'
+        if self.session is None:
+            prefix = self.cfg.get('DataPrefix')
+            self.session = CaptureSession(os.path.dirname(prefix) or '.',
+                                          os.path.basename(prefix),
+                                          {'channels': list(self.src.chan_names),
+                                           'config': copy.deepcopy(self.cfg._config)})
+            print(f'Saving captures in {self.session.path}')
+        return self.session.next_name()
 
     #
-    # _do_fourier transforms all data and updates displayed traces.
+    # _do_fourier sends a snapshot of the scan to the analysis executor
+    # to be transformed. The result comes back to on_analysis_done which
+    # caches it and calls _show_fourier.
     #
     def _do_fourier(self):
         if self.scan is None:
             print('There are no current scan data.')
             return
-        #
-        # Work through the 6 data arrays
-        #
-        self.fv1 = np.absolute(np.fft.rfft(self.scan.v1))
-        # print(self.fv1[:20])
-        self.fv2 = np.absolute(np.fft.rfft(self.scan.v2))
-        # print(self.fv2[:20])
-        self.fvm = np.absolute(np.fft.rfft(self.scan.vm))
-        # print(self.fvm[:20])
-        self.fv1mv2 = np.absolute(np.fft.rfft(self.scan.v1mv2))
-        # print(self.fv1mv2[:20])
-        self.fv1pv2 = np.absolute(np.fft.rfft(self.scan.v1pv2))
-        # print(self.fv1pv2[:20])
-        self.fdiv = np.absolute(np.fft.rfft(self.scan.div))
-        # print(self.fdiv[:20])
-        
-        ftraces = ( self.fv1, self.fv2, self.fvm, 
-                    self.fv1mv2, self.fv1pv2, self.fdiv )
-        # fmax = 1 + self.dur.value() * self.urate.value() * 0.5
-        fmax = 0.5/(self.scan.times[1] - self.scan.times[0])
-        print('Fourier', len(self.scan.v1), len(self.fv1), fmax)
-        self.freq = np.linspace(0, fmax, len(self.fv1))
-        n_fin = 600
+        self.executor.submit('fourier', fourieranalysis.compute_spectra,
+                             self.scan.snapshot())
+
+    #
+    # Keep the spectra, and the individual magnitude traces under their
+    # old names.
+    #
+    def _set_spectra(self, spectra):
+        self.spectra = spectra
+        self.spectraSerial += 1
+        self.freq = spectra.freq
+        (self.fv1, self.fv2, self.fvm,
+         self.fv1mv2, self.fv1pv2, self.fdiv) = spectra.mag
+
+    def _drop_spectra(self):
+        self.executor.cancel('fourier')
+        self.executor.cancel('noise')
+        self.executor.cancel('harmonics')
+        self.wantNoiseFit = False
+        self.spectra = None
+        self.harmonics = None
+
+    #
+    # What the Fourier plots show, this shot's spectra or the coherent or
+    # incoherent average of the shots accumulated, as (freq, magnitudes,
+    # key), or None if there is nothing to show.
+    #
+    def _fourier_traces(self):
+        kind = self.fourierKind.value()
+        avg = self.average
+        if kind == 0 or avg is None:
+            if self.spectra is None:
+                return None
+            return self.spectra.freq, self.spectra.mag, ('fourier', self.spectraSerial)
+        if kind == 1:
+            return avg.spectra.freq, avg.spectra.mag, ('average', self.averageSerial)
+        return avg.spectra.freq, np.sqrt(avg.power), ('power', self.averageSerial)
+
+    #
+    # _show_fourier updates the displayed traces from the cached spectra,
+    # or the averages if they are chosen. Panes already showing them only
+    # have their ranges set.
+    #
+    def _show_fourier(self):
+        shown = self._fourier_traces()
+        if shown is None:
+            return
+        freq, ftraces, tag = shown
+        print('Fourier', len(freq), freq[-1])
+        n_fin = fourieranalysis.PEAK_BINS
 
 
         # Create plot 3
-        self.plotter.g3.clear()
-        print(self.freq[0:2])
-        self.plotter.g3.plot(x=self.freq[1:n_fin],
-                             # y=np.log10(ftraces[self.plots[2]]),
-                             y=ftraces[self.plots[2]][1:n_fin],
-                             name= iscan.IScan.plotNames[0], pen='r',
-                             symbol='o', symbolPen='r',
-                             symbolBrush='r',
-                             symbolSize=2, pxMode=True)
+        self.plotter.plotTrace(2, freq[1:n_fin],
+                               ftraces[self.plots[2]][1:n_fin], 'r',
+                               iscan.IScan.plotNames[0],
+                               key=tag + (self.plots[2],))
         self.plotter.g3.setLabel('bottom', 'Frequency (Hz)')
         
         # Create plot 1
-        self.plotter.g1.clear()
-        print(self.freq[0:2])
-        self.plotter.g1.plot(x=self.freq[1:n_fin], 
-                             # y=np.log10(ftraces[self.plots[0]]),
-                             y=ftraces[self.plots[0]][1:n_fin],
-                             name= iscan.IScan.plotNames[0], pen='b',
-                             symbol='o', symbolPen='b',
-                             symbolBrush='b',
-                             symbolSize=2, pxMode=True)
+        self.plotter.plotTrace(0, freq[1:n_fin],
+                               ftraces[self.plots[0]][1:n_fin], 'b',
+                               iscan.IScan.plotNames[0],
+                               key=tag + (self.plots[0],))
         
         # Create plot 2
-        self.plotter.g2.clear()
-        print(self.freq[0:2])
-        self.plotter.g2.plot(x=self.freq[1:n_fin],
-                             # y=np.log10(ftraces[self.plots[1]]),
-                             y=ftraces[self.plots[1]][1:n_fin],
-                             name= iscan.IScan.plotNames[0], pen='g',
-                             symbol='o', symbolPen='g',
-                             symbolBrush='g',
-                             symbolSize=2, pxMode=True)
+        self.plotter.plotTrace(1, freq[1:n_fin],
+                               ftraces[self.plots[1]][1:n_fin], 'g',
+                               iscan.IScan.plotNames[0],
+                               key=tag + (self.plots[1],))
         
         # All plots should begin by being autoranged
+        from pyqtgraph import ViewBox
         self.plotter.g1.enableAutoRange(axis=ViewBox.XYAxes)
         self.plotter.g2.enableAutoRange(axis=ViewBox.XYAxes)
         self.plotter.g3.enableAutoRange(axis=ViewBox.XYAxes)
@@ -699,6 +1128,8 @@ class RPlotter(QWidget):
         self.strtBtn.setEnabled(False)
         self.stopBtn.setEnabled(True)
         self.saveBtn.setEnabled(False)
+        self._drop_spectra()
+        self.lastRunLive = True
 
         u_rate = self.urate.value()
         step_dur = 0.93 / u_rate   # Tuned at 10/sec
@@ -708,7 +1139,14 @@ class RPlotter(QWidget):
         self.plotter.g2.setYRange(0.0, 0.2)
         self.plotter.g3.setYRange(-5.5, 5.5)
         self.stopScan = False
+        inputs = self.cfg.get('inputs')
+        self.scan.history_seconds = inputs.get('HistorySeconds', history.SECONDS)
+        self.scan.history_mb = inputs.get('HistoryMB', history.MBYTES)
         self.scan.startScan(u_rate)
+        self.histBtn.setToolTip(f'Up to the last {self.scan.history.size / u_rate:.0f} s'
+                                ' of this run can be saved')
+        self.histBtn.setEnabled(True)
+        self.scan.spectrogram = self._start_waterfall(u_rate)
 
         get_time = time.time
         time_1s = 1
@@ -718,14 +1156,14 @@ class RPlotter(QWidget):
         print(self.dur.value(), self.urate.value(), n_point)
         #raw_step_times = np.linspace(0, self.dur.value(), n_point)
         tick_rate = ttimer.init()
+        self.tickRate = tick_rate
         raw_step_times = np.linspace(0, self.dur.value()*tick_rate, n_point,dtype=int)
-        n_plot = self.cfg.graphs_get('UpdateRate')
-        t_plot = 1.0 / n_plot
-        print(f't_plot = {t_plot}')
+        fps = self.cfg.graphs_get('UpdateRate')
         print(raw_step_times[:5])
         print(raw_step_times[-5:])
         step_idx = 0
         running = True
+        self.renderTimer.start(max(int(1000 / fps), 1))
         #
         # Actual Scan starts here
         #
@@ -733,7 +1171,6 @@ class RPlotter(QWidget):
             #t0 = get_time()
             t0 = ttimer.now()
             step_times = raw_step_times + t0
-            pt = t0
             # Do One Scan
             for step_idx in range(n_point):
                 while True:
@@ -742,11 +1179,12 @@ class RPlotter(QWidget):
                     if ct >= step_times[step_idx]:
                         break
                 # print(ct)
-                if ct > pt:
-                    pt = pt + t_plot
-                    self.scan.stepScan(True)
-                else:
-                    self.scan.stepScan(False)
+                self.scan.stepScan()
+                # Frames are only drawn in here, by the render timer. The
+                # next sweep is timed from when it starts, so the end of
+                # a sweep has no deadline and always gets its frame.
+                self.nextSample = (step_times[step_idx + 1]
+                                   if step_idx + 1 < n_point else None)
                 QApplication.processEvents()
                 '''
                 if self.stopScan:
@@ -754,17 +1192,24 @@ class RPlotter(QWidget):
                     break
                 '''
             # End of scan. Update and see if do more scans.
+            self.nextSample = None
+            self.on_render_frame()
+            if self.scan.spectrogram is not None:
+                self.waterfall.refresh(force=True)
             idx = self.trace1.value()
             self.trace1.show(self.scan.get_avg(idx), self.scan.get_err(idx))
             idx = self.trace2.value()
             self.trace2.show(self.scan.get_avg(idx), self.scan.get_err(idx))
             idx = self.trace3.value()
             self.trace3.show(self.scan.get_avg(idx), self.scan.get_err(idx))
+            if self.allanPlotter is not None and self.allanPlotter.isVisible():
+                self._show_allan(self.scan.allan.deviations())
             if not multi or self.stopScan:
                 break
         #
         #   Scan ends here.
         #
+        self.renderTimer.stop()
         self.scan.stopScan()
         # execTime = (get_time() - start_time) / time_1s
         # print(f'Left scan loop. {itn} steps took {execTime} s')
@@ -814,14 +1259,14 @@ class RPlotter(QWidget):
         self.scan.plotInPanes(self.plots)
         self.plotter.show()
         QApplication.processEvents()
-        # Get params from controls
-        dur = self.fdur.value()
+        # The shot as read, which may have been cut short
+        dur = self.shotDuration
         print(f'Single sample duration {dur}')
-        rate = self.fsrate.value()
+        rate = self.shotRate
         print(f'Single sample rate set to {rate}')
         
-        # singleScanPlot is a modified DAQ/plotting function that collects data in chunks
-        self.scan.singleScanPlot(dur, rate, self.daq_thread.data)
+        # singleScanPlot plots data already read, here by the DAQ thread
+        self.scan.singleScanPlot(dur, rate, self.shotData)
         
         # Update statistics
         idx = self.trace1.value()
@@ -860,17 +1305,23 @@ class ProgressBarWidget(QWidget):
         # From progress bar object, connect its stop_requested signal to the daq_thread's stop function
             # This makes it so that when the progress bar emits a stop signal the DAQ stops collecting data
         self.stop_requested.connect(daq_thread.stop)
+        daq_thread.finished.connect(lambda: self.release(daq_thread))
         
         # Initialize class attribute for how many total points will be collected so completion% can be determined.
         self.set_total(daq_thread.npoint)
         
-        # Start the DAQ
-        daq_thread.run()
+        # Start the DAQ on its own thread. It reports back by signal, so the bar repaints and
+        # a stop request is seen while it reads
+        daq_thread.start()
 
     # Description: Updates the progress bar completion percentage
     # Parameter, data_index: self.npoint is the total points to collect and data_index represents how many of that total has been collected.
     def update_progress(self, data_index):
     
+        # A shot of no points has nothing to show
+        if self.npoint <= 0:
+            return
+        
         # Calculate the progress value based on the acquired data
         progress_value = int((data_index / self.npoint) * 100)
         
@@ -885,6 +1336,14 @@ class ProgressBarWidget(QWidget):
     # Description: Emits a signal telling the DAQ to stop collecting data
     def stop_progress(self):
         self.stop_requested.emit()
+    
+    # Description: Disconnects a finished thread, so later stop requests only reach the thread running
+    # Parameter, daq_thread: The DAQThread that has finished
+    def release(self, daq_thread):
+        try:
+            self.stop_requested.disconnect(daq_thread.stop)
+        except TypeError:
+            pass
         
     # Description: Setter to set total points to be collected
     # Parameter, npoint: An integer represeting the number of points to be collected
@@ -897,9 +1356,23 @@ class DAQThread(QThread):
     
     # Signal emitted when data is ready, contains an integer describing the current index of the data aqusition so progress bar can update.
     data_ready = pyqtSignal(int)
+    
+    # Signal emitted once reading ends, with the (channel, n) samples read, all of them or those read before a stop
+    captured = pyqtSignal(object)
+    
+    # Unless a chunk size is given, chunks are sized for about WAKE_RATE reads a second, and made longer when the
+    # time a read costs beyond that of its samples is more than OVERHEAD of it. They are kept between MIN_CHUNK
+    # samples and MAX_CHUNK_S seconds, so the progress bar still moves and a cancel is not kept waiting.
+    WAKE_RATE = 20
+    OVERHEAD = 0.05
+    MIN_CHUNK = 100
+    MAX_CHUNK_S = 0.5
 
-    def __init__(self, src, dur, rate, chunk_size=100):
+    def __init__(self, src, dur, rate, chunk_size=None, live=None,
+                 spectrogram=None):
         super().__init__()
+        self.live = live
+        self.spectrogram = spectrogram
         self.daq_source = src
         self.chans = src.chan_names
         self.n_chan = len(self.chans)
@@ -910,6 +1383,8 @@ class DAQThread(QThread):
         self.chunk_size = chunk_size
         self.stopped = False
         self.data_index = 0
+        self.reads = 0
+        self.overhead = 0.0     # Running mean of the seconds a read costs beyond its samples
 
     # Description: Handles the thread data acqusition
     def run(self):
@@ -917,14 +1392,27 @@ class DAQThread(QThread):
         print(f'Single sample rate set to {self.rate}')
         print(f'Single collect {self.npoint} points')
         
-        # While the stop signal has not been sent by the progress bar, collect data
-        while not self.stopped:
+        # Collect data until the shot is full or a stop is asked for. This runs on its own thread, so the stop
+        # can come at any time, from the progress bar or the CANCEL button.
+        chunk = self.chunk_size or self._next_chunk()
+        while not self.stopped and self.data_index < self.npoint:
             
-            # Read the data in chunks of size, chunk_size. Alter this class attribute to make bigger or smaller chunks
+            # Read the data in chunks of size, chunk. Fixing chunk_size overrides the adaptive size.
                 # Bigger chunk sizes mean there are less gaps in data acqusition at the cost of a progress bar that updates slower
                 # Smaller chunks means that there will be more gaps in data acqusition but the progress bar updates faster.
                     # Gaps in data acquisition are due to the time it takes the thread to save the chunk and request the DAQ for a new one
-            data = self.daq_source.readN(self.chunk_size)
+            # The last chunk is only as long as is needed to fill the shot
+            n = min(chunk, self.npoint - self.data_index)
+            t0 = time.perf_counter()
+            try:
+                data = self.daq_source.readN(n, tmax=n/self.rate + 1)
+            except RuntimeError as e:
+                print(f'Single shot read failed: {e}')
+                break
+            spent = time.perf_counter() - t0
+            self.reads += 1
+            if self.chunk_size is None:
+                chunk = self._next_chunk(n, spent)
             
             # Don't read empty data from the DAQ
             if data is None:
@@ -935,20 +1423,43 @@ class DAQThread(QThread):
             self.update_data(data)
             self.data_ready.emit(self.data_index)
         
+        # Hand back what was read. The array is not touched again, so the GUI thread may keep it.
+        self.captured.emit(self.data[:, :self.data_index])
+        
     # Description: Takes in a chunk of data and places it in the appropriate spot of a data array.
     # Parameter, data: A 3 dimensional array containing 3 channels of chunk data
     def update_data(self, data):
         
-        # new_index is the index to end placing data in a pre-allocated array - determined by where we left off placing data and size of chunk
-        new_index = self.data_index + len(data[0])
+        # new_index is the index to end placing data in a pre-allocated array - determined by where we left off placing data and size of chunk.
+        # Anything past the end of the shot is dropped.
+        data = np.asarray(data)[:, :self.npoint - self.data_index]
+        new_index = self.data_index + data.shape[1]
         
-        # Place our 3 channels of data in 3 indices of a data array
-        for index, array in enumerate(data):
-            self.data[index][self.data_index:new_index] = array
+        # Place all channels of data in the data array at once
+        self.data[:, self.data_index:new_index] = data
         
         # Save index of where to next begin placing data based on where we ended
         self.data_index = new_index
+        
+        # Pass the chunk on to any live capture file for other processes to read
+        if self.live is not None:
+            self.live.append(data)
+        
+        # And to any waterfall, which transforms only what is new
+        if self.spectrogram is not None:
+            self.spectrogram.add(data)
     
     # Description: When the stop signal is received from progress bar set self.stopped to True so that data acqusition stops
     def stop(self):
         self.stopped = True
+    
+    # Description: Sizes the next chunk from the sample rate and the overhead measured on the reads so far.
+    # Parameter, n: Samples the last read asked for, or 0 before the first
+    # Parameter, spent: Seconds the last read took
+    # Return: The number of samples to read next
+    def _next_chunk(self, n=0, spent=0.0):
+        if n > 0:
+            extra = max(spent - n/self.rate, 0.0)
+            self.overhead = extra if self.reads == 1 else 0.7*self.overhead + 0.3*extra
+        chunk = max(self.rate / self.WAKE_RATE, self.overhead * self.rate / self.OVERHEAD)
+        return int(min(max(chunk, self.MIN_CHUNK), max(self.rate * self.MAX_CHUNK_S, self.MIN_CHUNK)))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scanmodel.py
+Faraday
+
+The data side of a scan, with no Qt or plotting dependency, so scans
+can be taken on a machine without a display.
+
+A ScanModel reads a VoltageSource in one of two ways. A live scan
+takes one averaged sample per stepScan, filling sweeps of
+duration*update_rate samples and starting again at the end of each,
+and keeps Allan deviations over the whole run. A single shot reads
+duration*rate samples at once. Either way the scan holds the three
+raw channels, their sum, difference, and difference ratio, in the
+usual IScan order, and the mean and standard deviation of each trace
+at the end of every sweep or shot. A live run is also kept in a
+history.History, the last history_seconds of it in at most
+history_mb, from which any recent window can be saved.
+
+IScan adds the live plots to this. headless.py runs it from the
+command line.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import time
+
+import numpy as np
+
+from voltagesource import VoltageSource
+from scansnapshot import ScanSnapshot
+import capturefile
+from allandev import StreamingAllan
+import history
+
+
+class ScanModel:
+    def __init__(self, src: VoltageSource):
+        self.src = src
+        self.duration = 0.1      # Will be reset when built
+        self.sample_rate = 100_000
+        self.update_rate = 10
+        self.n_sample = int(self.sample_rate * self.duration)
+        self.nAverage = 30
+        self.times = np.zeros(self.n_sample)
+        self.v1 = np.zeros(self.n_sample)
+        self.v2 = np.zeros(self.n_sample)
+        self.vm = np.zeros(self.n_sample)
+        self.v1mv2 = np.zeros(self.n_sample)
+        self.v1pv2 = np.zeros(self.n_sample)
+        self.div = np.zeros(self.n_sample)
+        self.traces = (self.v1, self.v2, self.vm,
+                       self.v1mv2, self.v1pv2, self.div)
+        self.gvals = [1.0, 1.0, 0.0, 0.0, 0.0, 0.0]   # Starting averages
+        self.gerrs = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]   # and std. devs.
+        self.allan = None   # Allan deviations of the live stream
+        self.history = None     # and its recent past
+        self.history_seconds = history.SECONDS
+        self.history_mb = history.MBYTES
+        self.scanIndex = 0
+        self.steps = 0      # Live samples taken
+        self.live = False   # Whether the data are a live sweep
+        # Single shots are numbered so views can tell new data
+        self.shot = 0
+        self._shotData = None
+        # Raw samples are also given to any spectrogram.Spectrogram here
+        self.spectrogram = None
+
+    def setDuration(self, time: float) -> None:
+        self.duration = time
+
+    def setSampleRate(self, rate: int) -> None:
+        self.sample_rate = rate
+        self.src.setDataRate(rate)
+
+    def setUpdateRate(self, rate: int) -> None:
+        self.update_rate = rate
+
+    def setNAverage(self, nAvg: int) -> None:
+        self.nAverage = nAvg
+
+    #
+    #   Start a live scan of sweeps of duration*update_rate samples.
+    #   Any previous data are silently dropped.
+    #
+    def startScan(self, update_rate: int):
+        self.update_rate = update_rate
+        self.n_sample = int(self.duration * self.update_rate)
+        if self.n_sample < 1:
+            raise RuntimeError(f'A {self.duration} s sweep at {update_rate}'
+                               ' samples/s holds no samples.')
+        self.times = np.linspace(0.0, self.duration, self.n_sample)
+        self.scanIndex = 0
+        self.v1 = np.zeros(self.n_sample)
+        self.v2 = np.zeros(self.n_sample)
+        self.vm = np.zeros(self.n_sample)
+        self.v1mv2 = np.zeros(self.n_sample)
+        self.v1pv2 = np.zeros(self.n_sample)
+        self.div = np.zeros(self.n_sample)
+        self.traces = (self.v1, self.v2, self.vm,
+                       self.v1mv2, self.v1pv2, self.div)
+        self.startTime = time.monotonic()
+        self.runStart = self.startTime
+        self.history = history.History(self.update_rate, self.history_seconds,
+                                       self.history_mb)
+        # Allan deviations run over the whole live run, not just a sweep
+        self.allan = StreamingAllan(1.0 / self.update_rate, n_chan=6)
+        self.steps = 0
+        self.live = True
+
+    #
+    #   Take one more averaged sample. Returns True when it ends a
+    #   sweep, after the sweep's statistics are updated and the next
+    #   sweep started.
+    #
+    def stepScan(self) -> bool:
+        graph_end = False
+        t1 = time.monotonic()
+        tdata = self.src.readAvg(self.nAverage)
+        i = self.scanIndex
+        self.times[i] = t1 - self.startTime
+        self.v1[i] = tdata[0]
+        self.v2[i] = tdata[1]
+        self.vm[i] = tdata[2]
+        self.v1mv2[i] = tdata[0]-tdata[1]
+        self.v1pv2[i] = tdata[0]+tdata[1]
+        self.div[i] = self.v1mv2[i]/self.v1pv2[i]
+        if self.spectrogram is not None:
+            self.spectrogram.add(np.reshape(tdata[:3], (3, 1)))
+        self.allan.add((self.v1[i], self.v2[i], self.vm[i],
+                        self.v1mv2[i], self.v1pv2[i], self.div[i]))
+        self.history.add(t1 - self.runStart, tdata[0], tdata[1], tdata[2])
+        self.scanIndex += 1
+        if self.scanIndex >= self.n_sample:  # End of sweep, reset
+            graph_end = True
+            self._update_stats()
+            self.scanIndex = 0
+            self.startTime = time.monotonic()
+        self.steps += 1
+        return graph_end
+
+    def stopScan(self):
+        pass
+
+    #
+    #   Read a single shot of duration*rate samples.
+    #
+    def singleScan(self, duration, rate):
+        self.setSampleRate(rate)
+        npoint = int(duration * rate)
+        data = self.src.readN(npoint, tmax=duration+1)
+        if self.spectrogram is not None:
+            self.spectrogram.add(data)
+        self.setData(duration, rate, data)
+
+    #
+    #   Take a single shot read elsewhere, as a (3, n) array of V1, V2
+    #   and Vm, as the scan's data.
+    #
+    def setData(self, duration, rate, data):
+        # Showing the same data again need not redraw them
+        if data is not self._shotData:
+            self.shot += 1
+            self._shotData = data
+        self.data = data
+        self.live = False
+        self.duration = duration
+        self.sample_rate = rate
+        # One time per sample, however duration rounds
+        self.times = np.arange(data.shape[1]) / rate
+        self.v1 = data[0, :]
+        self.v2 = data[1, :]
+        self.vm = data[2, :]
+        self.v1mv2 = self.v1 - self.v2
+        self.v1pv2 = self.v1 + self.v2
+        self.div = self.v1mv2/self.v1pv2
+        self.traces = (self.v1, self.v2, self.vm,
+                       self.v1mv2, self.v1pv2, self.div)
+        self._update_stats()
+
+    def get_err(self, idx: int) -> float:
+        return self.gerrs[idx]
+
+    def get_avg(self, idx: int) -> float:
+        return self.gvals[idx]
+
+    #
+    #   Freeze the current data so it can be analysed or saved
+    #   away from the thread taking them. The samples of a live sweep
+    #   are averaged readings, update_rate of them a second.
+    #
+    def snapshot(self) -> ScanSnapshot:
+        rate = self.update_rate if self.live else self.sample_rate
+        return ScanSnapshot(self.times, self.v1, self.v2, self.vm,
+                            sample_rate=rate, duration=self.duration)
+
+    #
+    #   Save the data, as text if fname ends in .csv and otherwise as
+    #   a binary capture file with meta added to its header.
+    #
+    def saveTo(self, fname: str, meta: dict = None):
+        if fname.endswith('.csv'):
+            self.snapshot().saveTo(fname)
+        else:
+            capturefile.save_snapshot(self.snapshot(), fname, meta)
+
+    def close(self):
+        if self.src is not None:
+            print('Close source')
+            self.src.close()
+        self.src = None
+
+    #
+    #   Helpers
+    #
+    def _update_stats(self):
+        for i in range(6):
+            self.gvals[i] = np.average(self.traces[i])
+            self.gerrs[i] = np.std(self.traces[i])
+
+
+#
+#   The voltage source the configuration names: the simulator when no
+#   input device is set, an NI board for devices named Dev*, and the
+#   base VoltageSource otherwise. nidaqmx is only imported when used.
+#
+def find_source(cfg) -> VoltageSource:
+    rate = cfg.inputs_get('SampleRate')
+    head = cfg.inputs_get('InDev')
+    ch_names = [cfg.inputs_get('V1Chan'),
+                cfg.inputs_get('V2Chan'),
+                cfg.inputs_get('VMChan')]
+    if len(head) < 1:
+        from faradaysource import FaradaySource
+        return FaradaySource(ch_names, rate)
+    full_names = [head + '/' + ch for ch in ch_names]
+    if head.startswith('Dev'):
+        from nidaqmxsource import NidaqmxSource
+        return NidaqmxSource(full_names, rate)
+    return VoltageSource(full_names, rate)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scansnapshot.py
+Faraday
+
+A ScanSnapshot is a frozen copy of the data held by an IScan. It owns
+its own read-only arrays so that it can be handed to a worker thread
+while the scan carries on overwriting its buffers. It has no Qt
+dependency so analysis code that takes snapshots can run anywhere.
+
+The snapshot stores the three raw channels and the time axis. The
+sum, difference, and difference ratio traces are built on first use.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+
+
+class ScanSnapshot:
+    traceNames = ('V1', 'V2', 'Vm', 'V1-V2', 'V1+V2', 'Vdiv')
+
+    def __init__(self, times, v1, v2, vm, sample_rate=0, duration=0.0):
+        self.times = self._frozen(times)
+        self.v1 = self._frozen(v1)
+        self.v2 = self._frozen(v2)
+        self.vm = self._frozen(vm)
+        self.sample_rate = sample_rate
+        self.duration = duration
+        self._traces = None
+
+    @property
+    def npoint(self) -> int:
+        return len(self.v1)
+
+    #
+    #   All six traces as one (6, npoint) read-only array in the
+    #   usual IScan order.
+    #
+    @property
+    def traces(self) -> np.ndarray:
+        if self._traces is None:
+            t = np.empty((6, self.npoint), dtype=np.float64)
+            t[0] = self.v1
+            t[1] = self.v2
+            t[2] = self.vm
+            np.subtract(self.v1, self.v2, out=t[3])
+            np.add(self.v1, self.v2, out=t[4])
+            np.divide(t[3], t[4], out=t[5])
+            t.setflags(write=False)
+            self._traces = t
+        return self._traces
+
+    #
+    #   Send data in text form to a .csv file in the same layout
+    #   that IScan has always used.
+    #
+    def saveTo(self, fname: str):
+        darray = np.vstack((self.times, self.traces)).T
+        hdr = 't,V1,V2,Vm,V1-V2,V1+V2,Vdiv'
+        np.savetxt(fname, darray, header=hdr, delimiter=', ')
+
+    #
+    #   Helpers
+    #
+    @staticmethod
+    def _frozen(a) -> np.ndarray:
+        c = np.array(a, dtype=np.float64, copy=True)
+        c.setflags(write=False)
+        return c
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+sinefit.py
+Faraday
+
+Least squares sine fits for traces whose modulation frequency is
+known, an alternative to taking the full rfft and searching for the
+peak. The fit is not tied to the FFT bins so a frequency that falls
+between bins costs nothing.
+
+fit3 is the three parameter fit, y = a cos(wt) + b sin(wt) + c at a
+given frequency. When every trace shares the time axis and frequency
+the design matrix is shared too, so its pseudo-inverse is found once
+and the fits of any number of traces are a single matrix product.
+fit4 adds the frequency as a fourth parameter and refines it by
+Gauss-Newton steps (the IEEE 1057 four parameter fit).
+
+Both take y with any leading shape, e.g. (trace, n) or
+(capture, trace, n), and fit along the last axis. fit_chunks splits
+a trace into equal chunks and fits them all in one call.
+
+Results are reported as y = amplitude*sin(wt + phase) + offset with
+the rms residual as the noise estimate and npoint, the points each
+fit used, to turn it into a standard error.
+
+The fits spend most of their time on cos(wt) and sin(wt). For evenly
+spaced times, which single shots always are, these come from the
+outer product of two short tables of complex exponentials, one for a
+block of BLOCK points and one for the block starts, so only about
+2*sqrt(n) trig evaluations are needed.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+
+from scansnapshot import ScanSnapshot
+from fourieranalysis import check_cancel
+
+BLOCK = 512
+
+
+class SineFit:
+    def __init__(self, freq, a, b, offset, rms, npoint):
+        self.freq = freq
+        self.amplitude = np.hypot(a, b)
+        self.phase = np.arctan2(a, b)
+        self.offset = offset
+        self.rms = rms
+        self.npoint = npoint
+
+
+def fit3(t, y, freq: float) -> SineFit:
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    w = 2*np.pi*float(freq)
+    m = _basis3(t, np.array([w]))[0]
+    my = y @ m.T
+    coef = my @ np.linalg.inv(m @ m.T).T
+    rms = _rms(y, coef, my)
+    return SineFit(np.full(rms.shape, float(freq)), coef[..., 0],
+                   coef[..., 1], coef[..., 2], rms, len(t))
+
+
+def fit4(t, y, freq, niter: int = 8, tol: float = 1e-10,
+         cancel=None) -> SineFit:
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    shape = y.shape[:-1]
+    yb = y.reshape(-1, y.shape[-1])
+    w = 2*np.pi*np.broadcast_to(np.asarray(freq, dtype=np.float64),
+                                shape).reshape(-1).copy()
+    #   Start from three parameter fits at the given frequencies
+    coef, my = _solve(_basis3(t, w), yb)
+    for i in range(niter):
+        check_cancel(cancel)
+        g = _basis3(t, w)
+        dg = t*(coef[:, 1, None]*g[:, 0] - coef[:, 0, None]*g[:, 1])
+        step, gy = _solve(np.concatenate((g, dg[:, None]), axis=1), yb)
+        coef = step[:, :3]
+        w += step[:, 3]
+        if np.all(np.abs(step[:, 3]) <= tol*np.abs(w)):
+            break
+    coef, my = _solve(_basis3(t, w), yb)
+    rms = _rms(yb, coef, my)
+    return SineFit((w/(2*np.pi)).reshape(shape), coef[:, 0].reshape(shape),
+                   coef[:, 1].reshape(shape), coef[:, 2].reshape(shape),
+                   rms.reshape(shape), len(t))
+
+
+#
+#   Fit consecutive chunks of chunk_len points of y, sampled at rate,
+#   all at once. Trailing points that do not fill a chunk are dropped.
+#   Phases are referred to the start of the trace, not of each chunk.
+#
+def fit_chunks(y, rate: float, freq: float, chunk_len: int) -> SineFit:
+    y = np.asarray(y, dtype=np.float64)
+    nchunk = y.shape[-1] // chunk_len
+    yc = y[..., :nchunk*chunk_len].reshape(y.shape[:-1]
+                                          + (nchunk, chunk_len))
+    fit = fit3(np.arange(chunk_len) / rate, yc, freq)
+    t0 = np.arange(nchunk) * chunk_len / rate
+    fit.phase = np.angle(np.exp(1j*(fit.phase - 2*np.pi*freq*t0)))
+    return fit
+
+
+#
+#   Fit all six traces of a snapshot, in IScan order, which covers
+#   V1, V2, Vm and Vdiv and is cheaper than copying out just those.
+#   With refine the frequency is first refined from freq by a four
+#   parameter fit to Vm, which has by far the cleanest modulation, and
+#   the traces are then fitted at that frequency. If Vm does not hold
+#   a clean sine near freq the refinement is thrown away.
+#
+def fit_snapshot(snap: ScanSnapshot, freq: float, refine: bool = False,
+                 cancel=None) -> SineFit:
+    check_cancel(cancel)
+    if refine:
+        # Trust the refinement only within a couple of FFT bins
+        f4 = float(fit4(snap.times, snap.vm, freq, cancel=cancel).freq)
+        if abs(f4 - freq) * (snap.times[-1] - snap.times[0]) <= 2:
+            freq = f4
+        else:
+            print(f'Sine fit refinement wandered to {f4} Hz, using {freq} Hz')
+    return fit3(snap.times, snap.traces, freq)
+
+
+#
+#   Helpers
+#
+#
+#   cos(wt), sin(wt) and 1 for each w, as a (len(w), 3, n) array.
+#
+def _basis3(t, w):
+    g = np.empty((len(w), 3, len(t)))
+    n = len(t)
+    dt = (t[-1] - t[0]) / (n - 1) if n > 1 else 0.0
+    d = np.diff(t)
+    if n > BLOCK and np.ptp(d) <= 1e-9*abs(dt):
+        nblock = -(-n // BLOCK)
+        inner = np.exp(1j*w[:, None]*(t[0] + dt*np.arange(BLOCK)))
+        outer = np.exp(1j*w[:, None]*(dt*BLOCK*np.arange(nblock)))
+        e = (outer[:, :, None]*inner[:, None, :]).reshape(len(w), -1)[:, :n]
+        g[:, 0] = e.real
+        g[:, 1] = e.imag
+    else:
+        wt = w[:, None]*t
+        g[:, 0] = np.cos(wt)
+        g[:, 1] = np.sin(wt)
+    g[:, 2] = 1.0
+    return g
+
+
+#
+#   Least squares solution for a batch of (p, n) bases g and traces y
+#   by the p x p normal equations. Returns the coefficients and g y.
+#
+def _solve(g, y):
+    gy = (g @ y[..., None])[..., 0]
+    gg = g @ np.swapaxes(g, 1, 2)
+    return np.linalg.solve(gg, gy[..., None])[..., 0], gy
+
+
+#
+#   The residual of a least squares fit is orthogonal to the fit, so
+#   its sum of squares is y.y - coef.(g y) and need not be formed.
+#
+def _rms(y, coef, gy):
+    ss = np.einsum('...n,...n->...', y, y) - np.sum(coef*gy, axis=-1)
+    return np.sqrt(np.maximum(ss, 0.0) / y.shape[-1])
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+spectralaverager.py
+Faraday
+
+Averages the spectra of many single shots without keeping the shots.
+Only running sums are held, so memory does not grow with the number
+of shots.
+
+Two averages are kept for all six traces.
+The coherent average is of the complex spectra after each shot has
+been rotated so that the Vm fundamental has zero phase. Every bin k
+is rotated by k/k0 times the fundamental phase, which is the same as
+shifting the shot in time, so harmonics line up as well. Signals
+locked to the modulation add up while noise averages away.
+The incoherent average is of the power, |X|^2, and so keeps the
+noise floor.
+
+Both use Welford's update so the standard error of each mean is
+available at every step without loss of precision.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import threading
+
+import numpy as np
+
+from scansnapshot import ScanSnapshot
+from fourieranalysis import SpectrumSet, compute_spectra, check_cancel
+from harmonics import fundamental_bin
+
+
+# ******************************************************************
+#
+#   A copy of the state of the averages after some number of shots,
+#   safe to hand to the GUI while more shots are added.
+#
+# ******************************************************************
+class AverageSummary:
+    def __init__(self, n, spectra, coherent_err, power, power_err):
+        self.n = n
+        self.spectra = spectra            # coherent mean
+        self.coherent_err = coherent_err  # standard error of its bins
+        self.power = power                # incoherent mean of |X|^2
+        self.power_err = power_err
+
+
+class SpectralAverager:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.n = 0
+            self.freq = None
+            self.npoint = 0
+            self._cmean = None
+            self._cm2 = None
+            self._pmean = None
+            self._pm2 = None
+
+    #
+    #   Transform a snapshot and add it. Returns the new summary so it
+    #   can be run as an AnalysisExecutor job.
+    #
+    def add(self, snap: ScanSnapshot, cancel=None) -> AverageSummary:
+        spectra = compute_spectra(snap, cancel=cancel)
+        check_cancel(cancel)
+        self.addSpectra(spectra)
+        return self.summary()
+
+    def addSpectra(self, spectra: SpectrumSet) -> None:
+        k0 = fundamental_bin(spectra)
+        phi0 = np.angle(spectra.spec[2, int(round(k0))])
+        k = np.arange(spectra.spec.shape[1])
+        z = spectra.spec * np.exp(-1j * phi0 * k / k0)
+        p = spectra.mag**2
+        with self._lock:
+            if self.n == 0:
+                self.freq = spectra.freq
+                self.npoint = spectra.npoint
+                self._cmean = np.zeros_like(z)
+                self._cm2 = np.zeros(z.shape)
+                self._pmean = np.zeros(p.shape)
+                self._pm2 = np.zeros(p.shape)
+            elif z.shape != self._cmean.shape:
+                raise RuntimeError(f'Shot has {spectra.npoint} points but'
+                                   f' the average has {self.npoint}.')
+            self.n += 1
+            dz = z - self._cmean
+            self._cmean += dz / self.n
+            self._cm2 += (np.conj(dz) * (z - self._cmean)).real
+            dp = p - self._pmean
+            self._pmean += dp / self.n
+            self._pm2 += dp * (p - self._pmean)
+
+    def summary(self) -> AverageSummary:
+        with self._lock:
+            if self.n == 0:
+                return AverageSummary(0, None, None, None, None)
+            spectra = SpectrumSet(self.freq, self._cmean.copy(),
+                                  self.npoint)
+            return AverageSummary(self.n, spectra,
+                                  self._stderr(self._cm2),
+                                  self._pmean.copy(),
+                                  self._stderr(self._pm2))
+
+    #
+    #   Helpers
+    #
+    def _stderr(self, m2: np.ndarray) -> np.ndarray:
+        if self.n < 2:
+            return np.full(m2.shape, np.inf)
+        return np.sqrt(m2 / (self.n - 1) / self.n)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+spectrogram.py
+Faraday
+
+Short-time Fourier transforms of a stream, computed as its blocks
+arrive, so a waterfall can show how the modulation peak and noise
+floor change during a run.
+
+One trace of each raw (3, n) block, V1, V2 and Vm as DAQ sources give
+them, is cut into frames of nfft samples, hop apart. Each complete
+frame has its mean removed, is Hann windowed, and gives a column of
+the amplitude spectrum in dB. Only the samples of the frame not yet
+complete are kept between blocks, and the columns go into a ring of
+n_col, so memory and the work per sample are the same however long
+the run is.
+
+The ring is written by whatever adds blocks and read by the view,
+which asks for the columns added since it last looked. A column is
+written before count says it is there and a reader is never given
+more than n_col - 1 columns, so it never sees one half written.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+N_COLUMN = 512      # Columns kept, the width of the waterfall
+SEGMENT = 1.0       # Seconds a frame is aimed at
+MIN_NFFT = 32
+MAX_NFFT = 4096
+TINY = 1e-12        # Amplitude floor, so silence has a finite dB
+
+
+class Spectrogram:
+    def __init__(self, rate: float, trace: int = 5, nfft: int = None,
+                 hop: int = None, n_col: int = N_COLUMN):
+        self.rate = rate
+        self.trace = trace
+        self.nfft = nfft or frame_length(rate)
+        self.hop = hop or self.nfft // 2
+        self.n_col = n_col
+        self.freq = np.fft.rfftfreq(self.nfft, 1.0 / rate)
+        self.n_bin = len(self.freq)
+        self.window = np.hanning(self.nfft)
+        self._scale = 2.0 / np.sum(self.window)
+        self.columns = np.zeros((n_col, self.n_bin))
+        self.count = 0      # Columns made, the latest in slot count-1
+        self._tail = np.empty(0)
+
+    #
+    #   Seconds from one column to the next.
+    #
+    @property
+    def dt(self) -> float:
+        return self.hop / self.rate
+
+    #
+    #   Add a (3, n) block of raw samples. Returns the number of new
+    #   columns it completed.
+    #
+    def add(self, block) -> int:
+        buf = np.concatenate((self._tail, trace_of(block, self.trace)))
+        nframe = 0
+        if len(buf) >= self.nfft:
+            nframe = (len(buf) - self.nfft) // self.hop + 1
+            frames = sliding_window_view(buf, self.nfft)[::self.hop][:nframe]
+            frames = frames - np.mean(frames, axis=1, keepdims=True)
+            amp = np.abs(np.fft.rfft(frames * self.window, axis=1))
+            self._store(20 * np.log10(np.maximum(amp * self._scale, TINY)))
+        self._tail = buf[nframe * self.hop:]
+        return nframe
+
+    #
+    #   The columns added since count was seen, oldest first, as a
+    #   (k, n_bin) copy, and the count to ask from next time. A reader
+    #   that has fallen behind gets the latest n_col - 1.
+    #
+    def since(self, seen: int):
+        count = self.count
+        k = min(count - seen, self.n_col - 1)
+        slots = np.arange(count - k, count) % self.n_col
+        return self.columns[slots], count
+
+    #
+    #   Helpers
+    #
+    # Every column counts, but only the last n_col are written
+    def _store(self, cols):
+        first = self.count + len(cols) - min(len(cols), self.n_col)
+        slots = np.arange(first, self.count + len(cols)) % self.n_col
+        self.columns[slots] = cols[-self.n_col:]
+        self.count += len(cols)
+
+
+#
+#   Frame length for a sample rate, the power of two nearest SEGMENT
+#   seconds, within MIN_NFFT and MAX_NFFT.
+#
+def frame_length(rate: float) -> int:
+    n = 2 ** int(np.round(np.log2(max(rate * SEGMENT, 1))))
+    return int(np.clip(n, MIN_NFFT, MAX_NFFT))
+
+
+#
+#   One trace, in the usual IScan order, of a (3, n) raw block.
+#
+def trace_of(block, idx: int) -> np.ndarray:
+    block = np.asarray(block, dtype=np.float64)
+    if idx < 3:
+        return block[idx]
+    v1mv2 = block[0] - block[1]
+    if idx == 3:
+        return v1mv2
+    v1pv2 = block[0] + block[1]
+    if idx == 4:
+        return v1pv2
+    return v1mv2 / v1pv2
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+startup.py
+Faraday
+
+Times the start of the application so slow starts can be caught.
+
+Faraday.py marks each stage of startup, mark('config read'), and
+calls report once the main window is up and the event loop has run.
+Times are seconds since this module was imported, which Faraday.py
+does first. Marks made after the report, such as the end of device
+discovery, are printed as they come and not kept.
+
+The report is printed and appended as one JSON line to LOG in the
+working directory, so successive launches can be compared:
+
+    python startup.py           # the last few launches
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import os
+import sys
+import json
+import time
+from datetime import datetime
+
+LOG = 'startup.jsonl'
+
+_t0 = time.perf_counter()
+_marks = []
+_reported = False
+
+
+def mark(label: str) -> None:
+    t = time.perf_counter() - _t0
+    if _reported:
+        print(f'Startup: {label} at {t:.3f} s')
+        return
+    _marks.append((label, t))
+
+
+#
+#   Print the marks so far and append them to the log. The modules
+#   loaded by then are counted, as a watch on what startup imports.
+#
+def report(log: str = LOG) -> dict:
+    global _reported
+    _reported = True
+    entry = {'started': datetime.now().isoformat(timespec='seconds'),
+             'marks': dict(_marks), 'modules': len(sys.modules)}
+    print('Startup times')
+    last = 0.0
+    for label, t in _marks:
+        print(f'  {t:7.3f} s  (+{t - last:.3f})  {label}')
+        last = t
+    try:
+        with open(log, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    except OSError as e:
+        print(f'Could not log startup times to {log}: {e}')
+    return entry
+
+
+if __name__ == '__main__':
+    if not os.path.exists(LOG):
+        print(f'No startup times logged in {LOG}')
+        sys.exit(1)
+    with open(LOG) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    for e in entries[-10:]:
+        total = max(e['marks'].values(), default=0.0)
+        print(f'{e["started"]}  {total:.3f} s  {e["modules"]} modules  '
+              + ', '.join(f'{k} {v:.2f}' for k, v in e['marks'].items()))
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_capturefile.py
+Faraday
+
+Checks that a single shot is saved with its times as a header axis
+rather than a t column, and that they come back as they were.
+
+    python -m pytest test_capturefile.py
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import numpy as np
+import pytest
+
+import capturefile
+from scanmodel import ScanModel
+
+
+@pytest.mark.parametrize('npoint, rate', [(20000, 10_000), (1000, 1000),
+                                          (30000, 3000), (115000, 100_000)])
+def test_single_shot_time_axis(tmp_path, npoint, rate):
+    model = ScanModel(None)
+    data = np.random.default_rng(0).random((3, npoint))
+    model.setData(npoint / rate, rate, data)
+    fname = str(tmp_path / f'shot{capturefile.EXT}')
+    capturefile.save_snapshot(model.snapshot(), fname)
+
+    cap = capturefile.CaptureFile.open(fname)
+    assert cap.header['axis'] is not None
+    assert 't' not in cap.header['columns']
+    assert np.allclose(cap['t'], model.times, rtol=0, atol=1e-12)
+    assert np.array_equal(cap['V1'], data[0])
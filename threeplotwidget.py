@@ -9,7 +9,7 @@ import numpy as np
 #
 #   PyQt5 imports for the GUI
 #
-from PyQt5.QtCore import QDateTime, Qt, QTimer, pyqtSlot
+from PyQt5.QtCore import QDateTime, Qt, QTimer, QEvent, pyqtSlot, pyqtSignal
 from PyQt5.QtWidgets import (QApplication, QCheckBox, QComboBox, QDateTimeEdit,
         QDial, QDialog, QGridLayout, QGroupBox, QHBoxLayout, QLabel, QLineEdit,
         QProgressBar, QPushButton, QRadioButton, QScrollBar, QSizePolicy,
@@ -25,9 +25,28 @@ from pyqtgraph import GraphicsLayoutWidget, GraphicsLayout
 #   Our imports
 #
 #from windowcontroller import WindowController
+import pyramid
+
+#
+#   Level of detail. A trace given to plotTrace is kept whole and only
+#   what can be seen is drawn: at most about one min/max pair per pixel
+#   column of the pane, over the visible x range and PAD of a view
+#   width either side, so small pans need no redraw. Points are drawn
+#   as symbols only when no more than SYMBOL_MAX are in view.
+#
+#   Nothing is drawn into a pane that cannot be seen. A trace given
+#   while the window is hidden or minimized is drawn when it is shown,
+#   and exposed is emitted then so owners of other items can catch up.
+#   A trace given with the same key as the one a pane already shows is
+#   not sent again.
+#
+SYMBOL_MAX = 2000
+PAD = 0.5
+DEFAULT_WIDTH = 1000    # Pixels, for a pane not yet laid out
 
 class ThreePlotWidget(QWidget):
     winCount = 0
+    exposed = pyqtSignal()
 #    def __init__(self, contr: WindowController=None, *args, **kwargs):
     def __init__(self, *args, **kwargs):
 #        super().__init__(parent=parent_view, *args, **kwargs)
@@ -58,6 +77,17 @@ class ThreePlotWidget(QWidget):
         self.p1 = self.g1.plot(y=y)
         self.p2 = self.g2.plot(y=y)
         self.p3 = self.g3.plot(y=y)
+        # Per pane: (x, y, item), the (i0, i1, step, symbol) last drawn,
+        # the key of the trace, and whether it still needs drawing whole
+        self._traces = [None, None, None]
+        self._drawn = [None, None, None]
+        self._keys = [None, None, None]
+        self._pending = [False, False, False]
+        for idx, g in enumerate((self.g1, self.g2, self.g3)):
+            vb = g.getViewBox()
+            vb.sigXRangeChanged.connect(
+                lambda *args, idx=idx: self._redraw(idx))
+            vb.sigResized.connect(lambda *args, idx=idx: self._redraw(idx))
 #        '''
 #        print(f'Created {self}')
 
@@ -67,6 +97,122 @@ class ThreePlotWidget(QWidget):
         self.g3.setXRange(xmin, xmax)
         self.g3.setLabel('bottom', label)
 
+    #
+    #   Log-log plot of several curves in one pane, used for Allan
+    #   deviations. curves is a list of (y, colour, name) and points
+    #   that are not finite are skipped.
+    #
+    def plotLogLog(self, idx, x, curves, xlabel, ylabel):
+        g = (self.g1, self.g2, self.g3)[idx]
+        g.clear()
+        g.setLogMode(x=True, y=True)
+        if g.getPlotItem().legend is None:
+            g.addLegend()
+        for y, colour, name in curves:
+            ok = np.isfinite(y) & (y > 0)
+            g.plot(x=x[ok], y=y[ok], name=name, pen=colour,
+                   symbol='o', symbolPen=colour, symbolBrush=colour,
+                   symbolSize=5)
+        g.setLabel('bottom', xlabel)
+        g.setLabel('left', ylabel)
+        g.enableAutoRange(axis=ViewBox.XYAxes)
+
+    #
+    #   Show one trace in pane idx, replacing what was there, drawn at
+    #   the level of detail the view needs. x must be increasing. The
+    #   arrays are kept, not copied, and redrawn from whenever the x
+    #   range or the size of the pane changes. If key is given and is
+    #   the key of the trace the pane already shows, nothing is done, so
+    #   callers that only want a new range can call again freely.
+    #
+    def plotTrace(self, idx, x, y, colour, name=None, key=None):
+        trace = self._traces[idx]
+        if (key is not None and key == self._keys[idx] and trace is not None
+                and trace[2].getViewBox() is not None):
+            return trace[2]
+        g = (self.g1, self.g2, self.g3)[idx]
+        g.clear()
+        item = g.plot(name=name, pen=colour, symbolPen=colour,
+                      symbolBrush=colour, symbolSize=2, pxMode=True)
+        self._traces[idx] = (np.asarray(x), np.asarray(y), item)
+        self._drawn[idx] = None
+        self._keys[idx] = key
+        self._pending[idx] = True
+        self._redraw(idx)
+        return item
+
+    #
+    #   Whether anything drawn in pane idx can be seen.
+    #
+    def paneVisible(self, idx) -> bool:
+        g = (self.g1, self.g2, self.g3)[idx]
+        return (self.isVisible() and not self.isMinimized()
+                and g.isVisible())
+
+    def showEvent(self, evnt):
+        super().showEvent(evnt)
+        self._expose()
+
+    def changeEvent(self, evnt):
+        super().changeEvent(evnt)
+        if evnt.type() == QEvent.WindowStateChange and not self.isMinimized():
+            self._expose()
+
+    #
+    #   Helpers
+    #
+    def _expose(self):
+        for idx in range(3):
+            self._redraw(idx)
+        self.exposed.emit()
+
+    def _redraw(self, idx):
+        trace = self._traces[idx]
+        if trace is None:
+            return
+        x, y, item = trace
+        if item.getViewBox() is None:
+            # Cleared by someone else
+            self._traces[idx] = self._keys[idx] = None
+            return
+        if not self.paneVisible(idx):
+            return
+        vb = item.getViewBox()
+        n = len(x)
+        if self._pending[idx] or n == 0:
+            i0, i1 = 0, n
+        else:
+            xmin, xmax = vb.viewRange()[0]
+            if vb.parentItem().getAxis('bottom').logMode:
+                xmin, xmax = 10**xmin, 10**xmax
+            i0, i1 = np.searchsorted(x, (xmin, xmax))
+            i0 = max(i0 - 1, 0)
+            i1 = min(i1 + 1, n)
+        span = max(i1 - i0, 1)
+        npix = int(vb.width()) or DEFAULT_WIDTH
+        step = max(span // npix, 1) if span > SYMBOL_MAX else 1
+        symbol = 'o' if span <= SYMBOL_MAX else None
+        drawn = self._drawn[idx]
+        if (drawn is not None and drawn[2:] == (step, symbol)
+                and drawn[0] <= i0 and i1 <= drawn[1]):
+            return
+        pad = int(PAD*span)
+        j0 = max(i0 - pad, 0)
+        j1 = min(i1 + pad, n)
+        if step == 1:
+            xs = x[j0:j1]
+            ys = y[j0:j1]
+        else:
+            # Each bucket's min at its first x and max at its last
+            lo, hi = pyramid.reduce(y[j0:j1], step)[:2]
+            starts = np.arange(j0, j1, step)
+            ends = np.minimum(starts + step, j1) - 1
+            xs = np.column_stack((x[starts], x[ends])).ravel()
+            ys = np.column_stack((lo, hi)).ravel()
+        self._drawn[idx] = (j0, j1, step, symbol)
+        self._pending[idx] = False
+        item.setData(xs, ys, symbol=symbol)
+
     def clear(self):
         print('Clear sub plts')
         '''
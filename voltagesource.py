@@ -47,7 +47,7 @@ class VoltageSource:
     def readOne(self) -> float:
         return np.zeros(self.n_chan)
     
-    def readN(self, n2read: int) -> np.ndarray:
+    def readN(self, n2read: int, tmax=2) -> np.ndarray:
         res = np.random((self.n_chan, n2read))
         return res
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+waterfallwidget.py
+Faraday
+
+A scrolling waterfall of a Spectrogram: time across, the latest
+column at the right, frequency up, and amplitude in colour.
+
+The image is a fixed (n_bin, n_col) buffer of 32 bit colours used
+as a ring, and a QImage over the same memory. New columns are
+coloured and written into their slots and nothing else is touched;
+painting draws the two halves of the ring either side of the write
+slot, so the picture scrolls without the buffer moving. Colour levels
+follow the loudest recent column, falling by DECAY_DB a column, and
+span RANGE_DB below it.
+
+Created on 10/19/2026
+
+@author: agent
+"""
+import time
+
+import numpy as np
+#
+#   PyQt5 imports for the GUI
+#
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QImage, QTransform
+from PyQt5.QtWidgets import QVBoxLayout, QWidget
+#
+#   PyQtGraph imports
+#
+from pyqtgraph import GraphicsObject, PlotWidget, colormap, setConfigOption
+import pyqtgraph.functions as fn
+#
+#   Our imports
+#
+from spectrogram import Spectrogram
+
+RANGE_DB = 80.0
+DECAY_DB = 0.5
+COLOURS = 'viridis'
+
+
+# ****
+#   The ring image, in columns of the spectrogram and its bins
+# ****
+class WaterfallImage(GraphicsObject):
+    def __init__(self, n_col: int, n_bin: int):
+        super().__init__()
+        self.n_col = n_col
+        self.n_bin = n_bin
+        self._argb = np.zeros((n_bin, n_col), dtype=np.uint32)
+        self._image = fn.ndarray_to_qimage(self._argb, QImage.Format_RGB32)
+        self._next = 0      # Slot the next column goes in
+
+    #
+    #   Write (k, n_bin) columns of 32 bit colours into the ring.
+    #
+    def add_columns(self, cols) -> None:
+        cols = cols[-self.n_col:]
+        slots = np.arange(self._next, self._next + len(cols)) % self.n_col
+        self._argb[:, slots] = cols.T
+        self._next = (self._next + len(cols)) % self.n_col
+        self.update()
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self.n_col, self.n_bin)
+
+    def paint(self, p, *args):
+        n = self._next
+        w = self.n_col
+        h = self.n_bin
+        # Oldest columns, from the write slot on, at the left
+        p.drawImage(QRectF(0, 0, w - n, h), self._image,
+                    QRectF(n, 0, w - n, h))
+        if n > 0:
+            p.drawImage(QRectF(w - n, 0, n, h), self._image,
+                        QRectF(0, 0, n, h))
+
+
+# ****
+#   The waterfall window
+# ****
+class WaterfallWidget(QWidget):
+    def __init__(self, fps: float = 20, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle('Waterfall')
+        layout0 = QVBoxLayout()
+        setConfigOption('background', 'w')
+        setConfigOption('foreground', 'k')
+        self.graph = PlotWidget(parent=self)
+        self.graph.setLabel('bottom', 'Time before latest (s)')
+        self.graph.setLabel('left', 'Frequency (Hz)')
+        layout0.addWidget(self.graph)
+        self.setLayout(layout0)
+        lut = colormap.get(COLOURS).getLookupTable(nPts=256, alpha=False)
+        lut = lut.astype(np.uint32)
+        self._lut = (0xFF000000 | (lut[:, 0] << 16) | (lut[:, 1] << 8)
+                     | lut[:, 2]).astype(np.uint32)
+        self.frame = 1.0 / fps
+        self.spec = None
+        self.image = None
+        self._seen = 0
+        self._top = None    # dB shown in the brightest colour
+        self._drawn = 0.0
+
+    #
+    #   Start again showing spec, which may be a different shape.
+    #
+    def reset(self, spec: Spectrogram) -> None:
+        self.spec = spec
+        self.setWindowTitle(f'Waterfall, {spec.nfft} point frames every'
+                            f' {spec.dt:.3g} s')
+        self._seen = spec.count
+        self._top = None
+        if self.image is not None:
+            self.graph.removeItem(self.image)
+        self.image = WaterfallImage(spec.n_col, spec.n_bin)
+        # Column i is at -(n_col - i)*dt seconds, bin j at j*df Hz
+        df = spec.freq[1] - spec.freq[0]
+        self.image.setTransform(QTransform.fromScale(spec.dt, df))
+        self.image.setPos(-spec.n_col * spec.dt, -0.5 * df)
+        self.graph.addItem(self.image)
+        self.graph.setXRange(-spec.n_col * spec.dt, 0, padding=0)
+        self.graph.setYRange(0, spec.freq[-1], padding=0)
+
+    #
+    #   Colour and draw the columns the spectrogram has made since the
+    #   last call. Unless forced this does nothing within a frame of
+    #   the last drawing. Returns whether anything was drawn.
+    #
+    def refresh(self, force: bool = False) -> bool:
+        if self.spec is None or not self.isVisible():
+            return False
+        now = time.perf_counter()
+        if not force and now - self._drawn < self.frame:
+            return False
+        cols, self._seen = self.spec.since(self._seen)
+        if len(cols) == 0:
+            return False
+        self.image.add_columns(self._colour(cols))
+        self.repaint()
+        self._drawn = now
+        return True
+
+    #
+    #   Helpers
+    #
+    def _colour(self, cols) -> np.ndarray:
+        out = np.empty(cols.shape, dtype=np.uint32)
+        for i, col in enumerate(cols):
+            peak = np.max(col)
+            if self._top is None:
+                self._top = peak
+            self._top = max(peak, self._top - DECAY_DB)
+            idx = (col - (self._top - RANGE_DB)) * (255 / RANGE_DB)
+            out[i] = self._lut[np.clip(idx, 0, 255).astype(np.intp)]
+        return out